@@ -0,0 +1,361 @@
+"""
+Alertas de violação das regras do Western Electric em tempo de ingestão
+
+Cada subgrupo fechado na ingestão vira um evento colocado, sem bloquear,
+em uma fila limitada. Uma thread avaliadora mantém por canal uma janela
+deslizante (RollingXR) com os limites de controle e os últimos pontos de
+X-barra e R, alimentada pelos resumos gravados no fechamento de cada
+amostra, e avalia as regras sobre os pontos que terminam no subgrupo
+novo. O POST do ESP32 só paga o put_nowait na fila.
+
+Deduplicação/debounce por (canal, gráfico, regra):
+- a violação só gera alerta na transição OK -> VIOLADA; enquanto a regra
+  continuar violada nada é reenviado
+- a regra volta a OK após `clear_after` avaliações seguidas sem violação
+- uma nova violação da mesma regra dentro de `cooldown` segundos do
+  último alerta é suprimida
+
+Os alertas são distribuídos (fan-out) para sinks plugáveis, cada um com
+sua fila limitada, sua thread e novas tentativas com espera exponencial,
+de modo que um webhook lento não atrasa os demais:
+- FeedSink: feed em memória para o app (GET /alerts)
+- LogFileSink: uma linha JSON por alerta
+- WebhookSink: POST JSON para uma URL
+
+O estado (janelas, debounce e feed) é por processo; com vários workers
+cada um avalia os subgrupos que ele mesmo gravou.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+from ingestion import sample_summary
+from rolling_cep import RollingXR
+from western_rules import evaluate_western_electric_rules
+
+logger = logging.getLogger(__name__)
+
+# Pontos necessários para avaliar cada regra no ponto mais recente
+RULE_WINDOWS = {
+    "rule_1": 1,
+    "rule_2": 9,
+    "rule_3": 6,
+    "rule_4": 14,
+    "rule_5": 3,
+    "rule_6": 5,
+    "rule_7": 15,
+    "rule_8": 8,
+}
+# Regras avaliadas em cada gráfico (no R, só pontos fora dos limites)
+CHART_RULES = {
+    "X-bar": tuple(RULE_WINDOWS),
+    "R": ("rule_1",),
+}
+
+
+class RuleState:
+    """Estado de debounce de uma regra em um canal/gráfico"""
+    __slots__ = ("active", "clear_count", "last_alert")
+
+    def __init__(self):
+        self.active = False
+        self.clear_count = 0
+        self.last_alert = None
+
+
+class ChannelWindow:
+    """Janela de subgrupos do canal para avaliação incremental"""
+
+    def __init__(self, window, sample_size):
+        self.rolling = RollingXR(window, sample_size)
+        self.points = deque(maxlen=max(RULE_WINDOWS.values()))
+        self.last_sample = None
+
+    def add(self, summary):
+        """Acrescenta um subgrupo pelo resumo gravado na ingestão"""
+        self.rolling.add_summary(summary)
+        self.points.append((summary["media"], summary["amplitude"]))
+
+
+# ===== SINKS =====
+
+class FeedSink:
+    """Feed em memória com os alertas mais recentes (para o app)"""
+    name = "feed"
+
+    def __init__(self, maxlen=500):
+        self._alerts = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def send(self, alert):
+        with self._lock:
+            self._alerts.append(alert)
+
+    def recent(self, channel=None, limit=50):
+        with self._lock:
+            alerts = [a for a in self._alerts if channel is None or a["channel"] == channel]
+        return alerts[::-1][:limit]
+
+
+class LogFileSink:
+    """Acrescenta cada alerta como uma linha JSON no arquivo"""
+    name = "log_file"
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def send(self, alert):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+class WebhookSink:
+    """Envia o alerta em um POST JSON; erro HTTP/rede levanta exceção (nova tentativa)"""
+    name = "webhook"
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(alert).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SinkWorker:
+    """Fila limitada e thread de entrega de um sink, com novas tentativas"""
+
+    def __init__(self, sink, maxsize=1000, retries=3, backoff=0.5):
+        self.sink = sink
+        self.retries = retries
+        self.backoff = backoff
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "dropped": 0}
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"alert-sink-{sink.name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def offer(self, alert):
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            logger.warning(f"Fila do sink {self.sink.name} cheia, alerta descartado")
+
+    def _deliver(self, alert):
+        for attempt in range(self.retries + 1):
+            try:
+                self.sink.send(alert)
+                self.stats["sent"] += 1
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    self.stats["failed"] += 1
+                    logger.error(f"Falha ao entregar alerta ao sink {self.sink.name}: {e}")
+                    return
+                self.stats["retries"] += 1
+                # Espera exponencial; na parada, as tentativas restantes não esperam
+                self._stopping.wait(self.backoff * 2 ** attempt)
+
+    def _run(self):
+        while True:
+            alert = self.queue.get()
+            if alert is None:
+                return
+            self._deliver(alert)
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+
+# ===== PIPELINE =====
+
+class AlertPipeline:
+    """
+    Avaliação das regras por subgrupo fechado e distribuição dos alertas
+
+    Args:
+        get_config: função canal -> ChannelConfig (sample_size)
+        load_samples: função canal -> amostras gravadas, usada para semear a
+            janela na primeira vez e quando a sequência de amostras tiver lacunas
+        window: subgrupos usados nos limites de controle
+        min_samples: subgrupos necessários antes de emitir alertas
+    """
+
+    def __init__(self, get_config, load_samples, sinks, window=100, min_samples=20,
+                 cooldown=300.0, clear_after=3, maxsize=10_000):
+        self.get_config = get_config
+        self.load_samples = load_samples
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.clear_after = clear_after
+        self.workers = [SinkWorker(sink) for sink in sinks]
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stats = {"evaluated": 0, "alerts": 0, "suppressed": 0, "dropped": 0, "errors": 0}
+        self._windows = {}
+        self._rules = {}
+        self._ids = count(1)
+        self._thread = None
+
+    def sink(self, name):
+        for worker in self.workers:
+            if worker.sink.name == name:
+                return worker.sink
+        return None
+
+    # --- caminho de ingestão (não bloqueia) ---
+
+    def submit(self, channel, closed_samples):
+        """Enfileira os subgrupos fechados na ingestão; nunca espera"""
+        if not closed_samples or self._thread is None:
+            return
+        event = (channel, [(int(s["Amostra"]), len(s["Dados"]), sample_summary(s)) for s in closed_samples])
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    # --- thread avaliadora ---
+
+    def _seed(self, channel, config, before):
+        """Reconstrói a janela com os subgrupos completos gravados antes de `before`"""
+        window = ChannelWindow(self.window, config.sample_size)
+        samples = [
+            s for s in self.load_samples(channel)
+            if int(s["Amostra"]) < before and len(s["Dados"]) == config.sample_size
+        ]
+        for sample in samples[-self.window:]:
+            window.add(sample_summary(sample))
+        window.last_sample = before - 1
+        self._windows[channel] = window
+        return window
+
+    def _violations(self, window):
+        """Regras violadas nos pontos que terminam no subgrupo mais recente"""
+        stats = window.rolling.stats()
+        points = list(window.points)
+        charts = {
+            "X-bar": ([p[0] for p in points], stats["x_double_mean"], stats["lsc_x_bar"], stats["lic_x_bar"]),
+            "R": ([p[1] for p in points], stats["r_mean"], stats["lsc_r"], stats["lic_r"]),
+        }
+        results = {}
+        for chart, (values, center_line, lsc, lic) in charts.items():
+            for rule in CHART_RULES[chart]:
+                size = RULE_WINDOWS[rule]
+                if len(values) < size:
+                    continue
+                evaluated = evaluate_western_electric_rules(values[-size:], center_line, lsc, lic)[rule]
+                results[(chart, rule)] = (evaluated, values[-1], center_line, lsc, lic)
+        return results
+
+    def _evaluate(self, channel, number, size, summary):
+        config = self.get_config(channel)
+        if size != config.sample_size:
+            return
+        window = self._windows.get(channel)
+        if window is None or window.rolling.sample_size != config.sample_size or window.last_sample != number - 1:
+            # Primeiro evento, tamanho alterado (reload) ou lacuna (histórico limpo, outro worker)
+            window = self._seed(channel, config, number)
+        window.add(summary)
+        window.last_sample = number
+        self.stats["evaluated"] += 1
+        if len(window.rolling.subgroups) < self.min_samples:
+            return
+
+        now = time.monotonic()
+        for (chart, rule), (evaluated, value, center_line, lsc, lic) in self._violations(window).items():
+            state = self._rules.setdefault((channel, chart, rule), RuleState())
+            if not evaluated["violated"]:
+                state.clear_count += 1
+                if state.active and state.clear_count >= self.clear_after:
+                    state.active = False
+                continue
+            state.clear_count = 0
+            if state.active:
+                continue
+            state.active = True
+            if state.last_alert is not None and now - state.last_alert < self.cooldown:
+                self.stats["suppressed"] += 1
+                continue
+            state.last_alert = now
+            self._dispatch({
+                "id": next(self._ids),
+                "channel": channel,
+                "chart": chart,
+                "rule": rule,
+                "rule_name": evaluated["name"],
+                "description": evaluated["description"],
+                "sample": str(number),
+                "value": round(value, 4),
+                "center_line": round(center_line, 4),
+                "lsc": round(lsc, 4),
+                "lic": round(lic, 4),
+                "timestamp": datetime.now().isoformat(),
+            })
+
+    def _dispatch(self, alert):
+        self.stats["alerts"] += 1
+        logger.warning(f"Alerta CEP: {alert['channel']} {alert['chart']} {alert['rule_name']} (Amostra {alert['sample']})")
+        for worker in self.workers:
+            worker.offer(alert)
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            channel, samples = event
+            for number, size, summary in samples:
+                try:
+                    self._evaluate(channel, number, size, summary)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Erro ao avaliar alertas do canal {channel}: {e}")
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        self._thread = threading.Thread(target=self._run, name="alert-evaluator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Processa o que já estiver na fila e encerra as threads"""
+        if self._thread is not None:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+        for worker in self.workers:
+            worker.stop(timeout)
+
+    def status(self):
+        return {
+            **self.stats,
+            "queued": self.queue.qsize(),
+            "sinks": {
+                worker.sink.name: {**worker.stats, "queued": worker.queue.qsize()}
+                for worker in self.workers
+            },
+        }
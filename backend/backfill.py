@@ -0,0 +1,566 @@
+"""
+Reprocessamento do histórico em segundo plano (backfill)
+
+Depois de mudar os limites de especificação, o tamanho do subgrupo ou o
+tipo de gráfico de um canal, os resultados derivados do histórico ficam
+defasados, e era preciso repassar tudo pelo XR_graph à mão. Um job
+recalcula, para cada canal, a partir das leituras gravadas e da
+configuração do canal no início do job:
+
+- stats: resumos dos subgrupos (ingestion.summarize), reagrupando as
+  leituras no tamanho de subgrupo atual, como a ingestão faria
+- capability: Cp, Cpk, Pp, Ppk e PPM por janela deslizante de subgrupos
+- rules: limites do gráfico configurado e violações das regras
+- chart: imagem PNG do gráfico
+
+stats e capability são divididos em blocos de `chunk_size` subgrupos (ou
+janelas), calculados em paralelo em processos separados. O job:
+
+- é retomável: cada bloco concluído é acrescentado a <job>.chunks.jsonl;
+  ao retomar, só os blocos que faltam são calculados. As leituras de cada
+  canal são fixadas no início (quantidade e impressão digital): se o
+  histórico for limpo ou regravado, o job falha em vez de misturar versões
+- não atrapalha a ingestão: lê os snapshots dos canais (sem a trava dos
+  arquivos de dados), grava só no próprio diretório, os processos rodam
+  com prioridade menor e o envio de blocos respeita um limite de subgrupos/s
+- expõe o progresso por canal e fase (blocos, subgrupos/s, ETA)
+
+Um job por vez em cada processo; com vários workers, o job roda no worker
+que recebeu a requisição.
+"""
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+from ingestion import summarize
+from storage import atomic_write
+
+PHASES = ("stats", "capability", "rules", "chart")
+CAPABILITY_KEYS = ("mean", "sigma_within", "sigma_overall", "cp", "cpk", "pp", "ppk", "ppm_total")
+JOB_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{6}$")
+
+
+def _finite(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def readings_fingerprint(readings):
+    """Impressão digital das leituras fixadas no job"""
+    return hashlib.sha1(json.dumps(readings).encode("utf-8")).hexdigest()
+
+
+def _pool_context():
+    """
+    Processos novos em vez de fork: a API tem threads (asyncio, alertas,
+    perfilamento) e travas que um fork copiaria no meio do uso. Com
+    forkserver, só o servidor importa os módulos; os processos de cálculo
+    saem dele já prontos
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_worker(niceness):
+    """Processos do backfill com prioridade menor que a da API"""
+    if niceness and hasattr(os, "nice"):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+
+
+def summarize_chunk(readings, sample_size):
+    """Resumos dos subgrupos de um bloco de leituras (múltiplo de sample_size)"""
+    return [summarize(readings[i:i + sample_size]) for i in range(0, len(readings), sample_size)]
+
+
+def capability_chunk(stats, sample_size, lse, lie, window, step):
+    """Capacidade das janelas deslizantes sobre as linhas (subgrupos) do bloco"""
+    from capability import capability_from_stats, sliding_windows
+    result = capability_from_stats(sliding_windows(stats, window, step), sample_size, lse, lie)
+    return {key: [_finite(value) for value in result[key]] for key in CAPABILITY_KEYS}
+
+
+def chart_analysis(chart_type, sample_size, summaries, readings):
+    """Limites, pontos e regras do gráfico (X-R/X-S pelos resumos; os demais pelas leituras)"""
+    from control_charts import SubgroupChart, create_chart
+    chart = create_chart(chart_type, sample_size=sample_size)
+    if isinstance(chart, SubgroupChart):
+        for summary in summaries:
+            chart.update_summary(summary)
+    else:
+        chart.update_many(readings)
+    return chart.analysis()
+
+
+def render_chart_file(path, analysis, title):
+    """
+    Grava a imagem PNG do gráfico; retorna o nome do arquivo (None se não
+    houve leituras suficientes para o gráfico, ex.: fase de referência do EWMA)
+    """
+    if analysis is None:
+        return None
+    from chart_rendering import chart_fingerprint, render_chart
+    path = Path(path)
+    path.write_bytes(render_chart(chart_fingerprint("backfill", str(path)), lambda: analysis, title, "png"))
+    return path.name
+
+
+class InlineExecutor:
+    """Executa os blocos na própria thread do job (workers=0)"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class RateLimiter:
+    """Espaça o envio de blocos para no máximo `rate` unidades/s (0 = sem limite)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next = time.monotonic()
+
+    def wait(self, units, stop):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self.next > now:
+            stop.wait(self.next - now)
+        self.next = max(self.next, now) + units / self.rate
+
+
+class BackfillJob:
+    """
+    Estado de um job: manifesto (<id>.json) e blocos concluídos (<id>.chunks.jsonl)
+
+    O manifesto guarda os parâmetros, a configuração e as leituras fixadas
+    de cada canal; só é regravado nas mudanças de status.
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = Path(directory)
+        self.manifest = manifest
+        self.id = manifest["id"]
+        self.results = {}
+        self.units_done = 0
+        self.run_units = 0
+        self.run_started = None
+
+    @classmethod
+    def create(cls, directory, channels, window=25, step=1, chunk_size=500):
+        """
+        Args:
+            channels: dict nome -> (config do canal, leituras atuais)
+        """
+        job_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        plan = {}
+        for name, (config, readings) in channels.items():
+            m = len(readings) // config.sample_size
+            pinned = readings[:m * config.sample_size]
+            windows = (m - window) // step + 1 if m >= window else 0
+            plan[name] = {
+                "sample_size": config.sample_size,
+                "chart_type": config.chart_type.upper(),
+                "lse": config.lse,
+                "lie": config.lie,
+                "unit": config.unit,
+                "readings": len(pinned),
+                "subgroups": m,
+                "windows": windows,
+                "fingerprint": readings_fingerprint(pinned),
+                "chunks": {
+                    "stats": math.ceil(m / chunk_size),
+                    "capability": math.ceil(windows / chunk_size),
+                    "rules": 1 if m else 0,
+                    "chart": 1 if m else 0,
+                },
+            }
+        job = cls(directory, {
+            "id": job_id,
+            "status": "pending",
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "params": {"window": window, "step": step, "chunk_size": chunk_size},
+            "channels": plan,
+        })
+        job.directory.mkdir(parents=True, exist_ok=True)
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, directory, job_id):
+        """Job gravado em disco, com os blocos já concluídos; None se não existir"""
+        if not JOB_ID.match(job_id):
+            return None
+        path = Path(directory) / f"{job_id}.json"
+        try:
+            job = cls(directory, json.loads(path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return None
+        try:
+            with open(job.chunks_path, "r+b") as f:
+                valid = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Última linha incompleta (processo interrompido na gravação)
+                        f.truncate(valid)
+                        break
+                    job._store(json.loads(line))
+                    valid += len(line)
+        except FileNotFoundError:
+            pass
+        return job
+
+    @property
+    def path(self):
+        return self.directory / f"{self.id}.json"
+
+    @property
+    def chunks_path(self):
+        return self.directory / f"{self.id}.chunks.jsonl"
+
+    def result_path(self, name, suffix="json"):
+        return self.directory / f"{self.id}_{name}.{suffix}"
+
+    def save(self):
+        atomic_write(self.path, json.dumps(self.manifest, indent=2))
+
+    def set_status(self, status, error=None):
+        self.manifest["status"] = status
+        self.manifest["error"] = error
+        key = "started_at" if status == "running" else "finished_at"
+        self.manifest[key] = datetime.now().isoformat(timespec="seconds")
+        self.save()
+
+    def done(self, name, phase, chunk):
+        return chunk in self.results.get((name, phase), {})
+
+    def record(self, name, phase, chunk, units, result):
+        """Grava o bloco concluído (checkpoint) antes de contá-lo como feito"""
+        record = {"channel": name, "phase": phase, "chunk": chunk, "units": units, "result": result}
+        with open(self.chunks_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self._store(record)
+        self.run_units += units
+
+    def _store(self, record):
+        chunks = self.results.setdefault((record["channel"], record["phase"]), {})
+        if record["chunk"] not in chunks:
+            self.units_done += record["units"]
+        chunks[record["chunk"]] = record["result"]
+
+    def phase_results(self, name, phase):
+        """Resultados dos blocos da fase, na ordem dos blocos"""
+        chunks = self.results.get((name, phase), {})
+        return [chunks[i] for i in range(len(chunks))]
+
+    def status(self, active=False):
+        channels = {}
+        total_units = 0
+        for name, plan in self.manifest["channels"].items():
+            total_units += plan["subgroups"] + plan["windows"]
+            channels[name] = {
+                "sample_size": plan["sample_size"],
+                "chart_type": plan["chart_type"],
+                "readings": plan["readings"],
+                "subgroups": plan["subgroups"],
+                "phases": {
+                    phase: {"chunks": plan["chunks"][phase], "done": len(self.results.get((name, phase), {}))}
+                    for phase in PHASES
+                },
+            }
+        chunks = sum(item["chunks"] for channel in channels.values() for item in channel["phases"].values())
+        done = sum(item["done"] for channel in channels.values() for item in channel["phases"].values())
+        status = {
+            key: self.manifest[key]
+            for key in ("id", "status", "created_at", "started_at", "finished_at", "error", "params")
+        }
+        status.update({
+            "active": active,
+            "progress": round(100 * done / chunks, 1) if chunks else 100.0,
+            "chunks": chunks,
+            "chunks_done": done,
+            "units": total_units,
+            "units_done": self.units_done,
+            "channels": channels,
+        })
+        if active and self.run_started is not None:
+            elapsed = time.monotonic() - self.run_started
+            rate = self.run_units / elapsed if elapsed > 0 else 0.0
+            status["units_per_s"] = round(rate, 1)
+            status["eta_s"] = round((total_units - self.units_done) / rate, 1) if rate else None
+        return status
+
+
+class BackfillRunner:
+    """
+    Executa jobs de backfill em uma thread em segundo plano
+
+    Args:
+        directory: diretório dos jobs e resultados
+        get_config: nome do canal -> ChannelConfig
+        load_readings: nome do canal -> leituras do histórico, em ordem
+        workers: processos de cálculo (0 = na própria thread do job)
+        rate: limite de subgrupos (ou janelas) enviados por segundo (0 = sem limite)
+        niceness: redução de prioridade dos processos de cálculo
+    """
+
+    def __init__(self, directory, get_config, load_readings, workers=1, rate=0, niceness=10):
+        self.directory = Path(directory)
+        self.get_config = get_config
+        self.load_readings = load_readings
+        self.workers = workers
+        self.rate = rate
+        self.niceness = niceness
+        self.job = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._stop_status = "cancelled"
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, names, window=25, step=1, chunk_size=500):
+        """Cria e inicia um job; levanta RuntimeError se já houver um em andamento"""
+        with self._lock:
+            self._check_idle()
+            channels = {name: (self.get_config(name), self.load_readings(name)) for name in names}
+            job = BackfillJob.create(self.directory, channels, window=window, step=step, chunk_size=chunk_size)
+            self._launch(job)
+            return job
+
+    def resume(self, job_id):
+        """
+        Retoma um job interrompido, cancelado ou com falha, a partir dos
+        blocos já concluídos; None se o job não existir
+        """
+        with self._lock:
+            self._check_idle()
+            job = BackfillJob.load(self.directory, job_id)
+            if job is None:
+                return None
+            if job.manifest["status"] == "completed":
+                raise ValueError(f"Job {job_id} já concluído")
+            self._launch(job)
+            return job
+
+    def _check_idle(self):
+        if self.active:
+            raise RuntimeError(f"Job de backfill já em andamento: {self.job.id}")
+
+    def _launch(self, job):
+        self.job = job
+        self._stop.clear()
+        self._stop_status = "cancelled"
+        self._thread = threading.Thread(target=self._run, args=(job,), name="cep-backfill", daemon=True)
+        self._thread.start()
+
+    def stop(self, job_id=None, status="cancelled", wait=True):
+        """
+        Interrompe o job em andamento depois dos blocos já enviados; retorna
+        False se não houver job em andamento (com esse id)
+        """
+        thread, job = self._thread, self.job
+        if thread is None or not thread.is_alive() or (job_id is not None and job.id != job_id):
+            return False
+        self._stop_status = status
+        self._stop.set()
+        if wait:
+            thread.join()
+        return True
+
+    def get(self, job_id):
+        """Job em andamento (estado em memória) ou gravado em disco"""
+        job = self.job
+        if job is not None and job.id == job_id:
+            return job
+        return BackfillJob.load(self.directory, job_id)
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return job.status(active=self.active and job is self.job)
+
+    def jobs(self):
+        """Jobs gravados, do mais recente ao mais antigo (só o manifesto)"""
+        items = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            if not JOB_ID.match(path.stem):
+                continue
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+            items.append({
+                key: manifest[key] for key in ("id", "status", "created_at", "finished_at", "error")
+            } | {"channels": list(manifest["channels"]), "active": self.active and self.job.id == manifest["id"]})
+        return items
+
+    def _run(self, job):
+        job.run_units = 0
+        job.run_started = time.monotonic()
+        job.set_status("running")
+        if self.workers:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=_pool_context(),
+                initializer=_init_worker,
+                initargs=(self.niceness,),
+            )
+        else:
+            executor = InlineExecutor()
+        try:
+            readings = self._pinned_readings(job)
+            limiter = RateLimiter(self.rate)
+            phases = (
+                self._stats_tasks(job, readings),
+                self._capability_tasks(job),
+                self._rules_tasks(job, readings),
+                self._chart_tasks(job),
+            )
+            for tasks in phases:
+                if self._stop.is_set():
+                    break
+                self._run_chunks(job, executor, limiter, tasks)
+            if not self._stop.is_set():
+                for name in job.manifest["channels"]:
+                    self._write_result(job, name)
+        except Exception as e:
+            executor.shutdown(wait=False, cancel_futures=True)
+            job.set_status("failed", str(e))
+            return
+        executor.shutdown(wait=True)
+        job.set_status(self._stop_status if self._stop.is_set() else "completed")
+
+    def _pinned_readings(self, job):
+        readings = {}
+        for name, plan in job.manifest["channels"].items():
+            values = self.load_readings(name)[:plan["readings"]]
+            if len(values) < plan["readings"] or readings_fingerprint(values) != plan["fingerprint"]:
+                raise ValueError(
+                    f"O histórico do canal {name} mudou desde o início do job "
+                    "(limpo ou regravado); inicie um novo job"
+                )
+            readings[name] = values
+        return readings
+
+    def _stats_tasks(self, job, readings):
+        chunk_size = job.manifest["params"]["chunk_size"]
+        for name, plan in job.manifest["channels"].items():
+            n = plan["sample_size"]
+            for chunk in range(plan["chunks"]["stats"]):
+                if job.done(name, "stats", chunk):
+                    continue
+                values = readings[name][chunk * chunk_size * n:(chunk + 1) * chunk_size * n]
+                yield name, "stats", chunk, len(values) // n, summarize_chunk, (values, n)
+
+    def _capability_tasks(self, job):
+        from capability import summaries_to_stats
+        params = job.manifest["params"]
+        chunk_size, window, step = params["chunk_size"], params["window"], params["step"]
+        for name, plan in job.manifest["channels"].items():
+            if not plan["windows"]:
+                continue
+            stats = summaries_to_stats([s for chunk in job.phase_results(name, "stats") for s in chunk])
+            for chunk in range(plan["chunks"]["capability"]):
+                if job.done(name, "capability", chunk):
+                    continue
+                first = chunk * chunk_size
+                count = min(chunk_size, plan["windows"] - first)
+                rows = stats[first * step:(first + count - 1) * step + window]
+                yield name, "capability", chunk, count, capability_chunk, \
+                    (rows, plan["sample_size"], plan["lse"], plan["lie"], window, step)
+
+    def _run_chunks(self, job, executor, limiter, tasks):
+        """Envia os blocos (no máximo 2 por processo em voo) e grava cada um ao concluir"""
+        max_in_flight = 2 * max(1, self.workers)
+        pending = {}
+        while True:
+            while len(pending) < max_in_flight and not self._stop.is_set():
+                task = next(tasks, None)
+                if task is None:
+                    break
+                name, phase, chunk, units, fn, args = task
+                limiter.wait(units, self._stop)
+                if self._stop.is_set():
+                    break
+                pending[executor.submit(fn, *args)] = (name, phase, chunk, units)
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, phase, chunk, units = pending.pop(future)
+                job.record(name, phase, chunk, units, future.result())
+
+    def _rules_tasks(self, job, readings):
+        for name, plan in job.manifest["channels"].items():
+            if not plan["chunks"]["rules"] or job.done(name, "rules", 0):
+                continue
+            summaries = [s for chunk in job.phase_results(name, "stats") for s in chunk]
+            yield name, "rules", 0, 0, chart_analysis, \
+                (plan["chart_type"], plan["sample_size"], summaries, readings[name])
+
+    def _chart_tasks(self, job):
+        for name, plan in job.manifest["channels"].items():
+            if not plan["chunks"]["chart"] or job.done(name, "chart", 0):
+                continue
+            analysis = job.results[(name, "rules")][0]
+            title = f"{name.capitalize()} ({plan['unit']})" if plan["unit"] else name.capitalize()
+            yield name, "chart", 0, 0, render_chart_file, (job.result_path(name, "png"), analysis, title)
+
+    def _write_result(self, job, name):
+        """Arquivo de resultado do canal, montado a partir dos blocos gravados"""
+        from capability import capability_summary_from_stats, summaries_to_stats
+        plan = job.manifest["channels"][name]
+        params = job.manifest["params"]
+        summaries = [s for chunk in job.phase_results(name, "stats") for s in chunk]
+        if not summaries:
+            return
+        analysis = job.results[(name, "rules")][0]
+
+        rolling = {key: [] for key in CAPABILITY_KEYS}
+        for chunk in job.phase_results(name, "capability"):
+            for key in CAPABILITY_KEYS:
+                rolling[key] += chunk[key]
+        rolling["end_subgroup"] = [
+            i * params["step"] + params["window"] for i in range(len(rolling["cp"]))
+        ]
+        stats = summaries_to_stats(summaries)
+        result = {
+            "job": job.id,
+            "channel": name,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            **{key: plan[key] for key in ("sample_size", "chart_type", "lse", "lie", "readings", "subgroups")},
+            "chart": analysis,
+            "chart_file": job.results[(name, "chart")][0],
+            "capability": {
+                "overall": capability_summary_from_stats(stats, plan["sample_size"], plan["lse"], plan["lie"])
+                if len(summaries) >= 2 else None,
+                "window": params["window"],
+                "step": params["step"],
+                "rolling": rolling,
+            },
+            "summaries": summaries,
+        }
+        atomic_write(job.result_path(name), json.dumps(result))
@@ -0,0 +1,303 @@
+"""
+Suíte de benchmarks reprodutível: ingestão, histórico e análise CEP
+
+Roda tudo em processo (FastAPI TestClient) sobre históricos sintéticos de
+tamanhos configuráveis, mede cada alvo em várias rodadas e grava os
+resultados em JSON (estatísticas no estilo pytest-benchmark). Comparando
+com um baseline salvo, regressões de desempenho aparecem como diferenças.
+
+Uso:
+    python benchmarks/run_benchmarks.py                              # 1k, 10k, 100k leituras
+    python benchmarks/run_benchmarks.py --sizes 1000 1000000 --rounds 3
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from synthetic_data import generate_subgroups, to_samples  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+SAMPLE_SIZE = 5
+
+
+def generate_history(total_readings, mean, std, seed):
+    """Histórico sintético no formato do backend ({"Amostra", "Dados"})"""
+    subgroups = generate_subgroups(
+        total_readings // SAMPLE_SIZE, readings_per_sample=SAMPLE_SIZE,
+        mean_temp=mean, std_dev=std, seed=seed
+    )
+    return to_samples(subgroups)
+
+
+def prepare_workspace(workdir):
+    """Cria a configuração de canais apontando para arquivos temporários"""
+    config = {
+        "temperature": {
+            "data_file": str(workdir / "temperature_data.json"),
+            "sample_size": SAMPLE_SIZE, "lse": 28.0, "lie": 18.0, "chart_type": "X-R", "unit": "°C",
+        },
+        "humidity": {
+            "data_file": str(workdir / "humidity_data.json"),
+            "sample_size": SAMPLE_SIZE, "lse": 70.0, "lie": 40.0, "chart_type": "X-R", "unit": "%",
+        },
+    }
+    config_path = workdir / "channels.json"
+    config_path.write_text(json.dumps(config), encoding="utf-8")
+    os.environ["CHANNELS_CONFIG"] = str(config_path)
+    return config
+
+
+def write_histories(config, total_readings):
+    for seed, (name, mean, std) in enumerate([("temperature", 23.0, 1.5), ("humidity", 55.0, 4.0)]):
+        history = generate_history(total_readings, mean, std, seed)
+        Path(config[name]["data_file"]).write_text(json.dumps(history), encoding="utf-8")
+
+
+def measure(func, rounds, warmup=1):
+    """Executa func várias vezes e retorna estatísticas em segundos"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "max": max(timings),
+        "mean": statistics.mean(timings),
+        "median": statistics.median(timings),
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "rounds": rounds,
+    }
+
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.warm_up_cep()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def measure_startup(workdir, rounds):
+    """
+    Tempo de inicialização da API em processos novos (importação do main)
+    e tempo da carga sob demanda das dependências CEP
+    """
+    env = dict(os.environ, CEP_WARMUP="0", PYTHONPATH=str(BACKEND_DIR))
+    imports, cep_loads = [], []
+    for _ in range(rounds):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stdout.split()
+        imports.append(float(output[-2]))
+        cep_loads.append(float(output[-1]))
+
+    def describe(timings):
+        return {
+            "min": min(timings),
+            "max": max(timings),
+            "mean": statistics.mean(timings),
+            "median": statistics.median(timings),
+            "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "rounds": rounds,
+        }
+
+    return {"startup_import": describe(imports), "cep_lazy_load": describe(cep_loads)}
+
+
+def xr_like(history):
+    """Objeto com a mesma interface do XR_graph usada pelas regras"""
+    import pandas as pd
+    from cep_constants import get_constants
+
+    values = np.asarray([sample["Dados"] for sample in history], dtype=float)
+    x_bar = values.mean(axis=1)
+    r = values.max(axis=1) - values.min(axis=1)
+    constants = get_constants(SAMPLE_SIZE)
+    x_double_mean, r_mean = x_bar.mean(), r.mean()
+    return SimpleNamespace(
+        df=pd.DataFrame({"X_bar": x_bar, "R": r}),
+        x_double_mean=x_double_mean,
+        r_mean=r_mean,
+        lsc_x_bar_graph=x_double_mean + constants["A2"] * r_mean,
+        lic_x_bar_graph=x_double_mean - constants["A2"] * r_mean,
+        lsc_r_bar_graph=constants["D4"] * r_mean,
+        lic_r_bar_graph=constants["D3"] * r_mean,
+    )
+
+
+def build_targets(main, client):
+    """Alvos de benchmark: nome -> função sem argumentos (ou None se indisponível)"""
+    import probability
+
+    history = main.load_data(main.channel_path("temperature"))
+    xr = xr_like(history)
+    n_samples = len(history)
+
+    def receive_data():
+        response = client.post("/data", json={"temperature": 23.4})
+        assert response.status_code == 201, response.text
+
+    def get_history():
+        response = client.get("/history")
+        assert response.status_code == 200, response.text
+
+    def history_pydantic():
+        # Caminho anterior do /history, para comparação: leitura com json,
+        # validação pelo HistoryResponse e serialização com json
+        data = json.loads(main.channel_path("temperature").read_text())
+        body = main.HistoryResponse.model_validate({
+            "samples": data,
+            "total_samples": len(data),
+            "total_readings": sum(len(sample["Dados"]) for sample in data),
+            "current_sample": data[-1] if data else None,
+        })
+        json.dumps(body.model_dump(mode="json"))
+
+    def health_check():
+        response = client.get("/health")
+        assert response.status_code == 200, response.text
+
+    def western_rules():
+        assert main.analyze_western_electric_rules(xr, chart_type="X") is not None
+
+    def probability_success():
+        # Limpa a memoização para medir o cálculo, não o cache
+        probability.binomial_probability.cache_clear()
+        probability.cumulative_binomial.cache_clear()
+        main.calculate_probability_success(0.8, n_samples)
+
+    def analyze_cep_combined():
+        response = client.post("/cep/analyze/combined")
+        assert response.status_code == 200, response.text
+
+    return {
+        "receive_data": receive_data,
+        "get_history": get_history,
+        "get_history_pydantic": history_pydantic,
+        "health_check": health_check,
+        "analyze_western_electric_rules": western_rules,
+        "calculate_probability_success": probability_success,
+        "analyze_cep_combined": analyze_cep_combined if main.load_cep_modules() else None,
+    }
+
+
+def run(sizes, rounds, only=None):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="cep_bench_") as tmp:
+        workdir = Path(tmp)
+        config = prepare_workspace(workdir)
+        write_histories(config, sizes[0])
+
+        import logging
+        logging.disable(logging.INFO)
+
+        if not only or "startup" in only:
+            for name, stats in measure_startup(workdir, rounds).items():
+                results.append({"name": name, "group": "startup", "param": 0, "stats": stats})
+                print(f"  ✓ {name}: mediana {stats['median'] * 1000:.3f} ms ({rounds} rodadas)")
+
+        from fastapi.testclient import TestClient
+        import main
+        client = TestClient(main.app)
+
+        for total_readings in sizes:
+            write_histories(config, total_readings)
+            targets = build_targets(main, client)
+            for name, func in targets.items():
+                if only and name not in only:
+                    continue
+                bench_name = f"{name}[{total_readings}]"
+                if func is None:
+                    print(f"  - {bench_name}: ignorado (módulos CEP indisponíveis)")
+                    continue
+                stats = measure(func, rounds)
+                results.append({
+                    "name": bench_name,
+                    "group": name,
+                    "param": total_readings,
+                    "stats": stats,
+                })
+                print(f"  ✓ {bench_name}: mediana {stats['median'] * 1000:.3f} ms "
+                      f"(min {stats['min'] * 1000:.3f} ms, {rounds} rodadas)")
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Compara medianas com o baseline; retorna a lista de regressões"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    previous = {bench["name"]: bench["stats"]["median"] for bench in baseline["benchmarks"]}
+    regressions = []
+    print(f"\nComparação com {baseline_path} (limite {threshold:.2f}x):")
+    for bench in results:
+        before = previous.get(bench["name"])
+        if before is None:
+            continue
+        ratio = bench["stats"]["median"] / before if before else float("inf")
+        marker = "✗" if ratio > threshold else "✓"
+        print(f"  {marker} {bench['name']}: {ratio:.2f}x")
+        if ratio > threshold:
+            regressions.append(bench["name"])
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmarks do backend CEP")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Tamanhos de histórico (número de leituras)")
+    parser.add_argument("--rounds", type=int, default=5, help="Rodadas por benchmark")
+    parser.add_argument("--only", nargs="+", help="Executa apenas estes alvos")
+    parser.add_argument("--save", help="Salva os resultados neste arquivo JSON")
+    parser.add_argument("--compare", help="Baseline JSON para comparação")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Razão mediana/baseline considerada regressão")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    print(f"Benchmarks CEP - tamanhos {args.sizes}, {args.rounds} rodadas")
+    results = run(args.sizes, args.rounds, args.only)
+
+    output = {
+        "datetime": datetime.now().isoformat(),
+        "machine_info": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "benchmarks": results,
+    }
+    if args.save:
+        Path(args.save).write_text(json.dumps(output, indent=2), encoding="utf-8")
+        print(f"\n✓ Resultados salvos em: {args.save}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"\n✗ {len(regressions)} regressão(ões) detectada(s)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,135 @@
+"""
+Protocolo binário compacto de ingestão para dispositivos com pouca banda
+
+Um quadro (little-endian) leva um lote de registros de um dispositivo:
+
+    cabeçalho (10 bytes)  struct "<2sBBIH"
+        magic       2s   b"CP"
+        version     u8   1
+        n_channels  u8   C (1..16)
+        device_id   u32
+        n_records   u16  N
+    canais (C bytes)      u8 por canal: binary_id configurado em channels.json
+    registros (N x (4 + 2C) bytes)
+        timestamp   u32  32 bits baixos do horário Unix em ms (o
+                         simulador envia time.time() * 1000 % 2**32)
+        valores     C x i16, em centésimos (23.45 °C -> 2345);
+                    -32768 indica leitura ausente (ex.: falha do sensor)
+
+Um registro com temperatura e umidade ocupa 8 bytes, contra ~60 do JSON
+equivalente. O corpo da requisição pode conter vários quadros seguidos.
+"""
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"CP"
+VERSION = 1
+HEADER = struct.Struct("<2sBBIH")
+SCALE = 100.0
+MISSING = -32768
+MAX_CHANNELS = 16
+
+Frame = namedtuple("Frame", ["device_id", "channel_ids", "timestamps", "values"])
+
+
+def _record_dtype(n_channels):
+    return np.dtype([("timestamp", "<u4"), ("values", "<i2", (n_channels,))])
+
+
+def encode_frame(device_id, channel_ids, timestamps, values):
+    """
+    Monta um quadro (usado pelo simulador e por testes)
+
+    Args:
+        values: matriz N x C de leituras (NaN = ausente)
+    """
+    values = np.asarray(values, dtype=float).reshape(len(timestamps), len(channel_ids))
+    records = np.empty(len(timestamps), dtype=_record_dtype(len(channel_ids)))
+    records["timestamp"] = timestamps
+    scaled = np.round(values * SCALE)
+    records["values"] = np.where(np.isnan(scaled), MISSING, scaled).astype("<i2")
+    header = HEADER.pack(MAGIC, VERSION, len(channel_ids), device_id, len(timestamps))
+    return header + bytes(channel_ids) + records.tobytes()
+
+
+def decode_frames(payload):
+    """
+    Decodifica todos os quadros do corpo
+    Levanta ValueError se algum quadro estiver malformado
+    """
+    frames = []
+    view = memoryview(payload)
+    offset = 0
+    while offset < len(view):
+        if len(view) - offset < HEADER.size:
+            raise ValueError(f"Quadro truncado no byte {offset}")
+        magic, version, n_channels, device_id, n_records = HEADER.unpack_from(view, offset)
+        if magic != MAGIC:
+            raise ValueError(f"Assinatura inválida no byte {offset}")
+        if version != VERSION:
+            raise ValueError(f"Versão de protocolo não suportada: {version}")
+        if not 1 <= n_channels <= MAX_CHANNELS:
+            raise ValueError(f"Número de canais inválido: {n_channels}")
+        offset += HEADER.size
+
+        dtype = _record_dtype(n_channels)
+        end = offset + n_channels + n_records * dtype.itemsize
+        if end > len(view):
+            raise ValueError(f"Quadro do dispositivo {device_id} truncado")
+        channel_ids = list(view[offset:offset + n_channels])
+        records = np.frombuffer(view, dtype=dtype, count=n_records, offset=offset + n_channels)
+        offset = end
+
+        raw = records["values"]
+        values = raw / SCALE
+        values[raw == MISSING] = np.nan
+        frames.append(Frame(device_id, channel_ids, records["timestamp"].copy(), values))
+    return frames
+
+
+def unwrap_timestamps(timestamps, now):
+    """
+    Timestamps completos (Unix, ms) a partir dos 32 bits baixos: o instante
+    mais próximo antes de `now` (a volta do u32 dura ~49 dias)
+    """
+    ticks = np.asarray(timestamps, dtype=np.int64)
+    return now - ((now - ticks) % 2**32)
+
+
+def timed_readings_by_channel(frames, now):
+    """
+    Leituras válidas agrupadas por binary_id, na ordem de chegada (valores
+    ausentes descartados), com os timestamps completos (ms) de cada
+    leitura: {binary_id: (timestamps, valores)}
+    """
+    readings = {}
+    for frame in frames:
+        timestamps = unwrap_timestamps(frame.timestamps, now)
+        for column, binary_id in enumerate(frame.channel_ids):
+            values = frame.values[:, column]
+            valid = ~np.isnan(values)
+            channel_timestamps, channel_values = readings.setdefault(binary_id, ([], []))
+            channel_timestamps.extend(timestamps[valid].tolist())
+            channel_values.extend(values[valid].tolist())
+    return readings
+
+
+def paired_records(frames):
+    """
+    Registros com leituras válidas em mais de um canal, como dicts
+    {binary_id: valor} (leituras do mesmo instante, para análise multivariada)
+    """
+    rows = []
+    for frame in frames:
+        if len(frame.channel_ids) < 2:
+            continue
+        valid = ~np.isnan(frame.values)
+        for values, mask in zip(frame.values.tolist(), valid.tolist()):
+            if sum(mask) >= 2:
+                rows.append({
+                    binary_id: value
+                    for binary_id, value, ok in zip(frame.channel_ids, values, mask) if ok
+                })
+    return rows
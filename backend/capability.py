@@ -0,0 +1,268 @@
+"""
+Análise de capacidade do processo (Cp, Cpk, Pp, Ppk) vetorizada com NumPy
+
+Os cálculos partem das estatísticas de cada subgrupo (média, amplitude e
+desvio padrão: matriz m x 3), que a ingestão grava no "Resumo" de cada
+amostra ao fechá-la; as leituras só são usadas pelas funções que recebem
+matrizes de subgrupos (m subgrupos x n leituras). Não depende do
+XR_graph. Todas as funções aceitam dimensões extras à esquerda (canais,
+janelas deslizantes), de forma que vários cálculos sejam feitos em uma
+única chamada vetorizada.
+"""
+import numpy as np
+from scipy.special import ndtr
+
+from cep_constants import get_constants
+
+
+def subgroups_to_array(data, sample_size):
+    """
+    Converte a lista de amostras ({"Amostra", "Dados"}) em uma matriz m x n
+    Apenas amostras completas (com sample_size leituras) são consideradas
+    """
+    rows = [
+        sample["Dados"] for sample in data
+        if isinstance(sample, dict) and len(sample.get("Dados", [])) == sample_size
+    ]
+    if not rows:
+        return np.empty((0, sample_size), dtype=float)
+    return np.asarray(rows, dtype=float)
+
+
+# Colunas da matriz de estatísticas dos subgrupos (mesmos campos do "Resumo")
+STAT_COLUMNS = ("media", "amplitude", "desvio_padrao")
+
+
+def subgroup_stats(subgroups):
+    """
+    Estatísticas de cada subgrupo a partir das leituras
+    (..., m, n) -> (..., m, 3) com média, amplitude e desvio padrão
+    """
+    subgroups = np.asarray(subgroups, dtype=float)
+    return np.stack([
+        subgroups.mean(axis=-1),
+        subgroups.max(axis=-1) - subgroups.min(axis=-1),
+        subgroups.std(axis=-1, ddof=1),
+    ], axis=-1)
+
+
+def summaries_to_stats(summaries):
+    """Resumos gravados na ingestão (ingestion.complete_summaries) -> matriz m x 3"""
+    if not summaries:
+        return np.empty((0, len(STAT_COLUMNS)), dtype=float)
+    return np.array([[summary[key] for key in STAT_COLUMNS] for summary in summaries], dtype=float)
+
+
+def capability_from_stats(stats, n, lse, lie):
+    """
+    Calcula os índices de capacidade a partir das estatísticas dos subgrupos
+
+    Args:
+        stats: array (..., m, 3) com média, amplitude e desvio de cada subgrupo
+        n: tamanho dos subgrupos
+        lse: limite superior de especificação (escalar ou array com shape ...)
+        lie: limite inferior de especificação (escalar ou array com shape ...)
+
+    Returns:
+        Dicionário de arrays com shape (...)
+    """
+    stats = np.asarray(stats, dtype=float)
+    d2 = get_constants(n)["d2"]
+    lse = np.asarray(lse, dtype=float)
+    lie = np.asarray(lie, dtype=float)
+
+    x_bar, r, s = stats[..., 0], stats[..., 1], stats[..., 2]
+    m = stats.shape[-2]
+    mean = x_bar.mean(axis=-1)
+    r_mean = r.mean(axis=-1)
+
+    # Sigma dentro dos subgrupos (R-barra/d2) e sigma global (amostral), este
+    # pela soma de quadrados dentro + entre subgrupos, sem as leituras
+    sigma_within = r_mean / d2
+    sum_squares = (n - 1) * (s ** 2).sum(axis=-1) + n * ((x_bar - mean[..., None]) ** 2).sum(axis=-1)
+    sigma_overall = np.sqrt(sum_squares / (m * n - 1))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cp = (lse - lie) / (6 * sigma_within)
+        cpu = (lse - mean) / (3 * sigma_within)
+        cpl = (mean - lie) / (3 * sigma_within)
+        cpk = np.minimum(cpu, cpl)
+        pp = (lse - lie) / (6 * sigma_overall)
+        ppu = (lse - mean) / (3 * sigma_overall)
+        ppl = (mean - lie) / (3 * sigma_overall)
+        ppk = np.minimum(ppu, ppl)
+
+        # PPM esperado fora da especificação (modelo normal, sigma global)
+        ppm_below = ndtr((lie - mean) / sigma_overall) * 1e6
+        ppm_above = ndtr((mean - lse) / sigma_overall) * 1e6
+
+    return {
+        "mean": mean,
+        "r_mean": r_mean,
+        "sigma_within": sigma_within,
+        "sigma_overall": sigma_overall,
+        "cp": cp,
+        "cpk": cpk,
+        "cpu": cpu,
+        "cpl": cpl,
+        "pp": pp,
+        "ppk": ppk,
+        "ppm_below": ppm_below,
+        "ppm_above": ppm_above,
+        "ppm_total": ppm_below + ppm_above,
+    }
+
+
+def capability_batch(subgroups, lse, lie):
+    """
+    Calcula os índices de capacidade para um lote de matrizes de subgrupos
+
+    Args:
+        subgroups: array (..., m, n) com as leituras de cada subgrupo
+        lse: limite superior de especificação (escalar ou array com shape ...)
+        lie: limite inferior de especificação (escalar ou array com shape ...)
+
+    Returns:
+        Dicionário de arrays com shape (...)
+    """
+    subgroups = np.asarray(subgroups, dtype=float)
+    return capability_from_stats(subgroup_stats(subgroups), subgroups.shape[-1], lse, lie)
+
+
+def bootstrap_intervals(stats, n, lse, lie, n_boot=1000, confidence=0.95,
+                        seed=None, chunk_size=250):
+    """
+    Intervalos de confiança bootstrap (percentil) para Cp, Cpk, Pp e Ppk
+
+    Os subgrupos são reamostrados com reposição (preserva a estrutura
+    racional dos subgrupos); basta reamostrar as linhas da matriz de
+    estatísticas. As reamostragens são processadas em blocos de
+    chunk_size para limitar o uso de memória.
+    """
+    stats = np.asarray(stats, dtype=float)
+    m = stats.shape[-2]
+    rng = np.random.default_rng(seed)
+    lse = np.expand_dims(np.asarray(lse, dtype=float), -1)
+    lie = np.expand_dims(np.asarray(lie, dtype=float), -1)
+
+    keys = ("cp", "cpk", "pp", "ppk")
+    draws = {key: [] for key in keys}
+    for start in range(0, n_boot, chunk_size):
+        size = min(chunk_size, n_boot - start)
+        idx = rng.integers(0, m, size=(size, m))
+        # (..., m, 3) -> (..., size, m, 3)
+        resampled = stats[..., idx, :]
+        result = capability_from_stats(resampled, n, lse, lie)
+        for key in keys:
+            draws[key].append(result[key])
+
+    alpha = (1 - confidence) / 2
+    intervals = {}
+    for key in keys:
+        values = np.concatenate(draws[key], axis=-1)
+        with np.errstate(invalid="ignore"):
+            lower, upper = np.nanquantile(values, [alpha, 1 - alpha], axis=-1)
+        intervals[key] = {"lower": lower, "upper": upper}
+    return intervals
+
+
+def sliding_windows(rows, window, step=1):
+    """
+    Visão (sem cópia) de janelas deslizantes sobre as linhas (subgrupos)
+    Retorna array (w, window, k), pronto para capability_from_stats
+    (k = 3 colunas de estatísticas) ou capability_batch (k = n leituras)
+    """
+    rows = np.asarray(rows, dtype=float)
+    if window > rows.shape[0]:
+        return np.empty((0, window, rows.shape[-1]), dtype=float)
+    windows = np.lib.stride_tricks.sliding_window_view(rows, window, axis=0)
+    # sliding_window_view coloca a janela no último eixo: (w, k, window)
+    return np.swapaxes(windows, -1, -2)[::step]
+
+
+def _to_float(value):
+    """Converte escalar NumPy em float JSON-compatível (inf/nan -> None)"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def capability_summary_from_stats(stats, n, lse, lie, n_boot=0, confidence=0.95, seed=None):
+    """
+    Resumo de capacidade de um único canal, pronto para resposta JSON,
+    a partir das estatísticas dos subgrupos (matriz m x 3)
+    """
+    stats = np.asarray(stats, dtype=float)
+    result = capability_from_stats(stats, n, lse, lie)
+    summary = {key: _to_float(value) for key, value in result.items()}
+    summary["lse"] = float(lse)
+    summary["lie"] = float(lie)
+    summary["subgroups"] = int(stats.shape[0])
+    summary["subgroup_size"] = int(n)
+    if n_boot:
+        intervals = bootstrap_intervals(
+            stats, n, lse, lie, n_boot=n_boot, confidence=confidence, seed=seed
+        )
+        summary["confidence_intervals"] = {
+            key: {
+                "lower": _to_float(bounds["lower"]),
+                "upper": _to_float(bounds["upper"]),
+            }
+            for key, bounds in intervals.items()
+        }
+        summary["confidence"] = confidence
+        summary["bootstrap_samples"] = n_boot
+    return summary
+
+
+def capability_summary(subgroups, lse, lie, n_boot=0, confidence=0.95, seed=None):
+    """
+    Resumo de capacidade de um único canal a partir das leituras (matriz m x n)
+    """
+    subgroups = np.asarray(subgroups, dtype=float)
+    return capability_summary_from_stats(
+        subgroup_stats(subgroups), subgroups.shape[1], lse, lie,
+        n_boot=n_boot, confidence=confidence, seed=seed
+    )
+
+
+def capability_for_channels(channels, window=None, step=1):
+    """
+    Capacidade de vários canais de uma vez
+
+    Args:
+        channels: dict nome -> (stats, n, lse, lie), com stats a matriz m x 3
+            de estatísticas dos subgrupos (summaries_to_stats)
+        window: se informado, calcula por janela deslizante de subgrupos
+
+    Canais com a mesma forma de matriz e o mesmo tamanho de subgrupo são
+    empilhados e calculados em uma única chamada de capability_from_stats.
+    """
+    groups = {}
+    for name, (stats, n, lse, lie) in channels.items():
+        stats = np.asarray(stats, dtype=float)
+        if window:
+            stats = sliding_windows(stats, window, step)
+        groups.setdefault((stats.shape, n), []).append((name, stats, lse, lie))
+
+    results = {}
+    for (shape, n), members in groups.items():
+        if 0 in shape:
+            for name, _, lse, lie in members:
+                results[name] = None
+            continue
+        stacked = np.stack([stats for _, stats, _, _ in members])
+        lse = np.array([m[2] for m in members], dtype=float)
+        lie = np.array([m[3] for m in members], dtype=float)
+        if window:
+            lse = lse[:, None]
+            lie = lie[:, None]
+        batch = capability_from_stats(stacked, n, lse, lie)
+        for i, (name, _, _, _) in enumerate(members):
+            if window:
+                results[name] = {
+                    key: [_to_float(v) for v in values[i]]
+                    for key, values in batch.items()
+                }
+            else:
+                results[name] = {key: _to_float(values[i]) for key, values in batch.items()}
+    return results
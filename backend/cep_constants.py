@@ -0,0 +1,78 @@
+"""
+Tabela de constantes para gráficos de controle (n = 2..25)
+
+Os valores de d2 e d3 são os tabelados na literatura de CEP (Montgomery).
+As demais constantes (A2, D3, D4, c4, A3, B3, B4) são derivadas deles
+uma única vez, na importação do módulo, e ficam em memória.
+"""
+import math
+
+MIN_SUBGROUP_SIZE = 2
+MAX_SUBGROUP_SIZE = 25
+
+# n: (d2, d3)
+_D2_D3 = {
+    2: (1.128, 0.853),
+    3: (1.693, 0.888),
+    4: (2.059, 0.880),
+    5: (2.326, 0.864),
+    6: (2.534, 0.848),
+    7: (2.704, 0.833),
+    8: (2.847, 0.820),
+    9: (2.970, 0.808),
+    10: (3.078, 0.797),
+    11: (3.173, 0.787),
+    12: (3.258, 0.778),
+    13: (3.336, 0.770),
+    14: (3.407, 0.763),
+    15: (3.472, 0.756),
+    16: (3.532, 0.750),
+    17: (3.588, 0.744),
+    18: (3.640, 0.739),
+    19: (3.689, 0.734),
+    20: (3.735, 0.729),
+    21: (3.778, 0.724),
+    22: (3.819, 0.720),
+    23: (3.858, 0.716),
+    24: (3.895, 0.712),
+    25: (3.931, 0.708),
+}
+
+
+def _c4(n):
+    """Constante c4 (viés do desvio padrão amostral)"""
+    return math.sqrt(2.0 / (n - 1)) * math.exp(math.lgamma(n / 2) - math.lgamma((n - 1) / 2))
+
+
+def _build_table():
+    """Monta a tabela completa de constantes para cada tamanho de subgrupo"""
+    table = {}
+    for n, (d2, d3) in _D2_D3.items():
+        c4 = _c4(n)
+        s_factor = 3 * math.sqrt(1 - c4 ** 2) / c4
+        table[n] = {
+            "n": n,
+            "d2": d2,
+            "d3": d3,
+            "A2": 3 / (d2 * math.sqrt(n)),
+            "D3": max(0.0, 1 - 3 * d3 / d2),
+            "D4": 1 + 3 * d3 / d2,
+            "c4": c4,
+            "A3": 3 / (c4 * math.sqrt(n)),
+            "B3": max(0.0, 1 - s_factor),
+            "B4": 1 + s_factor,
+        }
+    return table
+
+
+CONSTANTS_TABLE = _build_table()
+
+
+def get_constants(n):
+    """Retorna as constantes para o tamanho de subgrupo n"""
+    try:
+        return CONSTANTS_TABLE[int(n)]
+    except KeyError:
+        raise ValueError(
+            f"Tamanho de subgrupo {n} fora da tabela ({MIN_SUBGROUP_SIZE}..{MAX_SUBGROUP_SIZE})"
+        )
@@ -0,0 +1,204 @@
+"""
+Registro de configuração por canal (tamanho do subgrupo, limites de
+especificação e tipo de gráfico)
+
+A configuração é lida de um arquivo JSON uma única vez na inicialização e
+pode ser recarregada em tempo de execução (reload). As análises consultam
+apenas o registro em memória, nunca o disco.
+
+Formato do arquivo:
+{
+  "temperature": {"data_file": "temperature_data.json", "sample_size": 5,
+                  "lse": 28.0, "lie": 18.0, "chart_type": "X-R", "unit": "°C",
+                  "binary_id": 0, "valid_min": -40.0, "valid_max": 80.0,
+                  "max_step": 5.0, "stuck_limit": 60},
+  ...
+}
+
+valid_min/valid_max, max_step e stuck_limit configuram o filtro de saúde
+do sensor na ingestão (sensor_health.py); ausentes, a verificação
+correspondente não é feita.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, field_validator, model_validator
+
+from cep_constants import MIN_SUBGROUP_SIZE, MAX_SUBGROUP_SIZE, get_constants
+from control_charts import CHART_TYPES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNELS = {
+    "temperature": {
+        "data_file": "temperature_data.json",
+        "sample_size": 5,
+        "lse": 28.0,
+        "lie": 18.0,
+        "chart_type": "X-R",
+        "unit": "°C",
+        "binary_id": 0,
+        # Faixa de medição do DHT22
+        "valid_min": -40.0,
+        "valid_max": 80.0,
+        "max_step": 5.0,
+        "stuck_limit": 60,
+    },
+    "humidity": {
+        "data_file": "humidity_data.json",
+        "sample_size": 5,
+        "lse": 70.0,
+        "lie": 40.0,
+        "chart_type": "X-R",
+        "unit": "%",
+        "binary_id": 1,
+        "valid_min": 0.0,
+        "valid_max": 100.0,
+        "max_step": 15.0,
+        "stuck_limit": 60,
+    },
+}
+
+
+class ChannelConfig(BaseModel):
+    name: str
+    data_file: str
+    sample_size: int = 5
+    lse: float
+    lie: float
+    chart_type: str = "X-R"
+    unit: str = ""
+    # Identificador do canal no protocolo binário de ingestão (0..255)
+    binary_id: Optional[int] = None
+    # Filtro de saúde do sensor: faixa física, maior salto entre leituras
+    # consecutivas e leituras idênticas seguidas toleradas (None = sem verificação)
+    valid_min: Optional[float] = None
+    valid_max: Optional[float] = None
+    max_step: Optional[float] = None
+    stuck_limit: Optional[int] = None
+
+    @field_validator("sample_size")
+    @classmethod
+    def check_sample_size(cls, value):
+        if not MIN_SUBGROUP_SIZE <= value <= MAX_SUBGROUP_SIZE:
+            raise ValueError(f"sample_size deve estar entre {MIN_SUBGROUP_SIZE} e {MAX_SUBGROUP_SIZE}")
+        return value
+
+    @field_validator("chart_type")
+    @classmethod
+    def check_chart_type(cls, value):
+        value = value.upper()
+        if value not in CHART_TYPES:
+            raise ValueError(f"chart_type deve ser um de {', '.join(CHART_TYPES)}")
+        return value
+
+    @field_validator("binary_id")
+    @classmethod
+    def check_binary_id(cls, value):
+        if value is not None and not 0 <= value <= 255:
+            raise ValueError("binary_id deve estar entre 0 e 255")
+        return value
+
+    @field_validator("max_step")
+    @classmethod
+    def check_max_step(cls, value):
+        if value is not None and value <= 0:
+            raise ValueError("max_step deve ser positivo")
+        return value
+
+    @field_validator("stuck_limit")
+    @classmethod
+    def check_stuck_limit(cls, value):
+        if value is not None and value < 2:
+            raise ValueError("stuck_limit deve ser pelo menos 2")
+        return value
+
+    @model_validator(mode="after")
+    def check_limits(self):
+        if self.lse <= self.lie:
+            raise ValueError("lse deve ser maior que lie")
+        if self.valid_min is not None and self.valid_max is not None and self.valid_min >= self.valid_max:
+            raise ValueError("valid_max deve ser maior que valid_min")
+        return self
+
+    @property
+    def path(self):
+        return Path(self.data_file)
+
+    @property
+    def spec_limits(self):
+        return self.lse, self.lie
+
+    @property
+    def constants(self):
+        """Constantes A2, D3, D4, d2... da tabela em memória"""
+        return get_constants(self.sample_size)
+
+
+class ChannelRegistry:
+    """Registro em memória das configurações de canal"""
+
+    def __init__(self, config_path):
+        self.config_path = Path(config_path)
+        self._channels = {}
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.load()
+
+    def _read(self):
+        if not self.config_path.exists():
+            logger.info(f"{self.config_path} não encontrado, usando configuração padrão dos canais")
+            return DEFAULT_CHANNELS
+        return json.loads(self.config_path.read_text(encoding="utf-8"))
+
+    def load(self):
+        """
+        Lê e valida o arquivo de configuração
+        Em caso de erro, a configuração atual é mantida e a exceção propagada
+        """
+        raw = self._read()
+        channels = {
+            name: ChannelConfig(name=name, **values)
+            for name, values in raw.items()
+        }
+        binary_ids = [config.binary_id for config in channels.values() if config.binary_id is not None]
+        if len(binary_ids) != len(set(binary_ids)):
+            raise ValueError("binary_id repetido entre canais")
+        with self._lock:
+            self._channels = channels
+            self.loaded_at = datetime.now()
+        logger.info(f"Configuração de canais carregada: {', '.join(channels)}")
+        return channels
+
+    reload = load
+
+    def get(self, name):
+        """Retorna a configuração do canal (KeyError se não existir)"""
+        return self._channels[name]
+
+    def by_binary_id(self, binary_id):
+        """Configuração do canal com o binary_id (None se não houver)"""
+        for config in self._channels.values():
+            if config.binary_id == binary_id:
+                return config
+        return None
+
+    def names(self):
+        return list(self._channels)
+
+    def items(self):
+        return list(self._channels.items())
+
+    def __contains__(self, name):
+        return name in self._channels
+
+    def to_dict(self):
+        return {
+            "config_file": str(self.config_path),
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "channels": {name: config.model_dump() for name, config in self._channels.items()},
+        }
@@ -0,0 +1,162 @@
+"""
+Renderização headless de gráficos de controle com cache
+
+- Backend Agg (não interativo) e Figure sem pyplot: sem estado global
+- Um modelo de figura por thread, reaproveitado entre renderizações
+  (só os dados das linhas são trocados, sem recriar eixos e artistas)
+- Saída em SVG ou PNG compacto
+- Cache LRU em memória indexado pela impressão digital dos dados
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+_local = threading.local()
+
+
+class ControlChartTemplate:
+    """Figura com dois painéis (estatística principal e dispersão) reutilizável"""
+
+    def __init__(self, width=10, height=7, dpi=80):
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.dpi = dpi
+        self.figure = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(2, 1, sharex=True)
+        self.panels = [self._panel(ax) for ax in self.axes]
+        self.figure.subplots_adjust(left=0.07, right=0.97, bottom=0.06, top=0.9, hspace=0.3)
+
+    @staticmethod
+    def _panel(ax):
+        ax.grid(True, alpha=0.3)
+        values, = ax.plot([], [], color="#1f77b4", marker="o", markersize=3, linewidth=1)
+        extra, = ax.plot([], [], color="#9467bd", marker="o", markersize=3, linewidth=1)
+        lsc, = ax.plot([], [], color="#d62728", linestyle="--", linewidth=1, label="LSC")
+        center, = ax.plot([], [], color="#2ca02c", linewidth=1, label="LC")
+        lic, = ax.plot([], [], color="#d62728", linestyle="--", linewidth=1, label="LIC")
+        out, = ax.plot([], [], color="#d62728", marker="o", markersize=6, linestyle="none")
+        ax.legend(loc="upper right", fontsize=8)
+        return {"ax": ax, "values": values, "extra": extra, "lsc": lsc,
+                "center": center, "lic": lic, "out": out}
+
+    @staticmethod
+    def _update_panel(panel, values, center_line, lsc, lic, title, extra=None):
+        x = list(range(1, len(values) + 1))
+        panel["values"].set_data(x, values)
+        panel["extra"].set_data(x if extra else [], extra or [])
+        edges = [1, max(len(values), 1)]
+        panel["lsc"].set_data(edges, [lsc, lsc])
+        panel["center"].set_data(edges, [center_line, center_line])
+        panel["lic"].set_data(edges, [lic, lic])
+        outside = [(i, v) for i, v in zip(x, values) if v > lsc or v < lic]
+        outside += [(i, v) for i, v in zip(x, extra or []) if v < lic]
+        panel["out"].set_data([i for i, _ in outside], [v for _, v in outside])
+        ax = panel["ax"]
+        ax.set_title(title, fontsize=10)
+        ax.relim()
+        ax.autoscale_view()
+
+    def render(self, analysis, title, fmt="png"):
+        """Renderiza o resultado de um motor de control_charts (analysis())"""
+        import matplotlib
+
+        self.figure.suptitle(title, fontsize=12)
+        self._update_panel(
+            self.panels[0], analysis["values"], analysis["center_line"],
+            analysis["lsc"], analysis["lic"], f"Gráfico {analysis['chart_type']}",
+            extra=analysis.get("lower_values")
+        )
+        dispersion = analysis.get("dispersion")
+        second = self.panels[1]
+        second["ax"].set_visible(dispersion is not None)
+        if dispersion is not None:
+            self._update_panel(
+                second, dispersion["values"], dispersion["center_line"],
+                dispersion["lsc"], dispersion["lic"], f"Gráfico {dispersion['name']}"
+            )
+
+        buffer = io.BytesIO()
+        with matplotlib.rc_context({"svg.fonttype": "none"}):
+            # Sem metadados de versão: mesma entrada gera os mesmos bytes
+            options = {"format": fmt, "dpi": self.dpi}
+            if fmt == "png":
+                options.update(metadata={"Software": None}, pil_kwargs={"optimize": True})
+            else:
+                options.update(metadata={"Creator": None, "Date": None})
+            self.figure.savefig(buffer, **options)
+        return buffer.getvalue()
+
+
+def _template():
+    # Figuras do matplotlib não são thread-safe: um modelo por thread
+    template = getattr(_local, "template", None)
+    if template is None:
+        template = _local.template = ControlChartTemplate()
+    return template
+
+
+class RenderCache:
+    """Cache LRU de conteúdo renderizado (chave -> imagem ou fragmento)"""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+chart_cache = RenderCache()
+
+
+def chart_fingerprint(*parts):
+    """Impressão digital (ETag) a partir da versão dos dados e dos parâmetros"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def render_chart(fingerprint, build_analysis, title, fmt="png"):
+    """
+    Retorna a imagem do gráfico, renderizando só se não estiver em cache
+
+    build_analysis é chamado apenas em caso de falta no cache, então o
+    custo de montar o gráfico também é evitado em visualizações repetidas.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato não suportado: {fmt} (use {', '.join(FORMATS)})")
+    key = (fingerprint, fmt)
+    image = chart_cache.get(key)
+    if image is None:
+        image = _template().render(build_analysis(), title, fmt)
+        chart_cache.put(key, image)
+    return image
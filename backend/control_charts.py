@@ -0,0 +1,422 @@
+"""
+Motores de gráficos de controle em fluxo (streaming)
+
+Cada gráfico recebe uma leitura por vez via update() e mantém apenas somas
+acumuladas para os limites, então o custo por leitura é O(1). X-R e X-S
+também aceitam o subgrupo já resumido na ingestão (update_summary;
+feed_samples escolhe o caminho para as amostras do canal). Todos
+produzem o mesmo esquema de análise (analysis()) e a mesma saída de
+regras de violação usada pelo gráfico X-R.
+
+Gráficos disponíveis:
+- X-R   : X-barra e amplitude (subgrupos pequenos)
+- X-S   : X-barra e desvio padrão (subgrupos maiores)
+- I-MR  : valores individuais e amplitude móvel
+- EWMA  : média móvel exponencialmente ponderada (pequenos desvios)
+- CUSUM : soma acumulada tabular (pequenos desvios)
+"""
+import math
+
+from cep_constants import get_constants
+from ingestion import sample_summary
+from western_rules import evaluate_western_electric_rules
+
+
+def _single_rule(violated, name, description):
+    """Saída de regra no mesmo formato das regras do Western Electric"""
+    return {
+        'rule_1': {
+            'name': name,
+            'violated': violated,
+            'description': description,
+            'status': 'VIOLADA' if violated else 'OK'
+        }
+    }
+
+
+def _count_outside(values, lsc, lic):
+    return sum(1 for v in values if v > lsc or v < lic)
+
+
+class StreamingChart:
+    """Base dos gráficos de controle em fluxo"""
+
+    chart_type = None
+
+    def __init__(self):
+        self.total_readings = 0
+        self.values = []
+
+    def update(self, value):
+        """
+        Processa uma leitura
+        Retorna o novo ponto do gráfico ({"index", "value", "signal"}) ou
+        None se a leitura ainda não fechou um ponto
+        """
+        raise NotImplementedError
+
+    def update_many(self, values):
+        for value in values:
+            self.update(value)
+        return self
+
+    def limits(self):
+        """(linha central, LSC, LIC, sigma) do gráfico principal"""
+        raise NotImplementedError
+
+    def dispersion(self):
+        """Gráfico de dispersão associado (R, S ou MR), se houver"""
+        return None
+
+    def rules(self):
+        center_line, lsc, lic, _ = self.limits()
+        return evaluate_western_electric_rules(self.values, center_line, lsc, lic)
+
+    def extra(self):
+        return {}
+
+    def analysis(self):
+        """Resultado da análise no esquema comum a todos os gráficos"""
+        if not self.values:
+            return None
+        center_line, lsc, lic, sigma = self.limits()
+        result = {
+            "chart_type": self.chart_type,
+            "total_readings": self.total_readings,
+            "total_points": len(self.values),
+            "center_line": float(center_line),
+            "lsc": float(lsc),
+            "lic": float(lic),
+            "sigma": float(sigma),
+            "values": [float(v) for v in self.values],
+            "out_of_control": _count_outside(self.values, lsc, lic),
+            "dispersion": self.dispersion(),
+            "western_rules": self.rules(),
+        }
+        result.update(self.extra())
+        return result
+
+    def _point(self, value):
+        self.values.append(value)
+        if len(self.values) < 2:
+            signal = False
+        else:
+            _, lsc, lic, _ = self.limits()
+            signal = value > lsc or value < lic
+        return {"index": len(self.values), "value": value, "signal": signal}
+
+
+class SubgroupChart(StreamingChart):
+    """Base para X-R e X-S: agrupa leituras em subgrupos de tamanho fixo"""
+
+    # Campo do resumo do subgrupo (ingestion.summarize) com a dispersão do gráfico
+    dispersion_key = None
+
+    def __init__(self, sample_size=5):
+        super().__init__()
+        self.sample_size = sample_size
+        self.constants = get_constants(sample_size)
+        self.current = []
+        self.dispersion_values = []
+        self.sum_x_bar = 0.0
+        self.sum_dispersion = 0.0
+
+    def _dispersion_of(self, readings):
+        raise NotImplementedError
+
+    def update(self, value):
+        self.total_readings += 1
+        self.current.append(value)
+        if len(self.current) < self.sample_size:
+            return None
+
+        readings, self.current = self.current, []
+        return self._close(sum(readings) / self.sample_size, self._dispersion_of(readings))
+
+    def update_summary(self, summary):
+        """Processa um subgrupo completo pelo resumo gravado na ingestão"""
+        self.total_readings += self.sample_size
+        return self._close(summary["media"], summary[self.dispersion_key])
+
+    def _close(self, x_bar, spread):
+        self.sum_x_bar += x_bar
+        self.sum_dispersion += spread
+        self.dispersion_values.append(spread)
+        return self._point(x_bar)
+
+    def _means(self):
+        m = len(self.values)
+        return self.sum_x_bar / m, self.sum_dispersion / m
+
+    def extra(self):
+        return {"sample_size": self.sample_size}
+
+
+class XbarRChart(SubgroupChart):
+    chart_type = "X-R"
+    dispersion_key = "amplitude"
+
+    def _dispersion_of(self, readings):
+        return max(readings) - min(readings)
+
+    def limits(self):
+        x_double_mean, r_mean = self._means()
+        a2 = self.constants["A2"]
+        sigma = r_mean / self.constants["d2"]
+        return x_double_mean, x_double_mean + a2 * r_mean, x_double_mean - a2 * r_mean, sigma
+
+    def dispersion(self):
+        _, r_mean = self._means()
+        lsc = self.constants["D4"] * r_mean
+        lic = self.constants["D3"] * r_mean
+        return {
+            "name": "R",
+            "center_line": float(r_mean),
+            "lsc": float(lsc),
+            "lic": float(lic),
+            "values": [float(v) for v in self.dispersion_values],
+            "out_of_control": _count_outside(self.dispersion_values, lsc, lic),
+        }
+
+
+class XbarSChart(SubgroupChart):
+    chart_type = "X-S"
+    dispersion_key = "desvio_padrao"
+
+    def _dispersion_of(self, readings):
+        mean = sum(readings) / len(readings)
+        return math.sqrt(sum((x - mean) ** 2 for x in readings) / (len(readings) - 1))
+
+    def limits(self):
+        x_double_mean, s_mean = self._means()
+        a3 = self.constants["A3"]
+        sigma = s_mean / self.constants["c4"]
+        return x_double_mean, x_double_mean + a3 * s_mean, x_double_mean - a3 * s_mean, sigma
+
+    def dispersion(self):
+        _, s_mean = self._means()
+        lsc = self.constants["B4"] * s_mean
+        lic = self.constants["B3"] * s_mean
+        return {
+            "name": "S",
+            "center_line": float(s_mean),
+            "lsc": float(lsc),
+            "lic": float(lic),
+            "values": [float(v) for v in self.dispersion_values],
+            "out_of_control": _count_outside(self.dispersion_values, lsc, lic),
+        }
+
+
+class IMRChart(StreamingChart):
+    chart_type = "I-MR"
+
+    def __init__(self):
+        super().__init__()
+        self.constants = get_constants(2)
+        self.moving_ranges = []
+        self.sum_x = 0.0
+        self.sum_mr = 0.0
+
+    def update(self, value):
+        self.total_readings += 1
+        if self.values:
+            mr = abs(value - self.values[-1])
+            self.moving_ranges.append(mr)
+            self.sum_mr += mr
+        self.sum_x += value
+        return self._point(value)
+
+    def limits(self):
+        mean = self.sum_x / len(self.values)
+        mr_mean = self.sum_mr / len(self.moving_ranges) if self.moving_ranges else 0.0
+        sigma = mr_mean / self.constants["d2"]
+        return mean, mean + 3 * sigma, mean - 3 * sigma, sigma
+
+    def dispersion(self):
+        mr_mean = self.sum_mr / len(self.moving_ranges) if self.moving_ranges else 0.0
+        lsc = self.constants["D4"] * mr_mean
+        lic = self.constants["D3"] * mr_mean
+        return {
+            "name": "MR",
+            "center_line": float(mr_mean),
+            "lsc": float(lsc),
+            "lic": float(lic),
+            "values": [float(v) for v in self.moving_ranges],
+            "out_of_control": _count_outside(self.moving_ranges, lsc, lic),
+        }
+
+
+class BaselineChart(StreamingChart):
+    """
+    Base para EWMA e CUSUM: precisam de alvo (média) e sigma do processo
+    Se não informados, são estimados das primeiras `baseline` leituras
+    (média e MR-barra/d2); essas leituras são então processadas normalmente.
+    """
+
+    def __init__(self, target=None, sigma=None, baseline=20):
+        super().__init__()
+        if baseline < 2:
+            raise ValueError("baseline deve ser de pelo menos 2 leituras")
+        if sigma is not None and sigma <= 0:
+            raise ValueError("sigma deve ser maior que zero")
+        self.target = target
+        self.sigma = sigma
+        self.baseline = baseline
+        self._pending = []
+
+    def _estimate(self):
+        readings = self._pending
+        if self.target is None:
+            self.target = sum(readings) / len(readings)
+        if self.sigma is None:
+            mrs = [abs(b - a) for a, b in zip(readings, readings[1:])]
+            self.sigma = (sum(mrs) / len(mrs)) / get_constants(2)["d2"]
+
+    def update(self, value):
+        self.total_readings += 1
+        if self.target is not None and self.sigma is not None:
+            return self._step(value)
+
+        self._pending.append(value)
+        if len(self._pending) < self.baseline:
+            return None
+        self._estimate()
+        pending, self._pending = self._pending, []
+        point = None
+        for reading in pending:
+            point = self._step(reading)
+        return point
+
+    def _step(self, value):
+        raise NotImplementedError
+
+    def extra(self):
+        return {"target": float(self.target), "process_sigma": float(self.sigma)}
+
+
+class EWMAChart(BaselineChart):
+    chart_type = "EWMA"
+
+    def __init__(self, lambda_=0.2, L=3.0, **kwargs):
+        if not 0 < lambda_ <= 1:
+            raise ValueError("ewma_lambda deve estar em (0, 1]")
+        if L <= 0:
+            raise ValueError("L deve ser maior que zero")
+        super().__init__(**kwargs)
+        self.lambda_ = lambda_
+        self.L = L
+        self.z = None
+
+    def _step(self, value):
+        previous = self.target if self.z is None else self.z
+        self.z = self.lambda_ * value + (1 - self.lambda_) * previous
+        return self._point(self.z)
+
+    def limits(self):
+        # Limites assintóticos: L * sigma * sqrt(lambda / (2 - lambda))
+        sigma_z = self.sigma * math.sqrt(self.lambda_ / (2 - self.lambda_))
+        return self.target, self.target + self.L * sigma_z, self.target - self.L * sigma_z, sigma_z
+
+    def rules(self):
+        _, lsc, lic, _ = self.limits()
+        violated = any(v > lsc or v < lic for v in self.values)
+        return _single_rule(
+            violated,
+            'EWMA fora dos limites',
+            'Estatística EWMA fora de ±Lσ (desvio pequeno e persistente da média)'
+        )
+
+    def extra(self):
+        result = super().extra()
+        result.update({"lambda": self.lambda_, "L": self.L})
+        return result
+
+
+class CUSUMChart(BaselineChart):
+    chart_type = "CUSUM"
+
+    def __init__(self, k=0.5, h=5.0, **kwargs):
+        if k < 0:
+            raise ValueError("k não pode ser negativo")
+        if h <= 0:
+            raise ValueError("h deve ser maior que zero")
+        super().__init__(**kwargs)
+        self.k = k
+        self.h = h
+        self.c_plus = 0.0
+        self.c_minus = 0.0
+        self.lower_values = []
+
+    def _step(self, value):
+        slack = self.k * self.sigma
+        self.c_plus = max(0.0, value - (self.target + slack) + self.c_plus)
+        self.c_minus = max(0.0, (self.target - slack) - value + self.c_minus)
+        self.lower_values.append(-self.c_minus)
+        point = self._point(self.c_plus)
+        point["lower_value"] = -self.c_minus
+        point["signal"] = point["signal"] or -self.c_minus < -self.h * self.sigma
+        return point
+
+    def limits(self):
+        decision = self.h * self.sigma
+        return 0.0, decision, -decision, self.sigma
+
+    def rules(self):
+        decision = self.h * self.sigma
+        violated = any(v > decision for v in self.values) or any(v < -decision for v in self.lower_values)
+        return _single_rule(
+            violated,
+            'CUSUM acima do intervalo de decisão',
+            'C+ ou C- ultrapassou H (desvio pequeno e persistente da média)'
+        )
+
+    def analysis(self):
+        result = super().analysis()
+        if result is not None:
+            result["lower_values"] = [float(v) for v in self.lower_values]
+            result["out_of_control"] += _count_outside(self.lower_values, math.inf, result["lic"])
+        return result
+
+    def extra(self):
+        result = super().extra()
+        result.update({"k": self.k, "h": self.h})
+        return result
+
+
+CHART_TYPES = {
+    "X-R": XbarRChart,
+    "X-S": XbarSChart,
+    "I-MR": IMRChart,
+    "EWMA": EWMAChart,
+    "CUSUM": CUSUMChart,
+}
+
+
+def create_chart(chart_type, sample_size=5, **params):
+    """Cria o motor de gráfico pelo nome (X-R, X-S, I-MR, EWMA, CUSUM)"""
+    key = chart_type.upper()
+    if key not in CHART_TYPES:
+        raise ValueError(f"Tipo de gráfico desconhecido: {chart_type}")
+    chart_class = CHART_TYPES[key]
+    if issubclass(chart_class, SubgroupChart):
+        return chart_class(sample_size=sample_size)
+    if issubclass(chart_class, BaselineChart):
+        return chart_class(**params)
+    return chart_class()
+
+
+def feed_samples(chart, data):
+    """
+    Alimenta o gráfico com as amostras do canal ({"Amostra", "Dados", "Resumo"})
+    X-R e X-S recebem o resumo das amostras completas, sem ler as leituras;
+    os gráficos de valores individuais (e subgrupos de outro tamanho)
+    recebem as leituras
+    """
+    subgroup_chart = isinstance(chart, SubgroupChart)
+    for sample in data:
+        readings = sample["Dados"]
+        if subgroup_chart and not chart.current and len(readings) == chart.sample_size:
+            chart.update_summary(sample_summary(sample))
+        else:
+            chart.update_many(readings)
+    return chart
@@ -0,0 +1,82 @@
+"""
+Caminho rápido de serialização JSON para respostas grandes
+
+- orjson quando instalado (fallback: json da biblioteca padrão)
+- HistoryEncoder monta o corpo de /history direto em bytes, sem validar
+  as amostras com pydantic (já estão no formato canônico do arquivo), e
+  guarda os fragmentos já serializados das amostras fechadas: a cada
+  requisição só a amostra em aberto e as novas são serializadas
+"""
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Serializa para bytes (JSON compacto)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data):
+    """Desserializa de bytes ou str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def canonical_sample(sample):
+    """Amostra no mesmo formato que o modelo Sample produziria"""
+    return {
+        "Amostra": str(sample["Amostra"]),
+        "Dados": [float(v) for v in sample["Dados"]],
+        "Resumo": sample.get("Resumo"),
+    }
+
+
+class HistoryEncoder:
+    """Serializa o histórico de um canal reaproveitando fragmentos em cache"""
+
+    def __init__(self):
+        self._samples = []
+        self._fragments = []
+        self._lock = threading.Lock()
+
+    def _closed_fragments(self, data):
+        """Fragmentos de todas as amostras exceto a última (que pode crescer)"""
+        closed = len(data) - 1 if data else 0
+        # Reaproveita o prefixo que não mudou; o resto é serializado de novo
+        valid = 0
+        limit = min(len(self._samples), closed)
+        samples = self._samples
+        # Amostras fechadas são compartilhadas entre snapshots: a identidade basta
+        while valid < limit and (samples[valid] is data[valid] or samples[valid] == data[valid]):
+            valid += 1
+        del self._samples[valid:]
+        del self._fragments[valid:]
+        for sample in data[valid:closed]:
+            self._samples.append(sample)
+            self._fragments.append(dumps(canonical_sample(sample)))
+        return self._fragments
+
+    def encode(self, data, limit=None):
+        """Corpo JSON equivalente ao HistoryResponse (samples limitado a `limit`)"""
+        with self._lock:
+            fragments = list(self._closed_fragments(data))
+        current = dumps(canonical_sample(data[-1])) if data else b"null"
+        if data:
+            fragments.append(current)
+
+        start = slice(-limit, None).indices(len(data))[0] if limit else 0
+        total_readings = sum(len(sample["Dados"]) for sample in data)
+        return b"".join((
+            b'{"samples":[', b",".join(fragments[start:]),
+            b'],"total_samples":', str(len(data)).encode(),
+            b',"total_readings":', str(total_readings).encode(),
+            b',"current_sample":', current, b"}",
+        ))
@@ -1,14 +1,31 @@
 """
 Script para gerar dados de temperatura e executar análise CEP automaticamente
+
+Sem argumentos, abre o menu interativo. Com argumentos, roda em lote:
+
+    python generate_and_analyze.py --inputs "arquivos/*.json" --channel temperature \
+        --output-dir resultados --workers 8
+    python generate_and_analyze.py --generate 1000 --inputs simulado.json --lse 28 --lie 18
+
+No modo lote cada arquivo é analisado em paralelo (um processo por núcleo),
+arquivos sem alteração desde a última execução são ignorados pela impressão
+digital (SHA-256 do conteúdo + parâmetros) e um resumo em JSON é gravado
+no diretório de saída.
 """
+import argparse
+import glob
+import hashlib
 import json
-import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from pathlib import Path
 import sys
 import os
 
+from synthetic_data import generate_subgroups, to_samples
+
 def generate_temperature_samples(num_samples=5, readings_per_sample=5, 
-                                 mean_temp=23.0, std_dev=5.0):
+                                 mean_temp=23.0, std_dev=5.0, scenarios=None, seed=None):
     """
     Gera amostras de temperatura simuladas
     
@@ -17,24 +34,17 @@ def generate_temperature_samples(num_samples=5, readings_per_sample=5,
         readings_per_sample: Número de leituras por amostra
         mean_temp: Temperatura média
         std_dev: Desvio padrão
+        scenarios: Cenários de desvio do processo (ver synthetic_data.py)
+        seed: Semente para reprodutibilidade
     
     Returns:
         Lista de amostras no formato JSON
     """
-    samples = []
-    
-    for i in range(1, num_samples + 1):
-        readings = [
-            round(random.gauss(mean_temp, std_dev), 2)
-            for _ in range(readings_per_sample)
-        ]
-        
-        samples.append({
-            "Amostra": str(i),
-            "Dados": readings
-        })
-    
-    return samples
+    subgroups = generate_subgroups(
+        num_samples, readings_per_sample=readings_per_sample,
+        mean_temp=mean_temp, std_dev=std_dev, scenarios=scenarios, seed=seed
+    )
+    return to_samples(subgroups)
 
 
 def save_temperature_data(samples, filename="temperature_data.json"):
@@ -86,6 +96,191 @@ def run_cep_analysis():
         return False
 
 
+# ===== MODO LOTE (NÃO INTERATIVO) =====
+
+MANIFEST_FILE = "manifest.json"
+SUMMARY_FILE = "summary.json"
+
+
+def fingerprint_file(path, params):
+    """Impressão digital do arquivo + parâmetros da análise"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def analyze_file(path, params):
+    """
+    Analisa um arquivo de amostras com os motores nativos (sem XR_graph,
+    que grava sempre nos mesmos arquivos e não pode rodar em paralelo)
+    """
+    from capability import subgroups_to_array, capability_summary
+    from control_charts import create_chart
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    sample_size = params["sample_size"]
+    subgroups = subgroups_to_array(data, sample_size)
+    if subgroups.shape[0] < 2:
+        raise ValueError(f"Dados insuficientes: {subgroups.shape[0]} amostras completas")
+
+    chart = create_chart(params["chart_type"], sample_size=sample_size)
+    chart.update_many(subgroups.ravel().tolist())
+    analysis = chart.analysis()
+    analysis["capability_indices"] = capability_summary(subgroups, params["lse"], params["lie"])
+    analysis["lse"] = params["lse"]
+    analysis["lie"] = params["lie"]
+    analysis["source"] = str(path)
+    analysis["analyzed_at"] = datetime.now().isoformat()
+    return analysis
+
+
+def _batch_worker(path, params, result_path):
+    analysis = analyze_file(path, params)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(analysis, f, ensure_ascii=False)
+    rules = analysis["western_rules"] or {}
+    capability = analysis["capability_indices"]
+    return {
+        "total_samples": analysis["total_points"],
+        "center_line": analysis["center_line"],
+        "lsc": analysis["lsc"],
+        "lic": analysis["lic"],
+        "out_of_control": analysis["out_of_control"],
+        "cpk": capability["cpk"],
+        "ppk": capability["ppk"],
+        "ppm_total": capability["ppm_total"],
+        "violated_rules": [key for key, rule in rules.items() if rule["violated"]],
+    }
+
+
+def expand_inputs(patterns):
+    """Expande arquivos e globs, sem duplicatas, em ordem estável"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.exists(pattern) else [])
+        for match in matches:
+            path = str(Path(match).resolve())
+            if path not in files and os.path.isfile(path):
+                files.append(path)
+    return files
+
+
+def resolve_params(args):
+    """Parâmetros da análise: configuração do canal + sobrescritas da linha de comando"""
+    from channel_config import ChannelRegistry
+
+    registry = ChannelRegistry(os.getenv("CHANNELS_CONFIG") or Path(__file__).parent / "channels.json")
+    if args.channel not in registry:
+        raise SystemExit(f"✗ Canal desconhecido: {args.channel}")
+    config = registry.get(args.channel)
+    return {
+        "channel": args.channel,
+        "sample_size": args.sample_size or config.sample_size,
+        "lse": args.lse if args.lse is not None else config.lse,
+        "lie": args.lie if args.lie is not None else config.lie,
+        "chart_type": (args.chart_type or config.chart_type).upper(),
+    }
+
+
+def run_batch(args):
+    """Analisa vários arquivos em paralelo e grava o resumo"""
+    params = resolve_params(args)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.generate:
+        target = args.inputs[0]
+        samples = generate_temperature_samples(
+            num_samples=args.generate, readings_per_sample=params["sample_size"], seed=args.seed
+        )
+        save_temperature_data(samples, target)
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("✗ Nenhum arquivo de entrada encontrado")
+        return 1
+
+    manifest_path = output_dir / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+
+    entries = {}
+    pending = []
+    for path in files:
+        fingerprint = fingerprint_file(path, params)
+        previous = manifest.get(path)
+        if not args.force and previous and previous["fingerprint"] == fingerprint \
+                and Path(previous["result_file"]).exists():
+            entries[path] = dict(previous["summary"], file=path, status="skipped",
+                                 result_file=previous["result_file"])
+            continue
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:10]
+        result_file = str(output_dir / f"{Path(path).stem}.{digest}.{params['channel']}.cep.json")
+        pending.append((path, fingerprint, result_file))
+
+    print(f"Arquivos: {len(files)} ({len(files) - len(pending)} sem alteração, {len(pending)} para analisar)")
+
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_batch_worker, path, params, result_file): (path, fingerprint, result_file)
+            for path, fingerprint, result_file in pending
+        }
+        for future in as_completed(futures):
+            path, fingerprint, result_file = futures[future]
+            try:
+                summary = future.result()
+                manifest[path] = {"fingerprint": fingerprint, "result_file": result_file, "summary": summary}
+                entries[path] = dict(summary, file=path, status="analyzed", result_file=result_file)
+                print(f"  ✓ {path}")
+            except Exception as e:
+                manifest.pop(path, None)
+                entries[path] = {"file": path, "status": "error", "error": str(e)}
+                print(f"  ✗ {path}: {e}")
+
+    manifest_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    statuses = [entry["status"] for entry in entries.values()]
+    summary = {
+        "generated_at": datetime.now().isoformat(),
+        "parameters": params,
+        "totals": {
+            "files": len(files),
+            "analyzed": statuses.count("analyzed"),
+            "skipped": statuses.count("skipped"),
+            "errors": statuses.count("error"),
+        },
+        "files": [entries[path] for path in files],
+    }
+    summary_path = Path(args.summary) if args.summary else output_dir / SUMMARY_FILE
+    summary_path.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"✓ Resumo salvo em: {summary_path}")
+    return 1 if summary["totals"]["errors"] else 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Geração de dados e análise CEP em lote")
+    parser.add_argument("--channel", default="temperature", help="Canal (define LSE/LIE e tamanho da amostra padrão)")
+    parser.add_argument("--inputs", nargs="+", default=["temperature_data.json"],
+                        help="Arquivos ou globs com amostras ({Amostra, Dados})")
+    parser.add_argument("--lse", type=float, help="Limite superior de especificação")
+    parser.add_argument("--lie", type=float, help="Limite inferior de especificação")
+    parser.add_argument("--sample-size", type=int, help="Leituras por amostra")
+    parser.add_argument("--chart-type", help="Tipo de gráfico (X-R, X-S, I-MR, EWMA, CUSUM)")
+    parser.add_argument("--output-dir", default="cep_results", help="Diretório de saída")
+    parser.add_argument("--summary", help="Caminho do resumo JSON (padrão: <output-dir>/summary.json)")
+    parser.add_argument("--workers", type=int, default=0, help="Processos em paralelo (padrão: núcleos)")
+    parser.add_argument("--force", action="store_true", help="Reanalisa mesmo arquivos sem alteração")
+    parser.add_argument("--generate", type=int, default=0,
+                        help="Gera N amostras simuladas no primeiro arquivo de --inputs antes de analisar")
+    parser.add_argument("--seed", type=int, help="Semente dos dados simulados")
+    return parser.parse_args(argv)
+
+
 def main():
     """Função principal"""
     print("="*80)
@@ -132,4 +327,6 @@ def main():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(parse_args(sys.argv[1:])))
     main()
@@ -0,0 +1,49 @@
+"""
+Cache HTTP (GET condicional) para os endpoints de leitura
+
+As ETags são derivadas da versão dos dados: (inode, mtime_ns, tamanho) do
+arquivo de dados e do log de ingestão do canal (storage.logged_version, a
+mesma versão dos snapshots), obtida com stat, sem ler os arquivos; o
+Last-Modified é o maior mtime entre eles. Quando o cliente envia
+If-None-Match com a ETag atual (ou If-Modified-Since não anterior à última
+gravação), o endpoint responde 304 sem ler nem serializar os dados.
+"""
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi.responses import Response
+
+
+def make_etag(*parts):
+    """ETag forte a partir das partes que identificam a versão do recurso"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:24]
+    return f'"{digest}"'
+
+
+def cache_headers(etag, last_modified_ns=None):
+    """Cabeçalhos de validação: o cliente sempre revalida (no-cache)"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified_ns:
+        headers["Last-Modified"] = formatdate(last_modified_ns / 1e9, usegmt=True)
+    return headers
+
+
+def is_not_modified(request, etag, last_modified_ns=None):
+    """Verifica se a cópia do cliente ainda é a atual"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified_ns:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified_ns / 1e9) <= since
+    return False
+
+
+def not_modified(headers):
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,112 @@
+"""
+Montagem de subgrupos: distribui leituras nas amostras do canal
+
+Usado por todos os caminhos de ingestão (JSON, binário, ...), para que
+todos agrupem as leituras exatamente da mesma forma. Opera sobre a lista
+de amostras em memória ({"Amostra", "Dados"}); a leitura e a gravação do
+arquivo ficam com quem chama. log_entry/replay_log definem as entradas do
+log de ingestão: só as amostras que um lote alterou (a que estava aberta e
+as novas).
+
+Quando uma amostra fecha, o resumo do subgrupo (média, amplitude, desvio
+padrão, mínimo, máximo, abertura e fechamento) é calculado uma única vez
+e gravado junto dela em "Resumo". Gráficos X-barra/R e X-barra/S,
+capacidade, regras e alertas leem esses resumos em vez de recalcular a
+partir de "Dados".
+"""
+import math
+from datetime import datetime
+
+import fast_json
+
+
+def summarize(readings, opened_at=None, closed_at=None):
+    """Resumo de um subgrupo fechado"""
+    n = len(readings)
+    mean = sum(readings) / n
+    std = math.sqrt(sum((x - mean) ** 2 for x in readings) / (n - 1)) if n > 1 else 0.0
+    low, high = min(readings), max(readings)
+    return {
+        "media": mean,
+        "amplitude": high - low,
+        "desvio_padrao": std,
+        "minimo": low,
+        "maximo": high,
+        "inicio": opened_at,
+        "fim": closed_at,
+    }
+
+
+def sample_summary(sample):
+    """Resumo gravado da amostra (calculado na hora para amostras antigas, sem horários)"""
+    return sample.get("Resumo") or summarize(sample["Dados"])
+
+
+def complete_summaries(data, sample_size):
+    """Resumos das amostras completas, em ordem (sem tocar em "Dados" quando já gravados)"""
+    return [
+        sample_summary(sample) for sample in data
+        if isinstance(sample, dict) and len(sample.get("Dados", [])) == sample_size
+    ]
+
+
+def reading_time(timestamp):
+    """Horário ISO de um timestamp Unix em ms"""
+    return datetime.fromtimestamp(timestamp / 1000).isoformat(timespec="seconds")
+
+
+def append_readings(data, values, sample_size, now=None, timestamps=None):
+    """
+    Adiciona as leituras às amostras, abrindo novas quando a atual fecha
+
+    Args:
+        now: horário (ISO) de abertura/fechamento das amostras; padrão: agora
+        timestamps: timestamps (Unix, ms) das leituras, já em ordem (buffer de
+            reordenação); abertura e fechamento passam a ser os horários da
+            primeira e da última leitura de cada amostra
+
+    Returns:
+        dict com a amostra da última leitura (sample_number, position_in_sample,
+        sample_complete), o total de amostras e as amostras fechadas nesta chamada
+    """
+    now = now or datetime.now().isoformat(timespec="seconds")
+    closed = []
+    current = data[-1] if data and len(data[-1].get("Dados", [])) < sample_size else None
+    last = data[-1] if data else None
+
+    for i, value in enumerate(values):
+        stamp = now if timestamps is None else reading_time(timestamps[i])
+        if current is None:
+            current = {"Amostra": str(len(data) + 1), "Dados": [], "Inicio": stamp}
+            data.append(current)
+        current["Dados"].append(value)
+        last = current
+        if len(current["Dados"]) >= sample_size:
+            current["Resumo"] = summarize(current["Dados"], current.pop("Inicio", None), stamp)
+            closed.append(current)
+            current = None
+
+    return {
+        "sample_number": last["Amostra"] if last else None,
+        "position_in_sample": len(last["Dados"]) if last else 0,
+        "sample_complete": bool(last) and len(last["Dados"]) >= sample_size,
+        "total_samples": len(data),
+        "closed_samples": closed,
+    }
+
+
+def log_entry(data, start):
+    """Entrada do log de ingestão (uma linha): as amostras a partir de `start`"""
+    return fast_json.dumps({"at": start, "samples": data[start:]}).decode("utf-8")
+
+
+def replay_log(data, entries):
+    """Aplica à lista de amostras do arquivo as entradas do log, em ordem"""
+    for line in entries:
+        try:
+            entry = fast_json.loads(line)
+        except ValueError:
+            # Linha de uma gravação interrompida
+            continue
+        del data[entry["at"]:]
+        data.extend(entry["samples"])
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List, Dict
 from pydantic import BaseModel
 import logging
@@ -11,20 +12,42 @@ from dotenv import load_dotenv
 import os
 import sys
 import base64
+import hmac
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
 
 # Adiciona o diretório CEP-Prova/src ao path para importar os módulos
 cep_prova_path = str(Path(__file__).resolve().parent.parent / "CEP-Prova" / "src")
 sys.path.insert(0, cep_prova_path)
 
-# Importar módulos CEP com tratamento de erro
-try:
-    from x_r_graphs import XR_graph  # type: ignore
-    from process_capability import calculate_capability  # type: ignore
-    CEP_MODULES_AVAILABLE = True
-except ImportError as e:
-    CEP_MODULES_AVAILABLE = False
-    XR_graph = None
-    calculate_capability = None
+# Módulos CEP (pandas/matplotlib) e de capacidade (NumPy/SciPy) são
+# importados sob demanda, na primeira análise ou no aquecimento em segundo
+# plano, para que ingestão e leitura fiquem prontas logo na inicialização.
+# CEP_MODULES_AVAILABLE fica None até a primeira tentativa de carga.
+XR_graph = None
+calculate_capability = None
+CEP_MODULES_AVAILABLE = None
+_cep_modules_lock = threading.Lock()
+
+from rolling_cep import rolling_series
+from probability import calculate_probability_success, calculate_arrangements
+from western_rules import analyze_western_electric_rules
+from control_charts import create_chart, feed_samples
+from channel_config import ChannelRegistry
+from chart_rendering import FORMATS as CHART_FORMATS, chart_fingerprint, render_chart
+from http_cache import make_etag, cache_headers, is_not_modified, not_modified
+import fast_json
+from storage import file_lock, atomic_write, append_log, file_version, logged_version, replace_logged
+from snapshots import Snapshot, SnapshotStore
+from ingestion import append_readings, complete_summaries, log_entry, replay_log, sample_summary
+from alerting import AlertPipeline, FeedSink, LogFileSink, WebhookSink
+from reorder import ReorderBuffers, event_times, now_ms
+from profiling import Profiler, stage
+from sensor_health import SensorHealth
+from backfill import BackfillRunner
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -33,11 +56,61 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Mostrar warning se módulos CEP não estão disponíveis
-if not CEP_MODULES_AVAILABLE:
-    logger.warning("Módulos CEP não disponíveis na inicialização")
+# Aquecimento dos módulos CEP em segundo plano após a inicialização (CEP_WARMUP=0 desativa)
+CEP_WARMUP = os.getenv("CEP_WARMUP", "1") != "0"
+
+def load_cep_modules():
+    """
+    Importa os módulos CEP (XR_graph, calculate_capability) uma única vez
+    Retorna True se estão disponíveis
+    """
+    global XR_graph, calculate_capability, CEP_MODULES_AVAILABLE
+    if CEP_MODULES_AVAILABLE is not None:
+        return CEP_MODULES_AVAILABLE
+    with _cep_modules_lock:
+        if CEP_MODULES_AVAILABLE is None:
+            try:
+                from x_r_graphs import XR_graph as xr_graph_class  # type: ignore
+                from process_capability import calculate_capability as capability_func  # type: ignore
+                XR_graph = xr_graph_class
+                calculate_capability = capability_func
+                CEP_MODULES_AVAILABLE = True
+                logger.info("Módulos CEP carregados")
+            except ImportError as e:
+                CEP_MODULES_AVAILABLE = False
+                logger.warning(f"Módulos CEP não disponíveis: {e}")
+    return CEP_MODULES_AVAILABLE
+
+def warm_up_cep():
+    """Pré-carrega as dependências das rotas /cep/*"""
+    import capability  # noqa: F401  (NumPy/SciPy)
+    load_cep_modules()
 
-app = FastAPI(title="ESP32 Temperature Monitor API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Inicialização e encerramento da API, em ordem explícita
+
+    No encerramento, primeiro param as fontes de ingestão (gateway MQTT);
+    depois as leituras retidas (reordenação e filtros de saúde do sensor)
+    são gravadas, enquanto os alertas ainda avaliam as amostras fechadas;
+    por fim param os alertas e o backfill
+    """
+    await schedule_cep_warm_up()
+    await start_reorder_expiry()
+    await start_alerts()
+    await start_mqtt_gateway()
+    yield
+    await stop_mqtt_gateway()
+    await flush_ingestion_buffers()
+    await stop_alerts()
+    await stop_backfill()
+
+app = FastAPI(title="ESP32 Temperature Monitor API", version="1.0.0", lifespan=lifespan)
+
+async def schedule_cep_warm_up():
+    if CEP_WARMUP:
+        asyncio.get_running_loop().run_in_executor(None, warm_up_cep)
 
 # Configurar CORS para permitir requisições do React
 app.add_middleware(
@@ -48,264 +121,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Arquivos JSON para armazenar dados
-DATA_FILE = Path("temperature_data.json")
-HUMIDITY_FILE = Path("humidity_data.json")
-
 # Configurações do ESP32 (carregadas do .env)
 ESP32_IP = os.getenv("ESP32_IP", "192.168.1.100")
 ESP32_READ_INTERVAL = int(os.getenv("ESP32_READ_INTERVAL", "30"))
 
-# Tamanho de cada amostra
-SAMPLE_SIZE = 5
+# Configuração dos canais (arquivo de dados, tamanho da amostra, LSE/LIE,
+# tipo de gráfico), carregada uma vez e recarregável via POST /config/reload
+CHANNELS_CONFIG = Path(os.getenv("CHANNELS_CONFIG") or Path(__file__).parent / "channels.json")
+channels = ChannelRegistry(CHANNELS_CONFIG)
 
-# ===== FUNÇÕES AUXILIARES PARA PROBABILIDADE E ARRANJOS =====
+# Trava das análises com XR_graph, que gravam artefatos com nomes fixos em backend/
+ANALYSIS_LOCK = Path(__file__).parent / "cep_analysis"
 
-def factorial(n):
-    """Calcula o fatorial de um número"""
-    if n < 0:
-        return None
-    if n == 0 or n == 1:
-        return 1
-    result = 1
-    for i in range(2, n + 1):
-        result *= i
-    return result
+# Constantes usadas pelo XR_graph (CEP-Prova), resolvidas uma única vez
+CEP_CONSTANTS_FILE = str(Path(cep_prova_path) / "json_files" / "constantes_cep.json")
 
-def binomial_coefficient(n, k):
-    """Calcula o coeficiente binomial C(n,k)"""
-    if k > n:
-        return 0
-    if k == 0 or k == n:
-        return 1
-    return factorial(n) // (factorial(k) * factorial(n - k))
-
-def binomial_probability(n, k, p):
-    """Calcula P(X = k) para distribuição binomial"""
-    coefficient = binomial_coefficient(n, k)
-    prob = coefficient * (p ** k) * ((1 - p) ** (n - k))
-    return prob
-
-def cumulative_binomial(n, k, p):
-    """Calcula P(X <= k) para distribuição binomial"""
-    total = 0
-    for i in range(k + 1):
-        total += binomial_probability(n, i, p)
-    return total
-
-def calculate_probability_success(success_rate, total_samples):
-    """
-    Calcula probabilidade de sucesso nos dados
-    success_rate: Taxa de sucesso esperada (0-1)
-    total_samples: Número total de amostras
-    """
-    exact_prob = binomial_probability(total_samples, total_samples, success_rate)
-    cumulative_prob = cumulative_binomial(total_samples, total_samples, success_rate)
-    mean = total_samples * success_rate
-    variance = total_samples * success_rate * (1 - success_rate)
-    
-    return {
-        "success_rate": float(success_rate),
-        "total_samples": total_samples,
-        "exact_probability": float(exact_prob),
-        "cumulative_probability": float(cumulative_prob),
-        "expected_value": float(mean),
-        "variance": float(variance),
-        "standard_deviation": float(variance ** 0.5)
-    }
+def channel_path(name):
+    """Caminho do arquivo de dados do canal, conforme a configuração atual"""
+    return channels.get(name).path
 
-def calculate_arrangements(n, k, with_repetition=False):
+def channel_version(name):
     """
-    Calcula arranjos e combinações
-    n: total de elementos
-    k: elementos a arranjar
-    with_repetition: com ou sem repetição
+    Versão atual do canal: (inode, mtime_ns, tamanho) do arquivo de dados e
+    do log de ingestão ao lado dele; cada gravação acrescenta ao log ou
+    substitui o arquivo, então a versão muda a cada gravação e é a mesma em
+    todos os workers
     """
-    if n < 0 or k < 0:
-        return None
-    
-    if with_repetition:
-        arrangements = n ** k
-    else:
-        if k > n:
-            return None
-        arrangements = factorial(n) // factorial(n - k)
-    
-    combinations = binomial_coefficient(n, k) if not with_repetition else None
-    
-    return {
-        "n": n,
-        "k": k,
-        "arrangements": int(arrangements),
-        "combinations": int(combinations) if combinations else None,
-        "with_repetition": with_repetition,
-        "formula": f"{n}^{k}" if with_repetition else f"{n}!/{n-k}!"
-    }
+    return logged_version(channel_path(name))
 
-# ===== FUNÇÕES PARA ANÁLISE DAS REGRAS DO WESTERN ELECTRIC =====
+# Serializadores de histórico por arquivo de dados (fragmentos em cache)
+history_encoders = {}
 
-def analyze_western_electric_rules(xr_chart_obj, chart_type="X"):
+def history_response(name, limit, headers):
     """
-    Analisa as regras do Western Electric Handbook
-    Retorna status de cada regra (violada ou dentro da norma)
+    Resposta do histórico pelo caminho rápido: o corpo é montado em bytes
+    pelo HistoryEncoder, sem validação pydantic (mesmo JSON do HistoryResponse)
     """
-    
-    rules = {}
-    
-    try:
-        df = xr_chart_obj.df
-        
-        if chart_type == "X" or chart_type == "X-bar":
-            values = df['X_bar'].values
-            center_line = xr_chart_obj.x_double_mean
-            lsc = xr_chart_obj.lsc_x_bar_graph
-            lic = xr_chart_obj.lic_x_bar_graph
-            sigma = (lsc - center_line) / 3  # sigma baseado nos limites de controle
-        else:  # R chart
-            values = df['R'].values
-            center_line = xr_chart_obj.r_mean
-            lsc = xr_chart_obj.lsc_r_bar_graph
-            lic = xr_chart_obj.lic_r_bar_graph
-            sigma = (lsc - center_line) / 3
-        
-        # Regra 1: Um ponto fora de 3-sigma
-        rule_1_violated = any(v > lsc or v < lic for v in values)
-        rules['rule_1'] = {
-            'name': 'Um ponto fora de 3-sigma (±3σ)',
-            'violated': rule_1_violated,
-            'description': 'Qualquer ponto fora dos limites de controle',
-            'status': 'VIOLADA' if rule_1_violated else 'OK'
-        }
-        
-        # Regra 2: Nove pontos consecutivos no mesmo lado da linha central
-        rule_2_violated = False
-        for i in range(len(values) - 8):
-            above = all(v > center_line for v in values[i:i+9])
-            below = all(v < center_line for v in values[i:i+9])
-            if above or below:
-                rule_2_violated = True
-                break
-        
-        rules['rule_2'] = {
-            'name': '9 pontos consecutivos no mesmo lado',
-            'violated': rule_2_violated,
-            'description': 'Nove pontos consecutivos acima ou abaixo da linha central',
-            'status': 'VIOLADA' if rule_2_violated else 'OK'
-        }
-        
-        # Regra 3: Seis pontos consecutivos em ordem crescente ou decrescente
-        rule_3_violated = False
-        for i in range(len(values) - 5):
-            increasing = all(values[i+j] < values[i+j+1] for j in range(5))
-            decreasing = all(values[i+j] > values[i+j+1] for j in range(5))
-            if increasing or decreasing:
-                rule_3_violated = True
-                break
-        
-        rules['rule_3'] = {
-            'name': '6 pontos em ordem crescente/decrescente',
-            'violated': rule_3_violated,
-            'description': 'Seis pontos consecutivos em tendência crescente ou decrescente',
-            'status': 'VIOLADA' if rule_3_violated else 'OK'
-        }
-        
-        # Regra 4: Quatorze pontos alternando para cima e para baixo
-        rule_4_violated = False
-        if len(values) >= 14:
-            for i in range(len(values) - 13):
-                alternating = True
-                for j in range(13):
-                    if j % 2 == 0:
-                        if values[i+j] >= values[i+j+1]:
-                            alternating = False
-                            break
-                    else:
-                        if values[i+j] <= values[i+j+1]:
-                            alternating = False
-                            break
-                if alternating:
-                    rule_4_violated = True
-                    break
-        
-        rules['rule_4'] = {
-            'name': '14 pontos alternando acima/abaixo',
-            'violated': rule_4_violated,
-            'description': 'Quatorze pontos consecutivos alternando para cima e para baixo',
-            'status': 'VIOLADA' if rule_4_violated else 'OK'
-        }
-        
-        # Regra 5: Dois de três pontos fora de 2-sigma
-        rule_5_violated = False
-        limit_2sigma = center_line + 2 * sigma
-        limit_2sigma_lower = center_line - 2 * sigma
-        
-        for i in range(len(values) - 2):
-            outside_2sigma = sum(1 for v in values[i:i+3] if v > limit_2sigma or v < limit_2sigma_lower)
-            if outside_2sigma >= 2:
-                rule_5_violated = True
-                break
-        
-        rules['rule_5'] = {
-            'name': '2 de 3 pontos fora de 2-sigma',
-            'violated': rule_5_violated,
-            'description': 'Dois de três pontos consecutivos fora de ±2σ',
-            'status': 'VIOLADA' if rule_5_violated else 'OK'
-        }
-        
-        # Regra 6: Quatro de cinco pontos fora de 1-sigma
-        rule_6_violated = False
-        limit_1sigma = center_line + sigma
-        limit_1sigma_lower = center_line - sigma
-        
-        for i in range(len(values) - 4):
-            outside_1sigma = sum(1 for v in values[i:i+5] if v > limit_1sigma or v < limit_1sigma_lower)
-            if outside_1sigma >= 4:
-                rule_6_violated = True
-                break
-        
-        rules['rule_6'] = {
-            'name': '4 de 5 pontos fora de 1-sigma',
-            'violated': rule_6_violated,
-            'description': 'Quatro de cinco pontos consecutivos fora de ±1σ',
-            'status': 'VIOLADA' if rule_6_violated else 'OK'
-        }
-        
-        # Regra 7: Quinze pontos consecutivos dentro de 1-sigma
-        rule_7_violated = False
-        for i in range(len(values) - 14):
-            inside_1sigma = all(limit_1sigma_lower <= v <= limit_1sigma for v in values[i:i+15])
-            if inside_1sigma:
-                rule_7_violated = True
-                break
-        
-        rules['rule_7'] = {
-            'name': '15 pontos consecutivos dentro de 1-sigma',
-            'violated': rule_7_violated,
-            'description': 'Quinze pontos consecutivos dentro de ±1σ (falta de variação)',
-            'status': 'VIOLADA' if rule_7_violated else 'OK'
-        }
-        
-        # Regra 8: Oito pontos consecutivos fora de 1-sigma
-        rule_8_violated = False
-        for i in range(len(values) - 7):
-            outside_1sigma = all(v > limit_1sigma or v < limit_1sigma_lower for v in values[i:i+8])
-            if outside_1sigma:
-                rule_8_violated = True
-                break
-        
-        rules['rule_8'] = {
-            'name': '8 pontos consecutivos fora de 1-sigma',
-            'violated': rule_8_violated,
-            'description': 'Oito pontos consecutivos fora de ±1σ (muita variação)',
-            'status': 'VIOLADA' if rule_8_violated else 'OK'
-        }
-        
-    except Exception as e:
-        logger.error(f"Erro ao analisar regras Western Electric: {e}")
-        return None
-    
-    return rules
+    path = channel_path(name)
+    data = load_data(path)
+    encoder = history_encoders.setdefault(str(path), fast_json.HistoryEncoder())
+    return Response(content=encoder.encode(data, limit), media_type="application/json", headers=headers)
 
+def channel_cache(request, names, *extra):
+    """
+    Cabeçalhos de cache (ETag/Last-Modified) dos canais e se a cópia do
+    cliente ainda é válida: (headers, not_modified)
+    """
+    versions = [channel_version(name) for name in names]
+    etag = make_etag(request.url.path, request.url.query, *versions, *extra)
+    last_modified = max(part[1] for version in versions for part in version)
+    return cache_headers(etag, last_modified), is_not_modified(request, etag, last_modified)
 
 class TemperatureReading(BaseModel):
     temperature: float
@@ -323,6 +188,8 @@ class CombinedReading(BaseModel):
 class Sample(BaseModel):
     Amostra: str
     Dados: List[float]
+    # Gravado quando a amostra fecha (ingestion.summarize)
+    Resumo: Optional[Dict] = None
 
 class TemperatureResponse(BaseModel):
     temperature: float
@@ -351,61 +218,583 @@ class HistoryResponse(BaseModel):
 
 # Inicializar arquivos JSON se não existirem
 def init_data_file():
-    if not DATA_FILE.exists():
-        DATA_FILE.write_text(json.dumps([], indent=2))
-        logger.info("Arquivo de temperatura criado")
-    if not HUMIDITY_FILE.exists():
-        HUMIDITY_FILE.write_text(json.dumps([], indent=2))
-        logger.info("Arquivo de umidade criado")
-
-def load_data(file_path=DATA_FILE):
-    """Carrega dados do arquivo JSON"""
+    for name, config in channels.items():
+        with file_lock(config.path):
+            if not config.path.exists():
+                atomic_write(config.path, json.dumps([], indent=2))
+                logger.info(f"Arquivo de dados do canal {name} criado")
+
+def parse_samples(raw):
+    """Lista de amostras a partir do conteúdo do arquivo JSON"""
+    data = fast_json.loads(raw)
+    # Se for formato antigo, converte para novo
+    if isinstance(data, dict) and "readings" in data:
+        return []
+    return data if isinstance(data, list) else []
+
+# Versão corrente de cada arquivo de dados em memória (snapshots.py): leituras
+# e análises pegam um ponto no tempo em O(1) enquanto a ingestão grava
+snapshots = SnapshotStore(parse_samples, replay_log)
+
+# Log de ingestão: cada lote grava só as amostras que mudaram; o arquivo de
+# dados é reescrito (compactação) quando o log passa do tamanho dele
+INGEST_LOG_MIN_BYTES = int(os.getenv("INGEST_LOG_MIN_BYTES") or 1 << 20)
+
+def load_data(file_path=None, writable=False):
+    """
+    Amostras do arquivo JSON: snapshot somente leitura da versão atual, ou
+    (writable=True, sob a trava do arquivo) uma cópia para a ingestão alterar
+    """
+    if file_path is None:
+        file_path = channel_path("temperature")
     try:
-        data = json.loads(file_path.read_text())
-        # Se for formato antigo, converte para novo
-        if isinstance(data, dict) and "readings" in data:
-            return []
-        return data if isinstance(data, list) else []
+        if writable:
+            return snapshots.writable(file_path)
+        return snapshots.get(file_path).samples
     except Exception as e:
         logger.error(f"Erro ao carregar dados de {file_path}: {e}")
         return []
 
-def save_data(data, file_path=DATA_FILE):
-    """Salva dados no arquivo JSON"""
+def load_snapshot(file_path):
+    """Snapshot (versão, amostras) do arquivo, como load_data; vazio se não puder ser lido"""
     try:
-        file_path.write_text(json.dumps(data, indent=2))
+        return snapshots.get(file_path)
+    except Exception as e:
+        logger.error(f"Erro ao carregar dados de {file_path}: {e}")
+        return Snapshot(((0, 0, 0), (0, 0, 0)), [])
+
+def save_data(data, file_path=None):
+    """
+    Salva dados no arquivo JSON (sob a trava do arquivo), incorporando o log
+    de ingestão, e publica a nova versão
+    """
+    if file_path is None:
+        file_path = channel_path("temperature")
+    try:
+        replace_logged(file_path, json.dumps(data, indent=2))
+        snapshots.publish(file_path, data)
         logger.info(f"Dados salvos com sucesso em {file_path}")
     except Exception as e:
         logger.error(f"Erro ao salvar dados em {file_path}: {e}")
 
-def get_current_sample(data):
-    """Retorna a amostra atual (incompleta ou None)"""
-    if not data or not isinstance(data, list):
-        return None
-    
-    last_sample = data[-1]
-    
-    # Verificar se a amostra tem a estrutura correta
-    if not isinstance(last_sample, dict) or "Dados" not in last_sample:
-        return None
-    
-    if len(last_sample["Dados"]) < SAMPLE_SIZE:
-        return last_sample
-    return None
-
-def create_new_sample(data):
-    """Cria uma nova amostra"""
-    sample_number = len(data) + 1
-    new_sample = {
-        "Amostra": str(sample_number),
-        "Dados": []
-    }
-    data.append(new_sample)
-    return new_sample
+def append_data(data, start, file_path):
+    """
+    Grava no log de ingestão as amostras alteradas a partir de `start` (sob
+    a trava do arquivo) e publica a nova versão; compacta o log grande
+    """
+    try:
+        append_log(file_path, log_entry(data, start))
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados em {file_path}: {e}")
+        return
+    base, log = logged_version(file_path)
+    if log[2] > max(INGEST_LOG_MIN_BYTES, base[2]):
+        save_data(data, file_path)
+    else:
+        snapshots.publish(file_path, data)
+
+# Reordenação das leituras atrasadas pelo timestamp (reorder.py); atraso
+# tolerado em ms, 0 = leituras entram na ordem de chegada
+reorder = ReorderBuffers(
+    int(os.getenv("REORDER_LATENESS_MS") or 0),
+    int(os.getenv("REORDER_MAX_PENDING") or 10000),
+)
+
+# Filtro de saúde do sensor por canal (sensor_health.py): leituras com
+# falha vão para a quarentena em vez de "Dados"
+sensor_health = SensorHealth(channels.get)
+_quarantine_store = None
+
+def quarantine_store():
+    global _quarantine_store
+    if _quarantine_store is None:
+        from sensor_health import QuarantineStore
+        _quarantine_store = QuarantineStore(channel_path(channels.names()[0]).parent)
+    return _quarantine_store
+
+def write_readings(name, values, timestamps=None, flush=False):
+    """
+    Adiciona leituras ao canal: uma entrada no log de ingestão por lote (só
+    as amostras alteradas), com o agrupamento em subgrupos comum a todos os endpoints
+    A trava entre processos garante que nenhum worker perca leituras de outro
+
+    As leituras passam antes pelo filtro de saúde do sensor; flush=True
+    grava a leitura que o filtro retinha (encerramento da API)
+    """
+    config = channels.get(name)
+    with file_lock(config.path):
+        sensor = sensor_health.filter(name)
+        if flush:
+            accepted, quarantined = sensor.flush()
+        else:
+            accepted, quarantined = sensor.process(zip(timestamps or [None] * len(values), values))
+        values = [value for _, value in accepted]
+        timestamps = [t for t, _ in accepted] if all(t is not None for t, _ in accepted) else None
+        data = load_data(config.path, writable=True)
+        start = max(len(data) - 1, 0)
+        result = append_readings(data, values, config.sample_size, timestamps=timestamps)
+        if values:
+            append_data(data, start, config.path)
+    if quarantined:
+        try:
+            quarantine_store().append(name, quarantined)
+        except Exception as e:
+            logger.error(f"Erro ao gravar leituras em quarentena de {name}: {e}")
+        logger.warning(f"{len(quarantined)} leitura(s) de {name} em quarentena: "
+                       f"{', '.join(sorted({reason for _, _, reason in quarantined}))}")
+    result["quarantined"] = len(quarantined)
+    # Avaliação das regras fora do caminho do POST (só enfileira)
+    alerts.submit(name, result["closed_samples"])
+    return result
+
+def ingest_readings(name, values, timestamps=None):
+    """
+    Entrada de leituras de todos os endpoints; com a reordenação ativa,
+    passam pelo buffer do canal e só as liberadas pelo watermark são gravadas
+
+    Args:
+        timestamps: timestamps (Unix, ms) das leituras; ausentes = chegada
+    """
+    if not reorder.enabled:
+        return write_readings(name, values)
+    arrival = now_ms()
+    buffer = reorder.get(name)
+    with buffer.lock:
+        released = buffer.add(zip(event_times(timestamps, len(values), arrival), values), arrival)
+        result = write_released(name, released)
+        result["pending"] = buffer.pending
+    return result
+
+def write_released(name, released):
+    """Grava as leituras liberadas pelo buffer, com os horários delas"""
+    return write_readings(name, [value for _, value in released], [t for t, _ in released])
+
+def expire_reorder_buffers(flush=False):
+    """Grava o que esperava nos buffers parados (ou tudo, no encerramento)"""
+    for name, buffer in reorder.items():
+        try:
+            with buffer.lock:
+                released = buffer.flush() if flush else buffer.expire()
+                if released:
+                    write_released(name, released)
+        except Exception as e:
+            logger.error(f"Erro ao liberar leituras reordenadas de {name}: {e}")
+
+async def start_reorder_expiry():
+    """Libera periodicamente as leituras de canais sem leituras novas"""
+    if not reorder.enabled:
+        return
+    async def expire_loop():
+        interval = min(1.0, reorder.lateness / 1000)
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.get_running_loop().run_in_executor(None, expire_reorder_buffers)
+    app.state.reorder_expiry = asyncio.create_task(expire_loop())
+    logger.info(f"Reordenação de leituras ativa (atraso tolerado: {reorder.lateness} ms)")
+
+def flush_sensor_filters():
+    """Grava as leituras retidas pelos filtros de saúde do sensor"""
+    for name, _ in sensor_health.items():
+        try:
+            write_readings(name, [], flush=True)
+        except Exception as e:
+            logger.error(f"Erro ao liberar leitura retida de {name}: {e}")
+
+async def flush_ingestion_buffers():
+    # Antes de parar os alertas: as amostras fechadas aqui ainda são avaliadas
+    loop = asyncio.get_running_loop()
+    if reorder.enabled:
+        app.state.reorder_expiry.cancel()
+        await loop.run_in_executor(None, expire_reorder_buffers, True)
+    await loop.run_in_executor(None, flush_sensor_filters)
+
+def clear_channel(name):
+    """Esvazia o histórico do canal (sob a mesma trava da ingestão)"""
+    reorder.discard(name)
+    path = channel_path(name)
+    with file_lock(path):
+        save_data([], path)
+        sensor_health.reset(name)
+    paired_store().clear(name)
+    quarantine_store().clear(name)
+
+# Leituras do mesmo instante em vários canais (POST /combined, registros
+# binários), guardadas para a análise multivariada (multivariate.py)
+_paired_store = None
+# Monitores em memória por (grupo, base, alfa): cada um guarda as somas
+# acumuladas do arquivo inteiro, então só os mais recentes ficam (LRU)
+PAIRED_MONITORS_MAX = 8
+paired_monitors = OrderedDict()
+_paired_monitors_lock = threading.Lock()
+
+def paired_store():
+    global _paired_store
+    if _paired_store is None:
+        from multivariate import PairedStore
+        _paired_store = PairedStore(channel_path(channels.names()[0]).parent)
+    return _paired_store
+
+def multivariate_analysis(key, baseline=100, alpha=0.0027, window=50, last=500):
+    """T² e correlação deslizante do grupo, estendidos com as leituras novas"""
+    from multivariate import MultivariateMonitor
+    with _paired_monitors_lock:
+        monitor = paired_monitors.get((key, baseline, alpha))
+        if monitor is None:
+            monitor = paired_monitors[(key, baseline, alpha)] = MultivariateMonitor(key, baseline, alpha)
+        paired_monitors.move_to_end((key, baseline, alpha))
+        while len(paired_monitors) > PAIRED_MONITORS_MAX:
+            paired_monitors.popitem(last=False)
+    monitor.refresh(paired_store())
+    return monitor.analysis(window=window, last=last)
+
+def ingest_paired(rows):
+    """
+    Grava leituras pareadas ({canal: valor}); uma falha aqui não invalida
+    as leituras já gravadas nos canais
+    """
+    try:
+        # Pares com leitura inválida (NaN, fora da faixa física) ficam de fora
+        paired_store().append([
+            row for row in rows
+            if not any(sensor_health.filter(name).invalid(value) for name, value in row.items())
+        ])
+    except Exception as e:
+        logger.error(f"Erro ao gravar leituras pareadas: {e}")
+
+def ingest_batch(records):
+    """
+    Entrega um lote do gateway [(timestamp, {canal: valor})] ao montador de
+    subgrupos; registros com vários canais também vão às leituras pareadas
+    """
+    from mqtt_gateway import paired_rows, timed_readings
+    for name, (timestamps, values) in timed_readings(records).items():
+        ingest_readings(name, values, timestamps)
+    ingest_paired(paired_rows(records))
 
 # Inicializar arquivo ao iniciar a API
 init_data_file()
 
+# Alertas de violação das regras avaliados na ingestão (ALERTS_ENABLED=0 desativa)
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "1") != "0"
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+ALERT_LOG_FILE = os.getenv("ALERT_LOG_FILE", "")
+
+def build_alert_sinks():
+    sinks = [FeedSink()]
+    if ALERT_LOG_FILE:
+        sinks.append(LogFileSink(ALERT_LOG_FILE))
+    if ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+    return sinks
+
+alerts = AlertPipeline(
+    channels.get,
+    lambda name: load_data(channel_path(name)),
+    build_alert_sinks(),
+    window=int(os.getenv("ALERT_WINDOW") or 100),
+    cooldown=float(os.getenv("ALERT_COOLDOWN") or 300),
+)
+
+async def start_alerts():
+    if ALERTS_ENABLED:
+        alerts.start()
+        logger.info(f"Alertas CEP ativos: {', '.join(worker.sink.name for worker in alerts.workers)}")
+
+async def stop_alerts():
+    if ALERTS_ENABLED:
+        await asyncio.get_running_loop().run_in_executor(None, alerts.stop)
+
+@app.get("/alerts")
+async def get_alerts(channel: Optional[str] = None, limit: int = 50):
+    """
+    Feed dos alertas mais recentes (violações das regras do Western Electric)
+    """
+    if channel is not None and channel not in channels:
+        raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+    return {
+        "enabled": ALERTS_ENABLED,
+        "alerts": alerts.sink("feed").recent(channel, max(1, min(limit, 500)))
+    }
+
+@app.get("/alerts/status")
+async def get_alerts_status():
+    """
+    Contadores do pipeline de alertas (avaliações, fila e entregas por sink)
+    """
+    return {"enabled": ALERTS_ENABLED, **alerts.status()}
+
+@app.get("/sensors/health")
+async def get_sensors_health():
+    """
+    Contadores do filtro de saúde do sensor por canal: leituras aceitas e
+    em quarentena por motivo (nan, range, spike, stuck)
+    """
+    return {
+        "channels": sensor_health.status(),
+        "limits": {
+            name: {key: getattr(config, key) for key in ("valid_min", "valid_max", "max_step", "stuck_limit")}
+            for name, config in channels.items()
+        }
+    }
+
+@app.get("/sensors/quarantine")
+async def get_sensors_quarantine(channel: str = "temperature", limit: int = 100):
+    """
+    Últimas leituras em quarentena do canal, com horário e motivo
+    """
+    if channel not in channels:
+        raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+    return {"channel": channel, "readings": quarantine_store().recent(channel, max(1, min(limit, 1000)))}
+
+@app.get("/ingest/reorder/status")
+async def get_reorder_status():
+    """
+    Buffers de reordenação por canal: watermark, leituras esperando,
+    reordenadas e descartadas por atraso
+    """
+    return reorder.status()
+
+# Número de processos ao executar com python main.py (uvicorn --workers)
+API_WORKERS = int(os.getenv("API_WORKERS") or 1)
+
+# Gateway MQTT em processo (MQTT_BROKER=host:porta ativa; vazio desativa)
+MQTT_BROKER = os.getenv("MQTT_BROKER", "")
+mqtt_consumer = None
+
+async def start_mqtt_gateway():
+    global mqtt_consumer
+    if not MQTT_BROKER:
+        return
+    if API_WORKERS > 1:
+        # Cada worker assinaria os mesmos tópicos e duplicaria as leituras
+        logger.error("Gateway MQTT em processo exige um único worker; use mqtt_gateway.py em processo separado")
+        return
+    from mqtt_gateway import IngestionConsumer, MqttClientBroker
+    host, _, port = MQTT_BROKER.partition(":")
+    try:
+        broker = MqttClientBroker(host, int(port or 1883))
+    except RuntimeError as e:
+        logger.error(f"Gateway MQTT não iniciado: {e}")
+        return
+    mqtt_consumer = IngestionConsumer(
+        broker, ingest_batch,
+        channel_names=channels.names,
+        binary_channels=lambda binary_id: getattr(channels.by_binary_id(binary_id), "name", None)
+    )
+    mqtt_consumer.start()
+    logger.info(f"Gateway MQTT iniciado ({MQTT_BROKER})")
+
+async def stop_mqtt_gateway():
+    if mqtt_consumer is not None:
+        await mqtt_consumer.stop()
+
+@app.get("/ingest/mqtt/status")
+async def get_mqtt_status():
+    """
+    Estado do gateway MQTT em processo
+    """
+    if mqtt_consumer is None:
+        return {"enabled": False}
+    return {"enabled": True, "broker": MQTT_BROKER, **mqtt_consumer.stats}
+
+# Rotas /admin exigem o cabeçalho X-Admin-Token; sem ADMIN_TOKEN ficam desativadas
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Perfilamento sob demanda (profiling.py): sem janela aberta, custo desprezível
+profiler = Profiler()
+
+def require_admin(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Rotas de administração desativadas (defina ADMIN_TOKEN)")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de administração inválido")
+
+@app.post("/admin/profiling/start")
+async def start_profiling(
+    seconds: float = Query(30, gt=0, le=600),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Abre uma janela de perfilamento: amostragem das pilhas de todas as
+    threads e tempos por etapa das requisições instrumentadas
+    """
+    require_admin(x_admin_token)
+    try:
+        profiler.start(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Perfilamento iniciado por {seconds:g} s (amostra a cada {interval_ms:g} ms)")
+    return profiler.status()
+
+@app.post("/admin/profiling/stop")
+async def stop_profiling(x_admin_token: Optional[str] = Header(None)):
+    """Encerra a janela de perfilamento antes do prazo"""
+    require_admin(x_admin_token)
+    await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return profiler.status()
+
+@app.get("/admin/profiling/status")
+async def get_profiling_status(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return profiler.status()
+
+@app.get("/admin/profiling/profile")
+async def get_profiling_profile(format: str = "collapsed", x_admin_token: Optional[str] = Header(None)):
+    """
+    Pilhas amostradas na última janela: format=collapsed (texto para
+    flamegraph.pl/speedscope) ou json
+    """
+    require_admin(x_admin_token)
+    if format == "collapsed":
+        return Response(content=profiler.collapsed(), media_type="text/plain; charset=utf-8")
+    if format == "json":
+        return {
+            **profiler.status(),
+            "stacks": [{"stack": stack, "count": count} for stack, count in profiler.stack_counts()]
+        }
+    raise HTTPException(status_code=400, detail=f"Formato não suportado: {format} (use collapsed ou json)")
+
+@app.get("/admin/profiling/traces")
+async def get_profiling_traces(limit: Optional[int] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Tempos por etapa das requisições instrumentadas (ex.: POST
+    /cep/analyze/combined) na última janela, com o total por etapa
+    """
+    require_admin(x_admin_token)
+    return profiler.breakdown(limit)
+
+# Reprocessamento do histórico em segundo plano (backfill.py): processos de
+# cálculo (padrão: um por núcleo, menos um) e limite de subgrupos/s enviados
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS") or max(1, (os.cpu_count() or 1) - 1))
+BACKFILL_RATE = float(os.getenv("BACKFILL_RATE") or 5000)
+_backfill_runner = None
+
+def channel_readings(name):
+    """Leituras do histórico do canal, em ordem (snapshot, sem a trava do arquivo)"""
+    return [value for sample in load_data(channel_path(name)) for value in sample.get("Dados", [])]
+
+def backfill_runner():
+    global _backfill_runner
+    if _backfill_runner is None:
+        _backfill_runner = BackfillRunner(
+            channel_path(channels.names()[0]).parent / "backfill",
+            channels.get, channel_readings,
+            workers=BACKFILL_WORKERS, rate=BACKFILL_RATE
+        )
+    return _backfill_runner
+
+def backfill_job_status(job_id):
+    status = backfill_runner().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job de backfill não encontrado: {job_id}")
+    return status
+
+async def stop_backfill():
+    # Os blocos já concluídos ficam gravados; o job pode ser retomado depois
+    if _backfill_runner is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: _backfill_runner.stop(status="interrupted")
+        )
+
+@app.post("/admin/backfill/start")
+async def start_backfill(
+    channel: Optional[str] = None,
+    window: int = Query(25, ge=2),
+    step: int = Query(1, ge=1),
+    chunk_size: int = Query(500, ge=1),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Recalcula os resultados derivados do histórico com a configuração atual
+    dos canais: resumos dos subgrupos, capacidade por janela deslizante
+    (window/step), limites e regras do gráfico e a imagem do gráfico
+    - channel: canal a reprocessar (padrão: todos)
+    """
+    require_admin(x_admin_token)
+    if channel is not None and channel not in channels:
+        raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+    names = [channel] if channel else channels.names()
+    runner = backfill_runner()
+    try:
+        job = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: runner.start(names, window=window, step=step, chunk_size=chunk_size)
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Backfill {job.id} iniciado: {', '.join(names)}")
+    return backfill_job_status(job.id)
+
+@app.get("/admin/backfill/jobs")
+async def get_backfill_jobs(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {"jobs": backfill_runner().jobs()}
+
+@app.get("/admin/backfill/jobs/{job_id}")
+async def get_backfill_job(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Progresso do job: blocos por canal e fase, subgrupos/s e ETA"""
+    require_admin(x_admin_token)
+    return backfill_job_status(job_id)
+
+@app.post("/admin/backfill/jobs/{job_id}/cancel")
+async def cancel_backfill_job(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Interrompe o job depois dos blocos em andamento (pode ser retomado)"""
+    require_admin(x_admin_token)
+    backfill_job_status(job_id)
+    runner = backfill_runner()
+    if not await asyncio.get_running_loop().run_in_executor(None, runner.stop, job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} não está em andamento")
+    return backfill_job_status(job_id)
+
+@app.post("/admin/backfill/jobs/{job_id}/resume")
+async def resume_backfill_job(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Retoma um job interrompido, cancelado ou com falha, sem refazer os blocos concluídos"""
+    require_admin(x_admin_token)
+    runner = backfill_runner()
+    try:
+        job = await asyncio.get_running_loop().run_in_executor(None, runner.resume, job_id)
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job de backfill não encontrado: {job_id}")
+    logger.info(f"Backfill {job_id} retomado")
+    return backfill_job_status(job_id)
+
+@app.get("/admin/backfill/jobs/{job_id}/result/{channel}")
+async def get_backfill_result(
+    job_id: str,
+    channel: str,
+    summaries: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Resultado do canal: gráfico (limites, pontos e regras), capacidade
+    geral e por janela; summaries=true inclui os resumos dos subgrupos
+    """
+    require_admin(x_admin_token)
+    status = backfill_job_status(job_id)
+    if channel not in status["channels"]:
+        raise HTTPException(status_code=404, detail=f"Canal {channel} não faz parte do job {job_id}")
+    path = backfill_runner().get(job_id).result_path(channel)
+    if not path.exists():
+        raise HTTPException(status_code=409, detail=f"Resultado de {channel} ainda não disponível (job {status['status']})")
+    result = fast_json.loads(path.read_bytes())
+    if not summaries:
+        result.pop("summaries")
+    return result
+
+@app.get("/admin/backfill/jobs/{job_id}/chart/{channel}")
+async def get_backfill_chart(job_id: str, channel: str, x_admin_token: Optional[str] = Header(None)):
+    """Imagem PNG do gráfico recalculado"""
+    require_admin(x_admin_token)
+    status = backfill_job_status(job_id)
+    if channel not in status["channels"]:
+        raise HTTPException(status_code=404, detail=f"Canal {channel} não faz parte do job {job_id}")
+    path = backfill_runner().get(job_id).result_path(channel, "png")
+    if not path.exists():
+        raise HTTPException(status_code=409, detail=f"Gráfico de {channel} ainda não disponível (job {status['status']})")
+    return FileResponse(path, media_type="image/png")
+
 @app.get("/")
 async def root():
     """Endpoint raiz com informações da API"""
@@ -418,47 +807,34 @@ async def root():
             "GET /temperature": "Obter última leitura de temperatura",
             "GET /history": "Obter histórico de leituras",
             "GET /health": "Verificar status da API",
+            "GET /alerts": "Alertas de violação das regras CEP",
             "DELETE /history": "Limpar histórico"
         }
     }
 
 @app.post("/data", status_code=201)
-async def receive_data(reading: TemperatureReading):
+def receive_data(reading: TemperatureReading):
     """
     Endpoint para ESP32 enviar dados de temperatura via POST
     Agrupa dados em amostras de 5 leituras
     """
     try:
-        # Carregar dados existentes
-        data = load_data()
-        
-        # Verificar se há amostra atual incompleta
-        current_sample = get_current_sample(data)
+        config = channels.get("temperature")
         
-        # Se não há amostra ou está completa, criar nova
-        if current_sample is None:
-            current_sample = create_new_sample(data)
+        # Adicionar temperatura à amostra atual (ou a uma nova)
+        result = ingest_readings("temperature", [reading.temperature], [reading.timestamp])
+        sample_number = result["sample_number"]
+        position = result["position_in_sample"]
         
-        # Adicionar temperatura à amostra atual
-        current_sample["Dados"].append(reading.temperature)
-        
-        # Informações para resposta
-        sample_number = current_sample["Amostra"]
-        position = len(current_sample["Dados"])
-        is_complete = len(current_sample["Dados"]) == SAMPLE_SIZE
-        
-        # Salvar
-        save_data(data)
-        
-        logger.info(f"Temperatura {reading.temperature}°C adicionada à Amostra {sample_number} (Posição {position}/5)")
+        logger.info(f"Temperatura {reading.temperature}°C adicionada à Amostra {sample_number} (Posição {position}/{config.sample_size})")
         
         return {
             "message": "Dados recebidos com sucesso",
             "temperature": reading.temperature,
             "sample_number": sample_number,
             "position_in_sample": position,
-            "sample_complete": is_complete,
-            "total_samples": len(data)
+            "sample_complete": result["sample_complete"],
+            "total_samples": result["total_samples"]
         }
         
     except Exception as e:
@@ -466,11 +842,16 @@ async def receive_data(reading: TemperatureReading):
         raise HTTPException(status_code=500, detail=f"Erro ao processar dados: {str(e)}")
 
 @app.get("/temperature", response_model=TemperatureResponse)
-async def get_temperature():
+async def get_temperature(request: Request, response: Response):
     """
     Obtém a última leitura de temperatura
     """
     try:
+        headers, fresh = channel_cache(request, ["temperature"])
+        if fresh:
+            return not_modified(headers)
+        response.headers.update(headers)
+        
         data = load_data()
         
         if not data:
@@ -503,25 +884,16 @@ async def get_temperature():
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @app.get("/history", response_model=HistoryResponse)
-async def get_history(limit: Optional[int] = None):
+async def get_history(request: Request, limit: Optional[int] = None):
     """
     Obtém histórico de amostras de temperatura
     """
     try:
-        data = load_data()
+        headers, fresh = channel_cache(request, ["temperature"])
+        if fresh:
+            return not_modified(headers)
         
-        # Aplicar limite se especificado
-        samples = data[-limit:] if limit else data
-        
-        # Calcular total de leituras
-        total_readings = sum(len(sample["Dados"]) for sample in data)
-        
-        return {
-            "samples": samples,
-            "total_samples": len(data),
-            "total_readings": total_readings,
-            "current_sample": data[-1] if data else None
-        }
+        return history_response("temperature", limit, headers)
         
     except Exception as e:
         logger.error(f"Erro ao obter histórico: {e}")
@@ -530,12 +902,17 @@ async def get_history(limit: Optional[int] = None):
 # ==================== HUMIDITY ENDPOINTS ====================
 
 @app.get("/humidity", response_model=HumidityResponse)
-async def get_humidity():
+async def get_humidity(request: Request, response: Response):
     """
     Obtém a última leitura de umidade
     """
     try:
-        data = load_data(HUMIDITY_FILE)
+        headers, fresh = channel_cache(request, ["humidity"])
+        if fresh:
+            return not_modified(headers)
+        response.headers.update(headers)
+        
+        data = load_data(channel_path("humidity"))
         
         if not data:
             raise HTTPException(
@@ -567,42 +944,28 @@ async def get_humidity():
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @app.post("/humidity", status_code=201)
-async def receive_humidity(reading: HumidityReading):
+def receive_humidity(reading: HumidityReading):
     """
     Endpoint para ESP32 enviar dados de umidade via POST
     Agrupa dados em amostras de 5 leituras
     """
     try:
-        # Carregar dados existentes
-        data = load_data(HUMIDITY_FILE)
+        config = channels.get("humidity")
         
-        # Verificar se há amostra atual incompleta
-        current_sample = get_current_sample(data)
+        # Adicionar umidade à amostra atual (ou a uma nova)
+        result = ingest_readings("humidity", [reading.humidity], [reading.timestamp])
+        sample_number = result["sample_number"]
+        position = result["position_in_sample"]
         
-        # Se não há amostra ou está completa, criar nova
-        if current_sample is None:
-            current_sample = create_new_sample(data)
-        
-        # Adicionar umidade à amostra atual
-        current_sample["Dados"].append(reading.humidity)
-        
-        # Informações para resposta
-        sample_number = current_sample["Amostra"]
-        position = len(current_sample["Dados"])
-        is_complete = len(current_sample["Dados"]) == SAMPLE_SIZE
-        
-        # Salvar
-        save_data(data, HUMIDITY_FILE)
-        
-        logger.info(f"Umidade {reading.humidity}% adicionada à Amostra {sample_number} (Posição {position}/5)")
+        logger.info(f"Umidade {reading.humidity}% adicionada à Amostra {sample_number} (Posição {position}/{config.sample_size})")
         
         return {
             "message": "Dados de umidade recebidos com sucesso",
             "humidity": reading.humidity,
             "sample_number": sample_number,
             "position_in_sample": position,
-            "sample_complete": is_complete,
-            "total_samples": len(data)
+            "sample_complete": result["sample_complete"],
+            "total_samples": result["total_samples"]
         }
         
     except Exception as e:
@@ -610,31 +973,22 @@ async def receive_humidity(reading: HumidityReading):
         raise HTTPException(status_code=500, detail=f"Erro ao processar dados: {str(e)}")
 
 @app.post("/combined", status_code=201)
-async def receive_combined(reading: CombinedReading):
+def receive_combined(reading: CombinedReading):
     """
     Endpoint para ESP32 enviar temperatura e umidade simultaneamente
     """
     try:
-        # Processar temperatura
-        temp_data = load_data(DATA_FILE)
-        temp_sample = get_current_sample(temp_data)
-        if temp_sample is None:
-            temp_sample = create_new_sample(temp_data)
-        temp_sample["Dados"].append(reading.temperature)
-        save_data(temp_data, DATA_FILE)
-        
-        # Processar umidade
-        hum_data = load_data(HUMIDITY_FILE)
-        hum_sample = get_current_sample(hum_data)
-        if hum_sample is None:
-            hum_sample = create_new_sample(hum_data)
-        hum_sample["Dados"].append(reading.humidity)
-        save_data(hum_data, HUMIDITY_FILE)
-        
-        sample_number = temp_sample["Amostra"]
-        position = len(temp_sample["Dados"])
-        
-        logger.info(f"Temperatura {reading.temperature}°C e Umidade {reading.humidity}% - Amostra {sample_number} ({position}/5)")
+        temp_config = channels.get("temperature")
+        
+        # Processar temperatura e umidade
+        temp_result = ingest_readings("temperature", [reading.temperature], [reading.timestamp])
+        ingest_readings("humidity", [reading.humidity], [reading.timestamp])
+        ingest_paired([{"temperature": reading.temperature, "humidity": reading.humidity}])
+        
+        sample_number = temp_result["sample_number"]
+        position = temp_result["position_in_sample"]
+        
+        logger.info(f"Temperatura {reading.temperature}°C e Umidade {reading.humidity}% - Amostra {sample_number} ({position}/{temp_config.sample_size})")
         
         return {
             "message": "Dados combinados recebidos com sucesso",
@@ -642,71 +996,87 @@ async def receive_combined(reading: CombinedReading):
             "humidity": reading.humidity,
             "sample_number": sample_number,
             "position_in_sample": position,
-            "sample_complete": position == SAMPLE_SIZE,
-            "total_samples": len(temp_data)
+            "sample_complete": temp_result["sample_complete"],
+            "total_samples": temp_result["total_samples"]
         }
         
     except Exception as e:
         logger.error(f"Erro ao processar dados combinados: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar dados: {str(e)}")
 
-@app.get("/humidity", response_model=HumidityResponse)
-async def get_humidity():
+def ingest_frames(frames, readings, names):
+    """Grava as leituras de um lote binário por canal e os registros pareados"""
+    from binary_protocol import paired_records
+    results = {}
+    for name, (timestamps, values) in readings.items():
+        result = ingest_readings(name, values, timestamps)
+        results[name] = {
+            "readings": len(values),
+            "sample_number": result["sample_number"],
+            "position_in_sample": result["position_in_sample"],
+            "total_samples": result["total_samples"]
+        }
+    ingest_paired([
+        {names[binary_id]: value for binary_id, value in record.items()}
+        for record in paired_records(frames)
+    ])
+    return results
+
+@app.post("/ingest/binary", status_code=201)
+async def receive_binary(request: Request):
     """
-    Obtém a última leitura de umidade
+    Ingestão em lote pelo protocolo binário compacto (binary_protocol)
+    Corpo: um ou mais quadros (application/octet-stream); cada canal do
+    lote é gravado uma única vez
     """
     try:
-        data = load_data(HUMIDITY_FILE)
+        from binary_protocol import decode_frames, timed_readings_by_channel
         
-        if not data:
-            raise HTTPException(
-                status_code=404,
-                detail="Nenhuma leitura de umidade disponível. ESP32 ainda não enviou dados."
-            )
+        try:
+            frames = decode_frames(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Quadro binário inválido: {str(e)}")
         
-        # Pegar última amostra e última umidade
-        last_sample = data[-1]
-        if not last_sample["Dados"]:
-            raise HTTPException(
-                status_code=404,
-                detail="Nenhuma leitura de umidade disponível."
-            )
+        readings = {}
+        names = {}
+        for binary_id, timed in timed_readings_by_channel(frames, now_ms()).items():
+            config = channels.by_binary_id(binary_id)
+            if config is None:
+                raise HTTPException(status_code=400, detail=f"Canal binário desconhecido: {binary_id}")
+            readings[config.name] = timed
+            names[binary_id] = config.name
+        devices = {frame.device_id for frame in frames}
         
-        last_hum = last_sample["Dados"][-1]
+        # Gravação (travas e arquivos dos canais) fora do loop de eventos
+        results = await run_in_threadpool(ingest_frames, frames, readings, names)
+        
+        accepted = sum(len(values) for _, values in readings.values())
+        logger.info(f"Lote binário: {accepted} leituras de {len(devices)} dispositivo(s) em {len(frames)} quadro(s)")
         
         return {
-            "humidity": last_hum,
-            "sample_number": last_sample["Amostra"],
-            "position_in_sample": len(last_sample["Dados"]),
-            "samples_count": len(data)
+            "message": "Lote binário recebido com sucesso",
+            "frames": len(frames),
+            "accepted": accepted,
+            "channels": results
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao obter umidade: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+        logger.error(f"Erro ao processar lote binário: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao processar dados: {str(e)}")
 
 @app.get("/humidity/history", response_model=HistoryResponse)
-async def get_humidity_history(limit: Optional[int] = None):
+async def get_humidity_history(request: Request, limit: Optional[int] = None):
     """
     Obtém histórico de amostras de umidade
     """
     try:
-        data = load_data(HUMIDITY_FILE)
-        
-        # Aplicar limite se especificado
-        samples = data[-limit:] if limit else data
+        headers, fresh = channel_cache(request, ["humidity"])
+        if fresh:
+            return not_modified(headers)
         
-        # Calcular total de leituras
-        total_readings = sum(len(sample["Dados"]) for sample in data)
-        
-        return {
-            "samples": samples,
-            "total_samples": len(data),
-            "total_readings": total_readings,
-            "current_sample": data[-1] if data else None
-        }
+        return history_response("humidity", limit, headers)
         
     except Exception as e:
         logger.error(f"Erro ao obter histórico de umidade: {e}")
@@ -719,7 +1089,7 @@ async def health_check():
     """
     try:
         # Dados de temperatura
-        temp_data = load_data(DATA_FILE)
+        temp_data = load_data(channel_path("temperature"))
         temp_total_samples = len(temp_data)
         temp_total_readings = sum(len(sample["Dados"]) for sample in temp_data)
         
@@ -729,11 +1099,11 @@ async def health_check():
             temp_current_sample = {
                 "number": last_sample["Amostra"],
                 "readings_count": len(last_sample["Dados"]),
-                "is_complete": len(last_sample["Dados"]) == SAMPLE_SIZE
+                "is_complete": len(last_sample["Dados"]) == channels.get("temperature").sample_size
             }
         
         # Dados de umidade
-        hum_data = load_data(HUMIDITY_FILE)
+        hum_data = load_data(channel_path("humidity"))
         hum_total_samples = len(hum_data)
         hum_total_readings = sum(len(sample["Dados"]) for sample in hum_data)
         
@@ -743,7 +1113,7 @@ async def health_check():
             hum_current_sample = {
                 "number": last_sample["Amostra"],
                 "readings_count": len(last_sample["Dados"]),
-                "is_complete": len(last_sample["Dados"]) == SAMPLE_SIZE
+                "is_complete": len(last_sample["Dados"]) == channels.get("humidity").sample_size
             }
         
         return {
@@ -759,13 +1129,14 @@ async def health_check():
                 "current_sample": hum_current_sample
             },
             "data_files": {
-                "temperature": str(DATA_FILE.absolute()),
-                "humidity": str(HUMIDITY_FILE.absolute())
+                "temperature": str(channel_path("temperature").absolute()),
+                "humidity": str(channel_path("humidity").absolute())
             },
             "esp32_config": {
                 "expected_ip": ESP32_IP,
                 "read_interval": ESP32_READ_INTERVAL
-            }
+            },
+            "snapshots": snapshots.stats
         }
         
     except Exception as e:
@@ -780,7 +1151,7 @@ async def clear_history():
     Limpa todo o histórico de temperatura
     """
     try:
-        save_data([], DATA_FILE)
+        clear_channel("temperature")
         logger.info("Histórico de temperatura limpo")
         return {"message": "Histórico de temperatura limpo com sucesso"}
     except Exception as e:
@@ -792,7 +1163,7 @@ async def clear_humidity_history():
     Limpa todo o histórico de umidade
     """
     try:
-        save_data([], HUMIDITY_FILE)
+        clear_channel("humidity")
         logger.info("Histórico de umidade limpo")
         return {"message": "Histórico de umidade limpo com sucesso"}
     except Exception as e:
@@ -804,8 +1175,8 @@ async def clear_all_history():
     Limpa todo o histórico (temperatura e umidade)
     """
     try:
-        save_data([], DATA_FILE)
-        save_data([], HUMIDITY_FILE)
+        clear_channel("temperature")
+        clear_channel("humidity")
         logger.info("Histórico completo limpo")
         return {"message": "Todo histórico limpo com sucesso"}
     except Exception as e:
@@ -818,23 +1189,65 @@ class CEPAnalysisResponse(BaseModel):
     message: str
     data: Optional[Dict] = None
     chart_base64: Optional[str] = None
+    chart_url: Optional[str] = None
     report_available: bool = False
 
+@app.get("/config/channels")
+async def get_channels_config():
+    """
+    Retorna a configuração atual dos canais
+    """
+    return channels.to_dict()
+
+@app.post("/config/reload")
+async def reload_channels_config(x_admin_token: Optional[str] = Header(None)):
+    """
+    Recarrega a configuração dos canais do arquivo, sem reiniciar a API
+    (exige X-Admin-Token)
+    """
+    require_admin(x_admin_token)
+    try:
+        channels.reload()
+        init_data_file()
+        return {"message": "Configuração recarregada com sucesso", **channels.to_dict()}
+    except Exception as e:
+        logger.error(f"Erro ao recarregar configuração: {e}")
+        raise HTTPException(status_code=400, detail=f"Configuração inválida, mantida a anterior: {str(e)}")
+
+@contextmanager
+def samples_file(data):
+    """
+    Arquivo temporário com as amostras de um snapshot, para o XR_graph (que
+    lê de um caminho): a análise não relê nem trava o arquivo do canal
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix="cep_xr_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data))
+        yield tmp_path
+    finally:
+        os.unlink(tmp_path)
+
 @app.post("/cep/analyze")
-async def analyze_cep():
+def analyze_cep(include_chart: bool = False):
     """
     Executa análise CEP nos dados de temperatura
+    O gráfico é servido à parte em chart_url (com cache); include_chart=true
+    embute também o PNG em base64 na resposta, como antes
     """
     try:
         # Verificar se os módulos CEP estão disponíveis
-        if not CEP_MODULES_AVAILABLE:
+        if not load_cep_modules():
             raise HTTPException(
                 status_code=501,
                 detail="Módulos CEP não disponíveis. Certifique-se de que CEP-Prova/src contém x_r_graphs.py e process_capability.py"
             )
         
+        config = channels.get("temperature")
+        LSE_TEMP, LIE_TEMP = config.spec_limits
+        
         # Verificar se há dados suficientes
-        data = load_data()
+        data = load_data(config.path)
         
         if len(data) < 5:
             raise HTTPException(
@@ -842,30 +1255,24 @@ async def analyze_cep():
                 detail=f"Dados insuficientes para análise CEP. Necessário mínimo 5 amostras, encontradas {len(data)}"
             )
         
-        # Caminhos
-        temperature_data_path = str(DATA_FILE.absolute())
-        cep_path = Path(__file__).parent.parent / "CEP-Prova" / "src"
-        constants_path = str(cep_path / "json_files" / "constantes_cep.json")
-        
-        # Criar gráfico X-R
-        logger.info("Iniciando análise CEP...")
-        xr = XR_graph(data_url=temperature_data_path, constants_url=constants_path)
+        # XR_graph grava gráfico e relatório com nomes fixos: uma análise por vez entre workers;
+        # lê as amostras do snapshot já carregado, sem a trava da ingestão
+        with file_lock(ANALYSIS_LOCK), samples_file(data) as data_url:
+            # Criar gráfico X-R
+            logger.info("Iniciando análise CEP...")
+            xr = XR_graph(data_url=data_url, constants_url=CEP_CONSTANTS_FILE)
         
-        # Limites de especificação
-        LSE_TEMP = 28.0
-        LIE_TEMP = 18.0
+            xr.set_specification_limits(LSE_TEMP, LIE_TEMP)
+            xr.analyze_control_status()
+            calculate_capability(xr, lse=LSE_TEMP, lie=LIE_TEMP, type_chart="X-R")
         
-        xr.set_specification_limits(LSE_TEMP, LIE_TEMP)
-        xr.analyze_control_status()
-        calculate_capability(xr, lse=LSE_TEMP, lie=LIE_TEMP, type_chart="X-R")
-        
-        # Ler gráfico gerado
-        chart_path = Path(__file__).parent / "grafico_controle_xr.png"
-        chart_base64 = None
+            # Ler gráfico gerado
+            chart_path = Path(__file__).parent / "grafico_controle_xr.png"
+            chart_base64 = None
         
-        if chart_path.exists():
-            with open(chart_path, "rb") as f:
-                chart_base64 = base64.b64encode(f.read()).decode('utf-8')
+            if include_chart and chart_path.exists():
+                with open(chart_path, "rb") as f:
+                    chart_base64 = base64.b64encode(f.read()).decode('utf-8')
         
         # Preparar dados de resposta
         analysis_data = {
@@ -892,6 +1299,14 @@ async def analyze_cep():
                 'rcpi': float(xr.capability.rcpi) if xr.capability.rcpi else None,
             }
         
+        from capability import summaries_to_stats, capability_summary_from_stats
+        
+        # Índices calculados diretamente dos subgrupos (Cp, Cpk, Pp, Ppk, PPM)
+        analysis_data['capability_indices'] = capability_summary_from_stats(
+            summaries_to_stats(complete_summaries(data, config.sample_size)),
+            config.sample_size, LSE_TEMP, LIE_TEMP
+        )
+        
         logger.info("Análise CEP concluída com sucesso")
         
         return {
@@ -899,6 +1314,7 @@ async def analyze_cep():
             "message": "Análise CEP executada com sucesso",
             "data": analysis_data,
             "chart_base64": chart_base64,
+            "chart_url": "/cep/chart/temperature",
             "report_available": True
         }
         
@@ -910,8 +1326,209 @@ async def analyze_cep():
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao executar análise CEP: {str(e)}")
 
+# Reamostragens bootstrap por requisição (custo proporcional ao número de subgrupos)
+MAX_BOOTSTRAP = 10_000
+
+@app.get("/cep/capability")
+async def get_cep_capability(
+    channel: Optional[str] = None,
+    window: Optional[int] = None,
+    step: int = 1,
+    bootstrap: int = 0,
+    confidence: float = 0.95
+):
+    """
+    Calcula Cp, Cpk, Pp, Ppk e PPM esperado diretamente dos subgrupos
+    - channel: temperature ou humidity (padrão: todos)
+    - window/step: índices por janela deslizante de subgrupos
+    - bootstrap: número de reamostragens para intervalos de confiança
+      (até MAX_BOOTSTRAP)
+    """
+    try:
+        if channel is not None and channel not in channels:
+            raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+        if window is not None and window < 2:
+            raise HTTPException(status_code=400, detail="A janela deve ter pelo menos 2 subgrupos")
+        if step < 1 or bootstrap < 0 or not 0 < confidence < 1:
+            raise HTTPException(status_code=400, detail="Parâmetros inválidos")
+        if bootstrap > MAX_BOOTSTRAP:
+            raise HTTPException(status_code=400, detail=f"bootstrap deve ser no máximo {MAX_BOOTSTRAP}")
+        
+        from capability import summaries_to_stats, capability_summary_from_stats, capability_for_channels
+        
+        names = [channel] if channel else channels.names()
+        configs = {name: channels.get(name) for name in names}
+        # Estatísticas gravadas no fechamento de cada amostra (sem reler as leituras)
+        arrays = {
+            name: summaries_to_stats(complete_summaries(load_data(config.path), config.sample_size))
+            for name, config in configs.items()
+        }
+        
+        result = {}
+        for name, stats in arrays.items():
+            if stats.shape[0] < 2:
+                result[name] = None
+                continue
+            config = configs[name]
+            lse, lie = config.spec_limits
+            result[name] = capability_summary_from_stats(
+                stats, config.sample_size, lse, lie, n_boot=bootstrap, confidence=confidence
+            )
+        
+        # Janelas deslizantes de todos os canais em uma única chamada vetorizada
+        if window:
+            rolling = capability_for_channels(
+                {name: (arrays[name], configs[name].sample_size) + configs[name].spec_limits for name in names},
+                window=window,
+                step=step
+            )
+            for name in names:
+                if result[name] is not None:
+                    result[name]["rolling"] = rolling[name]
+        
+        return {
+            "status": "success",
+            "window": window,
+            "step": step,
+            "channels": result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao calcular capacidade: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular capacidade: {str(e)}")
+
+@app.get("/cep/rolling")
+async def get_cep_rolling(
+    channel: str = "temperature",
+    window: int = 25,
+    step: int = 1,
+    last: Optional[int] = None
+):
+    """
+    Série temporal de X-barra, R-barra, limites de controle e capacidade
+    em janela deslizante de subgrupos
+    - window: subgrupos por janela
+    - step: recalcula os limites a cada step subgrupos
+    - last: considera apenas os últimos N subgrupos
+    """
+    try:
+        if channel not in channels:
+            raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+        if window < 2 or step < 1 or (last is not None and last < 1):
+            raise HTTPException(status_code=400, detail="Parâmetros inválidos")
+        
+        config = channels.get(channel)
+        data = [
+            sample for sample in load_data(config.path)
+            if len(sample.get("Dados", [])) == config.sample_size
+        ]
+        if last:
+            data = data[-last:]
+        
+        if len(data) < window:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dados insuficientes. Necessário {window} amostras completas, encontradas {len(data)}"
+            )
+        
+        lse, lie = config.spec_limits
+        series = rolling_series(
+            [sample_summary(sample) for sample in data],
+            window=window,
+            sample_size=config.sample_size,
+            step=step,
+            lse=lse,
+            lie=lie
+        )
+        series["end_sample"] = [data[i - 1]["Amostra"] for i in series["end_sample"]]
+        
+        return {
+            "status": "success",
+            "channel": channel,
+            "sample_size": config.sample_size,
+            "window": window,
+            "step": step,
+            "total_samples": len(data),
+            "total_windows": len(series["end_sample"]),
+            "lse": lse,
+            "lie": lie,
+            "series": series
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro na análise em janela deslizante: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro na análise em janela deslizante: {str(e)}")
+
+@app.post("/cep/charts")
+@app.post("/cep/charts/{chart_type}")
+async def analyze_cep_chart_engine(
+    chart_type: Optional[str] = None,
+    channel: str = "temperature",
+    sample_size: Optional[int] = None,
+    target: Optional[float] = None,
+    sigma: Optional[float] = None,
+    baseline: int = 20,
+    ewma_lambda: float = 0.2,
+    L: float = 3.0,
+    k: float = 0.5,
+    h: float = 5.0
+):
+    """
+    Executa análise com um motor de gráfico em fluxo: X-R, X-S, I-MR, EWMA ou CUSUM
+    Sem chart_type, usa o tipo de gráfico configurado para o canal
+    - sample_size: tamanho do subgrupo (X-R e X-S); padrão: o do canal
+    - target/sigma: alvo e sigma do processo (EWMA e CUSUM); estimados das
+      primeiras `baseline` leituras se omitidos
+    """
+    try:
+        if channel not in channels:
+            raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+        
+        config = channels.get(channel)
+        chart_type = (chart_type or config.chart_type).upper()
+        params = {"target": target, "sigma": sigma, "baseline": baseline}
+        if chart_type == "EWMA":
+            params.update({"lambda_": ewma_lambda, "L": L})
+        elif chart_type == "CUSUM":
+            params.update({"k": k, "h": h})
+        
+        try:
+            chart = create_chart(chart_type, sample_size=sample_size or config.sample_size, **params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        feed_samples(chart, load_data(config.path))
+        
+        analysis = chart.analysis()
+        if analysis is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dados insuficientes para o gráfico {chart_type} ({chart.total_readings} leituras)"
+            )
+        
+        lse, lie = config.spec_limits
+        analysis.update({"lse": lse, "lie": lie})
+        
+        return {
+            "status": "success",
+            "message": f"Análise {chart_type} executada com sucesso",
+            "channel": channel,
+            "data": analysis,
+            "western_rules": analysis["western_rules"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro na análise do gráfico {chart_type}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao executar análise: {str(e)}")
+
 @app.get("/cep/chart")
-async def get_cep_chart():
+async def get_cep_chart(request: Request):
     """
     Retorna o gráfico CEP gerado
     """
@@ -924,10 +1541,17 @@ async def get_cep_chart():
                 detail="Gráfico não encontrado. Execute a análise CEP primeiro."
             )
         
+        version = file_version(chart_path)
+        etag = make_etag(str(chart_path), *version)
+        headers = cache_headers(etag, version[1])
+        if is_not_modified(request, etag, version[1]):
+            return not_modified(headers)
+        
         return FileResponse(
             path=chart_path,
             media_type="image/png",
-            filename="grafico_controle_xr.png"
+            filename="grafico_controle_xr.png",
+            headers=headers
         )
         
     except HTTPException:
@@ -935,6 +1559,66 @@ async def get_cep_chart():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter gráfico: {str(e)}")
 
+@app.get("/cep/chart/{channel}")
+async def get_cep_channel_chart(
+    channel: str,
+    request: Request,
+    format: str = "png",
+    chart_type: Optional[str] = None
+):
+    """
+    Gráfico de controle do canal, renderizado sob demanda (PNG ou SVG)
+    A ETag identifica os dados e parâmetros do gráfico: com If-None-Match
+    igual, responde 304 sem ler os dados nem renderizar
+    """
+    try:
+        if channel not in channels:
+            raise HTTPException(status_code=404, detail=f"Canal desconhecido: {channel}")
+        if format not in CHART_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Formato não suportado: {format} (use {', '.join(CHART_FORMATS)})"
+            )
+        
+        config = channels.get(channel)
+        chart_type = (chart_type or config.chart_type).upper()
+        fingerprint = chart_fingerprint(
+            channel, channel_version(channel), config.sample_size,
+            config.spec_limits, chart_type, format
+        )
+        etag = f'"{fingerprint}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        if is_not_modified(request, etag):
+            return not_modified(headers)
+        
+        def build_analysis():
+            try:
+                chart = create_chart(chart_type, sample_size=config.sample_size)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            feed_samples(chart, load_data(config.path))
+            analysis = chart.analysis()
+            if analysis is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Dados insuficientes para o gráfico {chart_type}"
+                )
+            return analysis
+        
+        title = f"{config.name.capitalize()} ({config.unit})" if config.unit else config.name.capitalize()
+        # Renderização fora do loop de eventos (matplotlib é síncrono)
+        image = await asyncio.get_running_loop().run_in_executor(
+            None, render_chart, fingerprint, build_analysis, title, format
+        )
+        return Response(content=image, media_type=CHART_FORMATS[format], headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao renderizar gráfico de {channel}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao renderizar gráfico: {str(e)}")
+
 @app.get("/cep/report")
 async def get_cep_report():
     """
@@ -960,20 +1644,58 @@ async def get_cep_report():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter relatório: {str(e)}")
 
+@app.get("/cep/report/stream")
+async def stream_cep_report(channel: Optional[str] = None, samples: bool = True):
+    """
+    Relatório HTML gerado sob demanda e enviado em partes (streaming)
+    - channel: canais separados por vírgula; padrão: todos os configurados
+    - samples: inclui a tabela de amostras
+    Canais sem gravação desde o último relatório vêm do cache, sem refazer a análise
+    """
+    try:
+        names = [name.strip() for name in channel.split(",")] if channel else channels.names()
+        unknown = [name for name in names if name not in channels]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Canal desconhecido: {', '.join(unknown)}")
+        
+        from report_engine import stream_report
+        
+        sources = []
+        for name in names:
+            config = channels.get(name)
+            sources.append((config, lambda path=config.path: load_snapshot(path)))
+        
+        return StreamingResponse(
+            stream_report(sources, include_samples=samples),
+            media_type="text/html; charset=utf-8"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatório: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório: {str(e)}")
+
 @app.get("/cep/status")
-async def get_cep_status():
+async def get_cep_status(request: Request, response: Response):
     """
     Verifica se há análise CEP disponível (temperatura e umidade)
     """
     try:
-        temp_data = load_data(DATA_FILE)
-        hum_data = load_data(HUMIDITY_FILE)
-        
         temp_chart_path = Path(__file__).parent / "grafico_controle_xr_temperature.png"
         hum_chart_path = Path(__file__).parent / "grafico_controle_xr_humidity.png"
         temp_report_path = Path(__file__).parent / "relatorio_cep_temperature.html"
         hum_report_path = Path(__file__).parent / "relatorio_cep_humidity.html"
         
+        artifacts = [file_version(path) for path in (temp_chart_path, hum_chart_path, temp_report_path, hum_report_path)]
+        headers, fresh = channel_cache(request, ["temperature", "humidity"], *artifacts)
+        if fresh:
+            return not_modified(headers)
+        response.headers.update(headers)
+        
+        temp_data = load_data(channel_path("temperature"))
+        hum_data = load_data(channel_path("humidity"))
+        
         return {
             "temperature": {
                 "data_available": len(temp_data) >= 5,
@@ -997,15 +1719,82 @@ async def get_cep_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao verificar status CEP: {str(e)}")
 
+@app.get("/cep/multivariate")
+async def get_cep_multivariate(
+    channels_param: Optional[str] = Query(None, alias="channels"),
+    window: int = 50,
+    last: int = 500,
+    baseline: int = 100,
+    alpha: float = 0.0027
+):
+    """
+    Monitoramento conjunto dos canais a partir das leituras pareadas
+    (POST /combined e registros binários com vários canais)
+    - channels: canais do grupo separados por vírgula (padrão: todos os grupos gravados)
+    - window: observações da correlação deslizante
+    - last: últimas observações retornadas nas séries
+    - baseline/alpha: fase I do T² de Hotelling e probabilidade de alarme falso
+    """
+    try:
+        from multivariate import group_key
+        
+        if channels_param:
+            names = [name.strip() for name in channels_param.split(",") if name.strip()]
+            unknown = [name for name in names if name not in channels]
+            if unknown:
+                raise HTTPException(status_code=404, detail=f"Canal desconhecido: {', '.join(unknown)}")
+            if len(set(names)) < 2:
+                raise HTTPException(status_code=400, detail="Informe pelo menos 2 canais")
+            groups = [group_key(names)]
+        else:
+            groups = paired_store().groups()
+        if window < 2 or last < 1 or not 0 < alpha < 1:
+            raise HTTPException(status_code=400, detail="Parâmetros inválidos")
+        
+        if baseline <= len(max(groups, key=len, default=())) + 1:
+            raise HTTPException(status_code=400, detail="A base deve ter mais observações que canais + 1")
+        
+        loop = asyncio.get_running_loop()
+        result = {}
+        for key in groups:
+            # Lê só as observações novas, fora do loop de eventos
+            result["+".join(key)] = await loop.run_in_executor(
+                None, multivariate_analysis, key, baseline, alpha, window, last
+            )
+        
+        return {
+            "status": "success",
+            "groups": result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro na análise multivariada: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro na análise multivariada: {str(e)}")
+
 @app.post("/cep/analyze/combined")
-async def analyze_cep_combined():
+def analyze_cep_combined(include_chart: bool = False):
     """
     Executa análise CEP completa de temperatura E umidade
+    Os gráficos são servidos à parte em chart_url (com cache); include_chart=true
+    embute também os PNGs em base64 na resposta, como antes
     """
+    # Com o perfilamento aberto, o tempo de cada etapa fica em /admin/profiling/traces
+    with profiler.trace_request("POST /cep/analyze/combined"):
+        return combined_analysis(include_chart)
+
+def combined_analysis(include_chart):
     try:
+        temp_config = channels.get("temperature")
+        hum_config = channels.get("humidity")
+        LSE_TEMP, LIE_TEMP = temp_config.spec_limits
+        LSE_HUM, LIE_HUM = hum_config.spec_limits
+        
         # Verificar dados
-        temp_data = load_data(DATA_FILE)
-        hum_data = load_data(HUMIDITY_FILE)
+        with stage("load"):
+            temp_data = load_data(temp_config.path)
+            hum_data = load_data(hum_config.path)
         
         if len(temp_data) < 5:
             raise HTTPException(
@@ -1020,97 +1809,106 @@ async def analyze_cep_combined():
             )
         
         # Verificar se os módulos CEP estão disponíveis
-        if not CEP_MODULES_AVAILABLE:
+        if not load_cep_modules():
             raise HTTPException(
                 status_code=501,
                 detail="Módulos CEP não disponíveis. Certifique-se de que CEP-Prova/src contém x_r_graphs.py e process_capability.py"
             )
         
-        # Path CEP-Prova
-        cep_path = Path(__file__).parent.parent / "CEP-Prova" / "src"
-        constants_path = str(cep_path / "json_files" / "constantes_cep.json")
-        
-        # ===== ANÁLISE TEMPERATURA =====
-        logger.info("Analisando temperatura...")
-        temp_xr = XR_graph(data_url=str(DATA_FILE.absolute()), constants_url=constants_path)
-        
-        LSE_TEMP = 28.0
-        LIE_TEMP = 18.0
-        temp_xr.set_specification_limits(LSE_TEMP, LIE_TEMP)
-        temp_xr.analyze_control_status()
-        calculate_capability(temp_xr, lse=LSE_TEMP, lie=LIE_TEMP, type_chart="X-R")
-        
-        # Renomear arquivos de temperatura
-        temp_chart_old = Path(__file__).parent / "grafico_controle_xr.png"
-        temp_chart_new = Path(__file__).parent / "grafico_controle_xr_temperature.png"
-        if temp_chart_old.exists():
-            import shutil
-            shutil.move(str(temp_chart_old), str(temp_chart_new))
-        
-        temp_report_old = Path(__file__).parent / "relatorio_cep_xr.html"
-        temp_report_new = Path(__file__).parent / "relatorio_cep_temperature.html"
-        if temp_report_old.exists():
-            import shutil
-            shutil.move(str(temp_report_old), str(temp_report_new))
-        
-        # Ler gráfico temperatura
-        temp_chart_base64 = None
-        if temp_chart_new.exists():
-            with open(temp_chart_new, "rb") as f:
-                temp_chart_base64 = base64.b64encode(f.read()).decode('utf-8')
-        
-        # Dados temperatura
-        temp_analysis = {
-            "x_double_mean": float(temp_xr.x_double_mean),
-            "r_mean": float(temp_xr.r_mean),
-            "sigma": float(temp_xr.sigma),
-            "lsc_x_bar": float(temp_xr.lsc_x_bar_graph),
-            "lic_x_bar": float(temp_xr.lic_x_bar_graph),
-            "lsc_r": float(temp_xr.lsc_r_bar_graph),
-            "lic_r": float(temp_xr.lic_r_bar_graph),
-            "lse": LSE_TEMP,
-            "lie": LIE_TEMP,
-            "total_samples": len(temp_data),
-            "out_of_control_x": int(len(temp_xr.df[(temp_xr.df['X_bar'] > temp_xr.lsc_x_bar_graph) | (temp_xr.df['X_bar'] < temp_xr.lic_x_bar_graph)])),
-            "out_of_control_r": int(len(temp_xr.df[temp_xr.df['R'] > temp_xr.lsc_r_bar_graph]))
-        }
-        
-        if hasattr(temp_xr, 'capability'):
-            temp_analysis['capability'] = {
-                'rcp': float(temp_xr.capability.rcp) if temp_xr.capability.rcp else None,
-                'rcpk': float(temp_xr.capability.rcpk) if temp_xr.capability.rcpk else None,
-                'rcps': float(temp_xr.capability.rcps) if temp_xr.capability.rcps else None,
-                'rcpi': float(temp_xr.capability.rcpi) if temp_xr.capability.rcpi else None,
+        # XR_graph grava gráfico e relatório com nomes fixos: uma análise por vez entre workers;
+        # lê as amostras dos snapshots já carregados, sem a trava da ingestão
+        with file_lock(ANALYSIS_LOCK), samples_file(temp_data) as temp_url, samples_file(hum_data) as hum_url:
+            # ===== ANÁLISE TEMPERATURA =====
+            logger.info("Analisando temperatura...")
+            with stage("temperature.xr_graph"):
+                temp_xr = XR_graph(data_url=temp_url, constants_url=CEP_CONSTANTS_FILE)
+                temp_xr.set_specification_limits(LSE_TEMP, LIE_TEMP)
+            with stage("temperature.control_status"):
+                temp_xr.analyze_control_status()
+            with stage("temperature.capability"):
+                calculate_capability(temp_xr, lse=LSE_TEMP, lie=LIE_TEMP, type_chart="X-R")
+        
+            # Renomear arquivos de temperatura
+            with stage("temperature.artifacts"):
+                temp_chart_old = Path(__file__).parent / "grafico_controle_xr.png"
+                temp_chart_new = Path(__file__).parent / "grafico_controle_xr_temperature.png"
+                if temp_chart_old.exists():
+                    import shutil
+                    shutil.move(str(temp_chart_old), str(temp_chart_new))
+        
+                temp_report_old = Path(__file__).parent / "relatorio_cep_xr.html"
+                temp_report_new = Path(__file__).parent / "relatorio_cep_temperature.html"
+                if temp_report_old.exists():
+                    import shutil
+                    shutil.move(str(temp_report_old), str(temp_report_new))
+        
+            # Ler gráfico temperatura
+            temp_chart_base64 = None
+            if include_chart and temp_chart_new.exists():
+                with stage("temperature.base64"), open(temp_chart_new, "rb") as f:
+                    temp_chart_base64 = base64.b64encode(f.read()).decode('utf-8')
+        
+            # Dados temperatura
+            temp_analysis = {
+                "x_double_mean": float(temp_xr.x_double_mean),
+                "r_mean": float(temp_xr.r_mean),
+                "sigma": float(temp_xr.sigma),
+                "lsc_x_bar": float(temp_xr.lsc_x_bar_graph),
+                "lic_x_bar": float(temp_xr.lic_x_bar_graph),
+                "lsc_r": float(temp_xr.lsc_r_bar_graph),
+                "lic_r": float(temp_xr.lic_r_bar_graph),
+                "lse": LSE_TEMP,
+                "lie": LIE_TEMP,
+                "total_samples": len(temp_data),
+                "out_of_control_x": int(len(temp_xr.df[(temp_xr.df['X_bar'] > temp_xr.lsc_x_bar_graph) | (temp_xr.df['X_bar'] < temp_xr.lic_x_bar_graph)])),
+                "out_of_control_r": int(len(temp_xr.df[temp_xr.df['R'] > temp_xr.lsc_r_bar_graph]))
             }
         
-        # ===== ANÁLISE UMIDADE =====
-        logger.info("Analisando umidade...")
-        hum_xr = XR_graph(data_url=str(HUMIDITY_FILE.absolute()), constants_url=constants_path)
-        
-        LSE_HUM = 70.0
-        LIE_HUM = 40.0
-        hum_xr.set_specification_limits(LSE_HUM, LIE_HUM)
-        hum_xr.analyze_control_status()
-        calculate_capability(hum_xr, lse=LSE_HUM, lie=LIE_HUM, type_chart="X-R")
-        
-        # Renomear arquivos de umidade
-        hum_chart_old = Path(__file__).parent / "grafico_controle_xr.png"
-        hum_chart_new = Path(__file__).parent / "grafico_controle_xr_humidity.png"
-        if hum_chart_old.exists():
-            import shutil
-            shutil.move(str(hum_chart_old), str(hum_chart_new))
-        
-        hum_report_old = Path(__file__).parent / "relatorio_cep_xr.html"
-        hum_report_new = Path(__file__).parent / "relatorio_cep_humidity.html"
-        if hum_report_old.exists():
-            import shutil
-            shutil.move(str(hum_report_old), str(hum_report_new))
-        
-        # Ler gráfico umidade
-        hum_chart_base64 = None
-        if hum_chart_new.exists():
-            with open(hum_chart_new, "rb") as f:
-                hum_chart_base64 = base64.b64encode(f.read()).decode('utf-8')
+            if hasattr(temp_xr, 'capability'):
+                temp_analysis['capability'] = {
+                    'rcp': float(temp_xr.capability.rcp) if temp_xr.capability.rcp else None,
+                    'rcpk': float(temp_xr.capability.rcpk) if temp_xr.capability.rcpk else None,
+                    'rcps': float(temp_xr.capability.rcps) if temp_xr.capability.rcps else None,
+                    'rcpi': float(temp_xr.capability.rcpi) if temp_xr.capability.rcpi else None,
+                }
+        
+            from capability import summaries_to_stats, capability_summary_from_stats
+        
+            with stage("temperature.capability_indices"):
+                temp_analysis['capability_indices'] = capability_summary_from_stats(
+                    summaries_to_stats(complete_summaries(temp_data, temp_config.sample_size)),
+                    temp_config.sample_size, LSE_TEMP, LIE_TEMP
+                )
+        
+            # ===== ANÁLISE UMIDADE =====
+            logger.info("Analisando umidade...")
+            with stage("humidity.xr_graph"):
+                hum_xr = XR_graph(data_url=hum_url, constants_url=CEP_CONSTANTS_FILE)
+                hum_xr.set_specification_limits(LSE_HUM, LIE_HUM)
+            with stage("humidity.control_status"):
+                hum_xr.analyze_control_status()
+            with stage("humidity.capability"):
+                calculate_capability(hum_xr, lse=LSE_HUM, lie=LIE_HUM, type_chart="X-R")
+        
+            # Renomear arquivos de umidade
+            with stage("humidity.artifacts"):
+                hum_chart_old = Path(__file__).parent / "grafico_controle_xr.png"
+                hum_chart_new = Path(__file__).parent / "grafico_controle_xr_humidity.png"
+                if hum_chart_old.exists():
+                    import shutil
+                    shutil.move(str(hum_chart_old), str(hum_chart_new))
+        
+                hum_report_old = Path(__file__).parent / "relatorio_cep_xr.html"
+                hum_report_new = Path(__file__).parent / "relatorio_cep_humidity.html"
+                if hum_report_old.exists():
+                    import shutil
+                    shutil.move(str(hum_report_old), str(hum_report_new))
+        
+            # Ler gráfico umidade
+            hum_chart_base64 = None
+            if include_chart and hum_chart_new.exists():
+                with stage("humidity.base64"), open(hum_chart_new, "rb") as f:
+                    hum_chart_base64 = base64.b64encode(f.read()).decode('utf-8')
         
         # Dados umidade
         hum_analysis = {
@@ -1136,12 +1934,19 @@ async def analyze_cep_combined():
                 'rcpi': float(hum_xr.capability.rcpi) if hum_xr.capability.rcpi else None,
             }
         
+        with stage("humidity.capability_indices"):
+            hum_analysis['capability_indices'] = capability_summary_from_stats(
+                summaries_to_stats(complete_summaries(hum_data, hum_config.sample_size)),
+                hum_config.sample_size, LSE_HUM, LIE_HUM
+            )
+        
         logger.info("Análise CEP combinada concluída com sucesso")
         
         # ===== ANÁLISE DAS REGRAS DO WESTERN ELECTRIC =====
         
-        temp_western_rules = analyze_western_electric_rules(temp_xr, chart_type="X")
-        hum_western_rules = analyze_western_electric_rules(hum_xr, chart_type="X")
+        with stage("rules"):
+            temp_western_rules = analyze_western_electric_rules(temp_xr, chart_type="X")
+            hum_western_rules = analyze_western_electric_rules(hum_xr, chart_type="X")
         
         # ===== CÁLCULOS DE PROBABILIDADE E ARRANJOS =====
         
@@ -1163,23 +1968,32 @@ async def analyze_cep_combined():
             "humidity_arrangements_5_3": calculate_arrangements(5, 3, False)
         }
         
+        # ===== ANÁLISE MULTIVARIADA (LEITURAS PAREADAS) =====
+        
+        # Deriva conjunta que nenhum dos gráficos X-barra/R isolados acusa
+        with stage("multivariate"):
+            multivariate = multivariate_analysis(("humidity", "temperature"), last=100)
+        
         return {
             "status": "success",
             "message": "Análise CEP combinada executada com sucesso",
             "temperature": {
                 "data": temp_analysis,
                 "chart_base64": temp_chart_base64,
+                "chart_url": "/cep/chart/temperature",
                 "report_available": temp_report_new.exists(),
                 "western_rules": temp_western_rules
             },
             "humidity": {
                 "data": hum_analysis,
                 "chart_base64": hum_chart_base64,
+                "chart_url": "/cep/chart/humidity",
                 "report_available": hum_report_new.exists(),
                 "western_rules": hum_western_rules
             },
             "probability_analysis": probability_analysis,
-            "arrangements_analysis": arrangements_analysis
+            "arrangements_analysis": arrangements_analysis,
+            "multivariate": multivariate
         }
         
     except HTTPException:
@@ -1192,4 +2006,8 @@ async def analyze_cep_combined():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if API_WORKERS > 1:
+        # Vários processos sobre os mesmos arquivos (travas em storage.py)
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
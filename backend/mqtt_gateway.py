@@ -0,0 +1,418 @@
+"""
+Gateway de ingestão pub/sub (estilo MQTT)
+
+Os dispositivos publicam em tópicos por dispositivo
+(cep/devices/<device_id>/readings) e um consumidor agrupa as mensagens em
+lotes (cada leitura com seu timestamp) antes de entregá-los ao montador de
+subgrupos. Rajadas de dispositivos (ex.: todos reconectando quando o Wi-Fi
+da planta volta) ficam na fila limitada do broker em vez de virar milhares
+de requisições HTTP.
+
+Brokers:
+- InProcessBroker: substituto em processo (asyncio), para testes e para o
+  simulador, com fila limitada por assinatura (publish espera quando cheia)
+- MqttClientBroker: broker MQTT real via paho-mqtt (dependência opcional)
+
+Payloads aceitos: JSON ({"temperature": 23.4, "humidity": 55.0, ...} ou uma
+lista desses objetos) e quadros do protocolo binário (binary_protocol).
+
+Processo separado (encaminha os lotes para a API via /ingest/binary):
+    python mqtt_gateway.py --broker localhost:1883 --api http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+try:
+    import paho.mqtt.client as paho_mqtt
+except ImportError:
+    paho_mqtt = None
+
+logger = logging.getLogger(__name__)
+
+TOPIC_PATTERN = "cep/devices/+/readings"
+
+
+def device_topic(device_id):
+    return f"cep/devices/{device_id}/readings"
+
+
+def topic_matches(pattern, topic):
+    """Casamento de tópicos com os curingas do MQTT (+ e #)"""
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class InProcessBroker:
+    """Broker em processo: cada assinatura tem sua fila asyncio limitada"""
+
+    def __init__(self, maxsize=10_000):
+        self.maxsize = maxsize
+        self._subscriptions = []
+        self.published = 0
+
+    def subscribe(self, pattern):
+        queue = asyncio.Queue(maxsize=self.maxsize)
+        self._subscriptions.append((pattern, queue))
+        return queue
+
+    async def publish(self, topic, payload):
+        self.published += 1
+        for pattern, queue in self._subscriptions:
+            if topic_matches(pattern, topic):
+                # Fila cheia: o publicador espera (contrapressão), nada é descartado
+                await queue.put((topic, payload))
+
+    async def drain(self):
+        """Espera as filas das assinaturas esvaziarem"""
+        while any(not queue.empty() for _, queue in self._subscriptions):
+            await asyncio.sleep(0.01)
+
+    async def close(self):
+        pass
+
+
+class MqttClientBroker:
+    """
+    Assinatura em um broker MQTT real (paho-mqtt)
+    As mensagens chegam na thread do paho e são repassadas à fila asyncio
+    """
+
+    def __init__(self, host="localhost", port=1883, client_id="cep-gateway", qos=1, maxsize=10_000):
+        if paho_mqtt is None:
+            raise RuntimeError("paho-mqtt não instalado (pip install paho-mqtt)")
+        self.host, self.port, self.qos, self.maxsize = host, port, qos, maxsize
+        if hasattr(paho_mqtt, "CallbackAPIVersion"):
+            self._client = paho_mqtt.Client(paho_mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            self._client = paho_mqtt.Client(client_id=client_id)
+        self._patterns = []
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._loop = None
+        self._queue = None
+        self.dropped = 0
+
+    def _on_connect(self, client, *args):
+        # Reassina após cada (re)conexão
+        for pattern in self._patterns:
+            client.subscribe(pattern, qos=self.qos)
+        logger.info(f"Gateway conectado ao broker MQTT {self.host}:{self.port}")
+
+    def _on_message(self, client, userdata, message):
+        self._loop.call_soon_threadsafe(self._enqueue, message.topic, message.payload)
+
+    def _enqueue(self, topic, payload):
+        try:
+            self._queue.put_nowait((topic, payload))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def subscribe(self, pattern):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._patterns.append(pattern)
+        self._client.connect_async(self.host, self.port, keepalive=30)
+        self._client.loop_start()
+        return self._queue
+
+    async def close(self):
+        self._client.disconnect()
+        self._client.loop_stop()
+
+
+def parse_message(payload, binary_channels, now=None):
+    """
+    Extrai os registros de uma mensagem: [(timestamp, {canal: valor})], um
+    por instante medido, com o timestamp completo (Unix, ms)
+
+    Quadros binários têm os 32 bits baixos completados (unwrap_timestamps);
+    no JSON, timestamp ausente ou não Unix (ex.: millis() do ESP32) vira o
+    horário de chegada
+
+    Args:
+        binary_channels: função binary_id -> nome do canal (ou None)
+        now: horário de chegada (ms); padrão: agora
+    """
+    from binary_protocol import MAGIC
+    from reorder import event_times, now_ms
+
+    arrival = now if now is not None else now_ms()
+    records = []
+    if bytes(payload[:len(MAGIC)]) == MAGIC:
+        from binary_protocol import decode_frames, unwrap_timestamps
+        for frame in decode_frames(payload):
+            names = []
+            for binary_id in frame.channel_ids:
+                name = binary_channels(binary_id)
+                if name is None:
+                    raise ValueError(f"Canal binário desconhecido: {binary_id}")
+                names.append(name)
+            timestamps = unwrap_timestamps(frame.timestamps, arrival).tolist()
+            for timestamp, values in zip(timestamps, frame.values.tolist()):
+                # NaN: leitura ausente no registro
+                reading = {name: value for name, value in zip(names, values) if value == value}
+                if reading:
+                    records.append((timestamp, reading))
+        return records
+
+    message = json.loads(payload)
+    for reading in message if isinstance(message, list) else [message]:
+        values = {
+            name: float(value) for name, value in reading.items()
+            if name != "timestamp" and isinstance(value, (int, float))
+        }
+        if values:
+            timestamp = reading.get("timestamp")
+            timestamp = int(timestamp) if isinstance(timestamp, (int, float)) else None
+            records.append((event_times([timestamp], 1, arrival)[0], values))
+    return records
+
+
+def timed_readings(records):
+    """Registros -> {canal: (timestamps, valores)}, na ordem dos registros"""
+    readings = {}
+    for timestamp, reading in records:
+        for name, value in reading.items():
+            timestamps, values = readings.setdefault(name, ([], []))
+            timestamps.append(timestamp)
+            values.append(value)
+    return readings
+
+
+def paired_rows(records):
+    """Leituras de mais de um canal no mesmo registro: [{canal: valor}] (análise multivariada)"""
+    return [reading for _, reading in records if len(reading) >= 2]
+
+
+class IngestionConsumer:
+    """
+    Consome mensagens do broker e entrega lotes de registros ao sink
+
+    O lote ([(timestamp, {canal: valor})], na ordem de chegada) é entregue
+    quando atinge batch_size leituras ou após flush_interval segundos desde
+    a primeira leitura pendente. O sink é síncrono (ex.: ingest_batch) e
+    roda fora do loop de eventos.
+
+    Lote recusado pelo sink (exceção) volta para o início dos pendentes e é
+    entregue de novo após retry_interval segundos, dobrando a cada falha
+    seguida até max_retry_interval. Com o sink fora do ar, os pendentes
+    ficam limitados a max_pending leituras (as mais antigas são descartadas
+    e contadas em stats["dropped"]).
+    """
+
+    def __init__(self, broker, sink, channel_names, binary_channels,
+                 batch_size=500, flush_interval=0.5, pattern=TOPIC_PATTERN,
+                 max_pending=100_000, retry_interval=0.5, max_retry_interval=30.0):
+        self.broker = broker
+        self.sink = sink
+        self.channel_names = channel_names
+        self.binary_channels = binary_channels
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pattern = pattern
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.stats = {"messages": 0, "readings": 0, "flushes": 0, "invalid": 0, "sink_errors": 0, "dropped": 0}
+        self._pending = []
+        self._pending_count = 0
+        self._task = None
+        self._inflight = None
+        self._retry_at = 0.0
+        self._backoff = retry_interval
+
+    def _trim(self):
+        """Descarta as leituras pendentes mais antigas além de max_pending"""
+        excess = 0
+        while self._pending_count > self.max_pending:
+            _, reading = self._pending[excess]
+            self._pending_count -= len(reading)
+            self.stats["dropped"] += len(reading)
+            excess += 1
+        if excess:
+            del self._pending[:excess]
+            logger.warning(f"Pendentes do gateway acima de {self.max_pending} leituras: "
+                           f"{excess} registros mais antigos descartados")
+
+    def _sink_failed(self, batch, error):
+        """Devolve o lote ao início dos pendentes e agenda a nova tentativa"""
+        self.stats["sink_errors"] += 1
+        self._pending[:0] = batch
+        self._pending_count += sum(len(reading) for _, reading in batch)
+        self._trim()
+        self._retry_at = time.monotonic() + self._backoff
+        logger.error(f"Erro ao entregar lote do gateway ({len(batch)} registros, "
+                     f"nova tentativa em {self._backoff:.1f}s): {error}")
+        self._backoff = min(self._backoff * 2, self.max_retry_interval)
+
+    async def _flush(self, force=False):
+        if not self._pending or (not force and time.monotonic() < self._retry_at):
+            return
+        batch, self._pending, self._pending_count = self._pending, [], 0
+        future = asyncio.get_running_loop().run_in_executor(None, self.sink, batch)
+        self._inflight = (future, batch)
+        try:
+            # shield: um cancelamento (stop) não abandona o lote já retirado
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._inflight = None
+            self._sink_failed(batch, e)
+            return
+        self._inflight = None
+        self.stats["flushes"] += 1
+        self._retry_at, self._backoff = 0.0, self.retry_interval
+
+    def _add(self, payload):
+        records = parse_message(payload, self.binary_channels)
+        known = self.channel_names()
+        for timestamp, reading in records:
+            reading = {name: value for name, value in reading.items() if name in known}
+            if reading:
+                self._pending.append((timestamp, reading))
+                self._pending_count += len(reading)
+                self.stats["readings"] += len(reading)
+        self._trim()
+
+    async def run(self):
+        queue = self.broker.subscribe(self.pattern)
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                _, payload = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._flush()
+                deadline = self._retry_at if self._pending else None
+                continue
+
+            self.stats["messages"] += 1
+            try:
+                self._add(payload)
+            except (ValueError, TypeError, AttributeError) as e:
+                self.stats["invalid"] += 1
+                logger.warning(f"Mensagem inválida descartada: {e}")
+            if self._pending_count and deadline is None:
+                deadline = max(time.monotonic() + self.flush_interval, self._retry_at)
+            # Durante a espera após uma falha do sink, os lotes só acumulam
+            if self._pending_count >= self.batch_size and time.monotonic() >= self._retry_at:
+                await self._flush()
+                deadline = self._retry_at if self._pending else None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        """Interrompe o consumo e entrega o que estiver pendente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._inflight is not None:
+            future, batch = self._inflight
+            self._inflight = None
+            try:
+                await future
+                self.stats["flushes"] += 1
+            except Exception as e:
+                self._sink_failed(batch, e)
+        await self._flush(force=True)
+        await self.broker.close()
+
+
+# ===== PROCESSO SEPARADO =====
+
+def http_sink(api_url, registry):
+    """
+    Sink que encaminha o lote para a API em quadros binários
+
+    Registros seguidos com os mesmos canais vão no mesmo quadro (mantém a
+    ordem por canal e as leituras pareadas), com os 32 bits baixos do
+    timestamp de cada registro
+    """
+    import requests
+    from binary_protocol import encode_frame
+
+    def frames(batch):
+        run_names, run = None, []
+        for timestamp, reading in batch:
+            names = tuple(reading)
+            # Quadros de até 65535 registros (n_records é u16)
+            if run and (names != run_names or len(run) == 65535):
+                yield run_names, run
+                run = []
+            run_names = names
+            run.append((timestamp, reading))
+        if run:
+            yield run_names, run
+
+    def send(batch):
+        body = []
+        for names, run in frames(batch):
+            binary_ids = [registry.get(name).binary_id for name in names]
+            columns = [i for i, binary_id in enumerate(binary_ids) if binary_id is not None]
+            if len(columns) < len(names):
+                missing = [names[i] for i in range(len(names)) if i not in columns]
+                logger.warning(f"Canais {missing} sem binary_id, leituras descartadas")
+            if not columns:
+                continue
+            body.append(encode_frame(
+                0, [binary_ids[i] for i in columns],
+                [timestamp % 2**32 for timestamp, _ in run],
+                [[reading[names[i]] for i in columns] for _, reading in run],
+            ))
+        if body:
+            response = requests.post(f"{api_url}/ingest/binary", data=b"".join(body),
+                                     headers={"Content-Type": "application/octet-stream"}, timeout=30)
+            response.raise_for_status()
+    return send
+
+
+async def main_cli():
+    from pathlib import Path
+    import os
+    from channel_config import ChannelRegistry
+
+    parser = argparse.ArgumentParser(description="Gateway MQTT de ingestão CEP")
+    parser.add_argument("--broker", default="localhost:1883", help="host:porta do broker MQTT")
+    parser.add_argument("--api", default="http://localhost:8000", help="URL base da API")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    registry = ChannelRegistry(Path(os.getenv("CHANNELS_CONFIG") or Path(__file__).parent / "channels.json"))
+    host, _, port = args.broker.partition(":")
+    consumer = IngestionConsumer(
+        MqttClientBroker(host, int(port or 1883)),
+        http_sink(args.api, registry),
+        channel_names=registry.names,
+        binary_channels=lambda binary_id: getattr(registry.by_binary_id(binary_id), "name", None),
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval,
+    )
+    print(f"📡 Gateway MQTT: {args.broker} ({TOPIC_PATTERN}) -> {args.api}")
+    try:
+        await consumer.run()
+    finally:
+        await consumer.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main_cli())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,299 @@
+"""
+Monitoramento multivariado de leituras pareadas (Hotelling T² e
+correlação em janela deslizante)
+
+Os gráficos X-barra/R analisam cada canal isoladamente; uma mudança na
+relação entre os canais (ex.: umidade subindo enquanto a temperatura
+cai dentro dos limites de cada uma) não aparece em nenhum deles. Aqui as
+leituras chegadas juntas (POST /combined, registros do protocolo binário)
+são guardadas como vetores de p canais e monitoradas em conjunto:
+
+- T² de Hotelling de observações individuais: média e covariância
+  estimadas nas primeiras `baseline` observações (fase I) e aplicadas a
+  cada observação seguinte (fase II), com limite pela distribuição F
+- correlação entre cada par de canais em janela deslizante, a partir de
+  somas acumuladas (O(p²) por observação)
+
+Armazenamento: um arquivo JSON lines por grupo de canais, só com
+acréscimos (cada linha é o vetor de leituras na ordem alfabética dos
+canais). O monitor em memória lê apenas os bytes novos desde a última
+consulta, então T² e as somas acumuladas são estendidos incrementalmente.
+"""
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from storage import file_lock, file_version
+
+
+def group_key(names):
+    """Canais do grupo em ordem canônica (alfabética)"""
+    return tuple(sorted(names))
+
+
+class PairedStore:
+    """Leituras pareadas por grupo de canais (paired_<canal>__<canal>.jsonl)"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, names):
+        return self.directory / f"paired_{'__'.join(group_key(names))}.jsonl"
+
+    def append(self, rows):
+        """
+        Acrescenta leituras pareadas
+
+        Args:
+            rows: lista de dicts {canal: valor}; linhas com canais diferentes
+                vão para grupos diferentes, linhas com um só canal são ignoradas
+        """
+        lines = {}
+        for row in rows:
+            if len(row) < 2:
+                continue
+            key = group_key(row)
+            lines.setdefault(key, []).append(json.dumps([float(row[name]) for name in key]))
+        for key, group_lines in lines.items():
+            path = self.path(key)
+            with file_lock(path):
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(group_lines) + "\n")
+
+    def groups(self):
+        """Grupos com leituras pareadas gravadas"""
+        return [
+            tuple(path.stem[len("paired_"):].split("__"))
+            for path in sorted(self.directory.glob("paired_*.jsonl"))
+        ]
+
+    def clear(self, name):
+        """Remove os grupos que incluem o canal"""
+        for key in self.groups():
+            if name in key:
+                path = self.path(key)
+                with file_lock(path):
+                    path.unlink(missing_ok=True)
+
+    def read_from(self, names, offset):
+        """
+        Lê as linhas completas gravadas a partir de `offset`
+        Returns: (array k x p, novo offset)
+        """
+        path = self.path(names)
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return np.empty((0, len(names))), offset
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return np.empty((0, len(names))), offset
+        rows = [json.loads(line) for line in chunk[:end].splitlines() if line]
+        return np.asarray(rows, dtype=float).reshape(-1, len(names)), offset + end
+
+
+class GrowingArray:
+    """Array que cresce por acréscimos (capacidade dobrada, sem cópias a cada linha)"""
+
+    def __init__(self, shape_tail):
+        self._data = np.empty((64,) + tuple(shape_tail))
+        self.size = 0
+
+    def extend(self, rows):
+        needed = self.size + len(rows)
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data))
+            grown = np.empty((capacity,) + self._data.shape[1:])
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = rows
+        self.size = needed
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+
+def t2_limits(p, m, alpha):
+    """
+    Limites do T² de observações individuais com m observações de base
+    Returns: (limite fase I, limite fase II)
+    """
+    from scipy import stats
+
+    phase_1 = (m - 1) ** 2 / m * stats.beta.ppf(1 - alpha, p / 2, (m - p - 1) / 2)
+    phase_2 = p * (m + 1) * (m - 1) / (m * (m - p)) * stats.f.ppf(1 - alpha, p, m - p)
+    return float(phase_1), float(phase_2)
+
+
+class MultivariateMonitor:
+    """
+    T² de Hotelling e correlação deslizante de um grupo de canais
+
+    Args:
+        channels: nomes dos canais (ordem canônica do grupo)
+        baseline: observações da fase I (estimativa de média e covariância)
+        alpha: probabilidade de alarme falso por ponto (0.0027 ~ 3 sigma)
+    """
+
+    def __init__(self, channels, baseline=100, alpha=0.0027):
+        self.channels = list(channels)
+        self.p = len(self.channels)
+        if baseline <= self.p + 1:
+            raise ValueError(f"A base deve ter mais de {self.p + 1} observações")
+        self.baseline = baseline
+        self.alpha = alpha
+        self.offset = 0
+        self.version = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        p = self.p
+        self.values = GrowingArray((p,))
+        # Somas acumuladas deslocadas pela primeira observação (cancelamento numérico)
+        self.shift = None
+        self.cum_x = GrowingArray((p,))
+        self.cum_xx = GrowingArray((p, p))
+        self.cum_x.extend(np.zeros((1, p)))
+        self.cum_xx.extend(np.zeros((1, p, p)))
+        self.t2 = GrowingArray(())
+        self.univariate_ooc = GrowingArray(())
+        self.mean = self.cov = self.inv_cov = None
+        self.ucl_phase_1 = self.ucl = None
+
+    def _fit_baseline(self):
+        base = self.values.values[:self.baseline]
+        self.mean = base.mean(axis=0)
+        self.cov = np.cov(base, rowvar=False).reshape(self.p, self.p)
+        # pinv: canais constantes ou colineares não derrubam a análise
+        self.inv_cov = np.linalg.pinv(self.cov)
+        self.ucl_phase_1, self.ucl = t2_limits(self.p, self.baseline, self.alpha)
+        self._score(base)
+
+    def _score(self, rows):
+        """T² e pontos fora de ±3σ em algum canal isolado, para as linhas novas"""
+        centered = rows - self.mean
+        self.t2.extend(np.einsum("ij,jk,ik->i", centered, self.inv_cov, centered))
+        std = np.sqrt(np.diag(self.cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.abs(centered) / std
+        self.univariate_ooc.extend((z > 3).any(axis=1))
+
+    def extend(self, rows):
+        """Acrescenta observações (k x p) e estende T² e somas acumuladas"""
+        if len(rows) == 0:
+            return
+        if self.shift is None:
+            self.shift = rows[0].copy()
+        before = self.values.size
+        self.values.extend(rows)
+
+        shifted = rows - self.shift
+        self.cum_x.extend(self.cum_x.values[-1] + np.cumsum(shifted, axis=0))
+        outer = shifted[:, :, None] * shifted[:, None, :]
+        self.cum_xx.extend(self.cum_xx.values[-1] + np.cumsum(outer, axis=0))
+
+        if self.mean is None:
+            if self.values.size >= self.baseline:
+                self._fit_baseline()
+                if self.values.size > self.baseline:
+                    self._score(self.values.values[self.baseline:])
+        else:
+            self._score(self.values.values[before:])
+
+    def refresh(self, store):
+        """Lê do arquivo do grupo só o que foi gravado desde a última chamada"""
+        with self._lock:
+            version = file_version(store.path(self.channels))
+            # Arquivo removido/recriado (histórico limpo): recomeça do zero
+            if self.version is not None and (version[0] != self.version[0] or version[2] < self.offset):
+                self.offset = 0
+                self._reset()
+            self.version = version
+            rows, self.offset = store.read_from(self.channels, self.offset)
+            self.extend(rows)
+
+    def rolling_correlation(self, window, start):
+        """Matrizes de correlação das janelas que terminam em start..n-1 (array k x p x p)"""
+        n = self.values.size
+        ends = np.arange(max(start, window - 1), n) + 1
+        if len(ends) == 0:
+            return ends, np.empty((0, self.p, self.p))
+        cum_x, cum_xx = self.cum_x.values, self.cum_xx.values
+        sx = cum_x[ends] - cum_x[ends - window]
+        sxx = cum_xx[ends] - cum_xx[ends - window]
+        cov = (sxx - sx[:, :, None] * sx[:, None, :] / window) / (window - 1)
+        std = np.sqrt(np.clip(np.diagonal(cov, axis1=1, axis2=2), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / (std[:, :, None] * std[:, None, :])
+        return ends - 1, corr
+
+    def analysis(self, window=50, last=500):
+        """Resumo do T² e da correlação deslizante das últimas `last` observações"""
+        with self._lock:
+            n = self.values.size
+            start = max(0, n - last)
+            result = {
+                "channels": self.channels,
+                "observations": n,
+                "baseline_size": self.baseline,
+                "alpha": self.alpha,
+                "status": "coletando_base",
+                "baseline": None,
+                "t2": None,
+                "rolling_correlation": None,
+            }
+
+            if window >= 2 and n >= window:
+                indices, corr = self.rolling_correlation(window, start)
+                pairs = [(i, j) for i in range(self.p) for j in range(i + 1, self.p)]
+                result["rolling_correlation"] = {
+                    "window": window,
+                    "index": indices.tolist(),
+                    "pairs": {
+                        f"{self.channels[i]}~{self.channels[j]}": _rounded(corr[:, i, j])
+                        for i, j in pairs
+                    },
+                }
+
+            if self.mean is None:
+                return result
+
+            std = np.sqrt(np.diag(self.cov))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                base_corr = self.cov / np.outer(std, std)
+            result["baseline"] = {
+                "mean": dict(zip(self.channels, _rounded(self.mean))),
+                "std": dict(zip(self.channels, _rounded(std))),
+                "correlation": [_rounded(row) for row in base_corr],
+            }
+
+            t2 = self.t2.values
+            univariate = self.univariate_ooc.values.astype(bool)
+            limits = np.where(np.arange(n) < self.baseline, self.ucl_phase_1, self.ucl)
+            out = t2 > limits
+            # Fora de controle no T² sem que nenhum canal isolado passe de ±3σ
+            joint_only = out & ~univariate
+            monitored = slice(self.baseline, n)
+            result["status"] = "fora_de_controle" if out[monitored].any() else "em_controle"
+            result["t2"] = {
+                "ucl_phase_1": round(self.ucl_phase_1, 4),
+                "ucl": round(self.ucl, 4),
+                "index_start": start,
+                "values": _rounded(t2[start:]),
+                "out_of_control": int(out[monitored].sum()),
+                "joint_only": int(joint_only[monitored].sum()),
+                "out_of_control_points": (np.flatnonzero(out[start:]) + start).tolist(),
+                "joint_only_points": (np.flatnonzero(joint_only[start:]) + start).tolist(),
+            }
+            return result
+
+
+def _rounded(values, decimals=4):
+    """Lista JSON (NaN -> None) arredondada"""
+    return [None if not np.isfinite(v) else round(float(v), decimals) for v in np.asarray(values)]
@@ -0,0 +1,152 @@
+"""
+Motor de probabilidade binomial, arranjos e combinações
+
+- Coeficientes exatos com math.comb / math.perm (sem laços de fatorial)
+- PMF em espaço logarítmico (lgamma + log1p), estável para n na casa dos milhões
+- CDF por recorrência incremental da PMF a partir da moda, somando apenas
+  os termos relevantes
+- Resultados memoizados para os parâmetros mais usados
+"""
+import math
+from functools import lru_cache
+
+# Até este n a PMF é calculada com o coeficiente inteiro exato
+EXACT_LIMIT = 1000
+
+# Termos menores que isto (relativos à soma) não alteram o resultado em float
+_TAIL_EPSILON = 1e-18
+
+
+@lru_cache(maxsize=4096)
+def binomial_coefficient(n, k):
+    """Calcula o coeficiente binomial C(n,k) exato"""
+    if k < 0 or k > n:
+        return 0
+    return math.comb(n, k)
+
+
+def log_binomial_coefficient(n, k):
+    """Calcula ln C(n,k) via log-gamma"""
+    if k < 0 or k > n:
+        return -math.inf
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def log_binomial_probability(n, k, p):
+    """Calcula ln P(X = k) para distribuição binomial"""
+    if k < 0 or k > n:
+        return -math.inf
+    if p <= 0.0:
+        return 0.0 if k == 0 else -math.inf
+    if p >= 1.0:
+        return 0.0 if k == n else -math.inf
+    return log_binomial_coefficient(n, k) + k * math.log(p) + (n - k) * math.log1p(-p)
+
+
+@lru_cache(maxsize=4096)
+def binomial_probability(n, k, p):
+    """Calcula P(X = k) para distribuição binomial"""
+    if n <= EXACT_LIMIT and 0.0 < p < 1.0 and 0 <= k <= n:
+        value = binomial_coefficient(n, k) * (p ** k) * ((1 - p) ** (n - k))
+        # Só vale se as potências não sofreram underflow
+        if value > 0.0:
+            return value
+    return math.exp(log_binomial_probability(n, k, p))
+
+
+def _mode(n, p):
+    return min(n, max(0, int(math.floor((n + 1) * p))))
+
+
+def _sum_tail(n, start, stop, direction, p):
+    """
+    Soma P(X = i) de start em direção a stop (inclusive) usando a recorrência
+    P(i+1)/P(i) = (n-i)/(i+1) * p/(1-p), parando quando os termos se tornam
+    desprezíveis
+    """
+    ratio = p / (1 - p)
+    log_term = log_binomial_probability(n, start, p)
+    term = math.exp(log_term)
+    total = term
+    i = start
+    while i != stop:
+        if direction > 0:
+            term *= (n - i) / (i + 1) * ratio
+        else:
+            term *= i / (n - i + 1) / ratio
+        i += direction
+        total += term
+        if term <= total * _TAIL_EPSILON:
+            break
+    return total
+
+
+@lru_cache(maxsize=4096)
+def cumulative_binomial(n, k, p):
+    """Calcula P(X <= k) para distribuição binomial"""
+    if k < 0:
+        return 0.0
+    if k >= n or p <= 0.0:
+        return 1.0
+    if p >= 1.0:
+        return 0.0
+
+    mode = _mode(n, p)
+    if k < mode:
+        # Cauda inferior: soma de k para baixo
+        return min(1.0, _sum_tail(n, k, 0, -1, p))
+    # Cauda superior é a menor: P(X <= k) = 1 - P(X > k)
+    return max(0.0, 1.0 - _sum_tail(n, k + 1, n, 1, p))
+
+
+def calculate_probability_success(success_rate, total_samples):
+    """
+    Calcula probabilidade de sucesso nos dados
+    success_rate: Taxa de sucesso esperada (0-1)
+    total_samples: Número total de amostras
+    """
+    log_exact = log_binomial_probability(total_samples, total_samples, success_rate)
+    exact_prob = binomial_probability(total_samples, total_samples, success_rate)
+    cumulative_prob = cumulative_binomial(total_samples, total_samples, success_rate)
+    mean = total_samples * success_rate
+    variance = total_samples * success_rate * (1 - success_rate)
+
+    return {
+        "success_rate": float(success_rate),
+        "total_samples": total_samples,
+        "exact_probability": float(exact_prob),
+        "log10_exact_probability": log_exact / math.log(10) if math.isfinite(log_exact) else None,
+        "cumulative_probability": float(cumulative_prob),
+        "expected_value": float(mean),
+        "variance": float(variance),
+        "standard_deviation": float(variance ** 0.5)
+    }
+
+
+def calculate_arrangements(n, k, with_repetition=False):
+    """
+    Calcula arranjos e combinações
+    n: total de elementos
+    k: elementos a arranjar
+    with_repetition: com ou sem repetição
+    """
+    if n < 0 or k < 0:
+        return None
+
+    if with_repetition:
+        arrangements = n ** k
+    else:
+        if k > n:
+            return None
+        arrangements = math.perm(n, k)
+
+    combinations = binomial_coefficient(n, k) if not with_repetition else None
+
+    return {
+        "n": n,
+        "k": k,
+        "arrangements": int(arrangements),
+        "combinations": int(combinations) if combinations else None,
+        "with_repetition": with_repetition,
+        "formula": f"{n}^{k}" if with_repetition else f"{n}!/{n-k}!"
+    }
@@ -0,0 +1,194 @@
+"""
+Perfilamento sob demanda da API (amostragem de pilhas e tempos por etapa)
+
+Quando a API fica lenta em produção, os logs não dizem onde o tempo vai.
+Por uma janela de tempo definida pelo administrador:
+
+- amostragem: uma thread lê as pilhas de todas as threads do processo
+  (sys._current_frames) a cada `interval` ms e conta cada pilha; o
+  resultado sai no formato "collapsed stacks" (uma linha por pilha,
+  quadros separados por ";", seguida da contagem), aceito por
+  flamegraph.pl, speedscope e similares
+- tempos por etapa: as requisições instrumentadas (trace_request) guardam
+  a duração de cada etapa marcada com stage(); os traces mais recentes
+  ficam disponíveis em JSON
+
+Fora da janela, trace_request e stage só consultam uma flag/contextvar:
+custo desprezível no caminho das requisições. O perfil é por processo:
+com vários workers, cada um tem o seu.
+"""
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+_current_trace = contextvars.ContextVar("profiling_trace", default=None)
+_no_stage = nullcontext()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def collapse(frame, thread_name, max_depth=128):
+    """Pilha da raiz até o quadro atual, no formato collapsed"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class StageTimer:
+    """Mede uma etapa do trace atual"""
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace["stages"].append({
+            "stage": self.name,
+            "offset_ms": round((self.start - self.trace["_start"]) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+        })
+        return False
+
+
+def stage(name):
+    """Marca uma etapa da requisição em trace (sem trace ativo, não faz nada)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _no_stage
+    return StageTimer(trace, name)
+
+
+class Profiler:
+    """
+    Janela de perfilamento: amostragem de pilhas e traces por requisição
+
+    Args:
+        max_traces: traces de requisição guardados (os mais recentes)
+    """
+
+    def __init__(self, max_traces=50):
+        self.active = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.traces = deque(maxlen=max_traces)
+        self._reset(0, 0)
+
+    def _reset(self, seconds, interval):
+        self.stacks = Counter()
+        self.samples = 0
+        self.seconds = seconds
+        self.interval = interval
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self, seconds, interval=0.005):
+        """Abre uma janela de `seconds` s; levanta RuntimeError se já houver uma"""
+        with self._lock:
+            if self.active:
+                raise RuntimeError("Perfilamento já em andamento")
+            self._reset(seconds, interval)
+            self.traces.clear()
+            self._stop.clear()
+            self.started_at = datetime.now().isoformat(timespec="seconds")
+            self.active = True
+            self._thread = threading.Thread(target=self._sample, name="cep-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Encerra a janela antes do prazo (espera a última amostra)"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _sample(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                tick = [
+                    collapse(frame, names.get(ident, f"thread-{ident}"))
+                    for ident, frame in sys._current_frames().items() if ident != own
+                ]
+                with self._lock:
+                    self.stacks.update(tick)
+                    self.samples += 1
+                self._stop.wait(self.interval)
+        finally:
+            self.finished_at = datetime.now().isoformat(timespec="seconds")
+            self.active = False
+
+    @contextmanager
+    def trace_request(self, name):
+        """
+        Registra os tempos das etapas (stage) da requisição, se houver
+        janela aberta; o trace é guardado mesmo se a requisição falhar
+        """
+        if not self.active:
+            yield None
+            return
+        start = time.perf_counter()
+        trace = {"request": name, "started_at": datetime.now().isoformat(timespec="milliseconds"),
+                 "status": "ok", "stages": [], "_start": start}
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace["status"] = f"erro: {getattr(e, 'status_code', type(e).__name__)}"
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            del trace["_start"]
+            self.traces.append(trace)
+
+    def stack_counts(self):
+        """Pilhas amostradas e contagens, da mais frequente à menos"""
+        with self._lock:
+            return self.stacks.most_common()
+
+    def collapsed(self):
+        """Pilhas amostradas no formato collapsed (texto)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stack_counts())
+
+    def status(self):
+        return {
+            "active": self.active,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": self.seconds,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "traces": len(self.traces),
+        }
+
+    def breakdown(self, limit=None):
+        """Traces por requisição e tempo total por etapa (JSON)"""
+        traces = list(self.traces)[-limit:] if limit else list(self.traces)
+        totals = {}
+        for trace in traces:
+            for item in trace["stages"]:
+                entry = totals.setdefault(item["stage"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                entry["count"] += 1
+                entry["total_ms"] = round(entry["total_ms"] + item["duration_ms"], 3)
+                entry["max_ms"] = max(entry["max_ms"], item["duration_ms"])
+        return {"stages": totals, "traces": traces}
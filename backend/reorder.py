@@ -0,0 +1,186 @@
+"""
+Reordenação de leituras atrasadas e fora de ordem (buffer com watermark)
+
+Com buffer offline no dispositivo ou envio em lotes, as leituras chegam
+atrasadas e fora da ordem dos timestamps. Sem reordenação, cada leitura
+entra na amostra aberta na ordem de chegada e os subgrupos misturam
+instantes diferentes.
+
+Cada canal tem um buffer (heap por timestamp, em ms) e um watermark:
+
+    watermark = maior timestamp recebido - atraso tolerado
+
+Leituras com timestamp até o watermark são liberadas em ordem para o
+montador de subgrupos (ingestion.append_readings); as demais esperam.
+Assim uma amostra só fecha depois que o watermark passou por todas as
+suas leituras. Uma leitura mais antiga que a última liberada chega tarde
+demais (a posição dela já foi ocupada): é descartada e contada nas
+métricas de atraso.
+
+Memória limitada: com mais de `max_pending` leituras esperando, as mais
+antigas são liberadas antes do watermark (contadas em "forced"). Sem
+leituras novas por `lateness` ms, o buffer é esvaziado (expire), para que
+um canal parado não segure a amostra aberta indefinidamente.
+
+Os timestamps precisam ser horário Unix em ms (dispositivo sincronizado
+por NTP). Leituras sem timestamp, ou com o millis() desde a inicialização
+do dispositivo, usam o horário de chegada.
+
+O buffer é por processo: com vários workers, cada um ordena apenas as
+leituras que recebeu.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+def now_ms():
+    """Horário atual (Unix, ms), usado para leituras sem timestamp"""
+    return int(time.time() * 1000)
+
+
+# Timestamps abaixo disso (set/2001) não são horário Unix: millis() desde a inicialização
+MIN_UNIX_MS = 10 ** 12
+
+
+def event_times(timestamps, count, arrival):
+    """Timestamps (ms) das leituras, com o horário de chegada onde faltam ou não são Unix"""
+    if timestamps is None:
+        return [arrival] * count
+    return [t if t is not None and t >= MIN_UNIX_MS else arrival for t in timestamps]
+
+
+class ReorderBuffer:
+    """
+    Buffer de reordenação de um canal
+
+    Args:
+        lateness: atraso tolerado (ms) entre o maior timestamp e uma leitura
+        max_pending: máximo de leituras esperando no buffer
+    """
+
+    def __init__(self, lateness, max_pending=10000):
+        self.lateness = lateness
+        self.max_pending = max_pending
+        # Trava de quem libera e grava (a ordem de gravação é a ordem de liberação)
+        self.lock = threading.RLock()
+        self._heap = []
+        self._seq = itertools.count()
+        self.max_seen = None
+        self.released_until = None
+        self.last_arrival = None
+        self.stats = {
+            "received": 0,
+            "released": 0,
+            "reordered": 0,
+            "late": 0,
+            "late_max_ms": 0,
+            "forced": 0,
+            "expired": 0,
+            "pending_max": 0,
+        }
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    @property
+    def watermark(self):
+        return None if self.max_seen is None else self.max_seen - self.lateness
+
+    def add(self, readings, arrival=None):
+        """
+        Recebe leituras (timestamp ms, valor) em qualquer ordem
+        Returns: leituras liberadas [(timestamp, valor)], em ordem de timestamp
+        """
+        stats = self.stats
+        for timestamp, value in readings:
+            stats["received"] += 1
+            if self.released_until is not None and timestamp < self.released_until:
+                stats["late"] += 1
+                stats["late_max_ms"] = max(stats["late_max_ms"], self.released_until - timestamp)
+                continue
+            if self.max_seen is None or timestamp > self.max_seen:
+                self.max_seen = timestamp
+            elif timestamp < self.max_seen:
+                stats["reordered"] += 1
+            heapq.heappush(self._heap, (timestamp, next(self._seq), value))
+        self.last_arrival = now_ms() if arrival is None else arrival
+        released = self._release(self.watermark)
+        stats["pending_max"] = max(stats["pending_max"], len(self._heap))
+        return released
+
+    def expire(self, now=None):
+        """Esvazia o buffer se nenhuma leitura chegou no último `lateness` ms"""
+        now = now_ms() if now is None else now
+        if not self._heap or now - self.last_arrival < self.lateness:
+            return []
+        released = self._release(None)
+        self.stats["expired"] += len(released)
+        return released
+
+    def flush(self):
+        """Libera tudo o que está esperando (ex.: no encerramento da API)"""
+        return self._release(None)
+
+    def _release(self, watermark):
+        heap, released = self._heap, []
+        while heap and (watermark is None or heap[0][0] <= watermark):
+            timestamp, _, value = heapq.heappop(heap)
+            released.append((timestamp, value))
+        if len(heap) > self.max_pending:
+            forced = len(heap) - self.max_pending
+            released.extend((timestamp, value) for timestamp, _, value in
+                            (heapq.heappop(heap) for _ in range(forced)))
+            self.stats["forced"] += forced
+        if released:
+            self.released_until = released[-1][0]
+            self.stats["released"] += len(released)
+        return released
+
+    def status(self):
+        return {
+            **self.stats,
+            "pending": len(self._heap),
+            "watermark": self.watermark,
+            "released_until": self.released_until,
+        }
+
+
+class ReorderBuffers:
+    """Buffers de reordenação por canal, criados na primeira leitura"""
+
+    def __init__(self, lateness, max_pending=10000):
+        self.lateness = lateness
+        self.max_pending = max_pending
+        self._buffers = {}
+        self._guard = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.lateness > 0
+
+    def get(self, name):
+        with self._guard:
+            buffer = self._buffers.get(name)
+            if buffer is None:
+                buffer = self._buffers[name] = ReorderBuffer(self.lateness, self.max_pending)
+            return buffer
+
+    def items(self):
+        with self._guard:
+            return list(self._buffers.items())
+
+    def discard(self, name):
+        """Descarta o que o canal tinha esperando (histórico limpo)"""
+        with self._guard:
+            self._buffers.pop(name, None)
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "lateness_ms": self.lateness,
+            "max_pending": self.max_pending,
+            "channels": {name: buffer.status() for name, buffer in self.items()},
+        }
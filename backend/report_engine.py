@@ -0,0 +1,411 @@
+"""
+Relatórios CEP em HTML com templates pré-compilados e seções incrementais
+
+- Templates (string.Template) compilados uma única vez, na importação
+- O contexto de cada canal (gráfico, capacidade, binomial) e as seções
+  renderizadas a partir dele ficam em cache pela versão do arquivo de
+  dados: canal sem gravação nova não refaz nenhuma análise
+- A tabela de amostras é renderizada em blocos, guardados por canal e
+  posição; blocos de amostras já fechadas (os mesmos objetos,
+  compartilhados entre os snapshots) vêm do cache sem serem relidos
+- stream_report produz o documento em pedaços (gerador), para envio via
+  StreamingResponse sem montar o HTML inteiro em memória
+"""
+import html
+import threading
+from datetime import datetime
+from string import Template
+
+from capability import capability_summary_from_stats, summaries_to_stats
+from chart_rendering import RenderCache
+from control_charts import create_chart, feed_samples
+from ingestion import complete_summaries, sample_summary
+from probability import calculate_probability_success
+
+SAMPLE_BLOCK_SIZE = 500
+
+section_cache = RenderCache(maxsize=512)
+context_cache = RenderCache(maxsize=64)
+
+
+class SampleBlockCache:
+    """
+    Blocos renderizados da tabela de amostras, por canal: [(amostras,
+    fragmento)] na ordem dos blocos
+
+    Sem limite de blocos (um LRU global descartaria os blocos de históricos
+    longos a cada relatório): um bloco só é substituído quando suas amostras
+    mudam, e os que passam do fim do histórico são removidos
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, index, block):
+        """Fragmento do bloco na posição index, se tiver as mesmas amostras (identidade)"""
+        with self._lock:
+            blocks = self._channels.get(key, [])
+            cached = blocks[index] if index < len(blocks) else None
+            if cached is not None and len(cached[0]) == len(block) and all(
+                a is b for a, b in zip(cached[0], block)
+            ):
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, index, block, fragment):
+        with self._lock:
+            blocks = self._channels.setdefault(key, [])
+            blocks.extend([None] * (index + 1 - len(blocks)))
+            blocks[index] = (block, fragment)
+
+    def truncate(self, key, n_blocks):
+        """Remove os blocos além de n_blocks (histórico encolheu)"""
+        with self._lock:
+            del self._channels.get(key, [])[n_blocks:]
+
+
+sample_block_cache = SampleBlockCache()
+
+# ===== TEMPLATES =====
+
+HEADER = Template("""<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>$title</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }
+        .container { max-width: 1000px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        h1 { color: #333; border-bottom: 3px solid #007bff; padding-bottom: 10px; }
+        h2 { color: #555; margin-top: 30px; }
+        h3 { color: #666; }
+        table { width: 100%; border-collapse: collapse; margin: 15px 0; }
+        th, td { border: 1px solid #ddd; padding: 12px; text-align: left; }
+        th { background-color: #007bff; color: white; }
+        tr:nth-child(even) { background-color: #f9f9f9; }
+        .stats { display: grid; grid-template-columns: 1fr 1fr; gap: 15px; margin: 20px 0; }
+        .stat-box { background-color: #f0f0f0; padding: 15px; border-radius: 5px; border-left: 4px solid #007bff; }
+        .stat-label { font-weight: bold; color: #555; }
+        .stat-value { font-size: 1.2em; color: #007bff; margin-top: 5px; }
+        .violated { color: #d62728; font-weight: bold; }
+        img { width: 100%; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>$title</h1>
+        <p>Gerado em $generated_at</p>
+""")
+
+CHANNEL = Template("""
+        <h2>Canal: $name ($unit) - Gráfico $chart_type</h2>
+        <img src="$chart_url" alt="Gráfico de Controle - $name">
+""")
+
+STAT_BOX = Template("""
+            <div class="stat-box">
+                <div class="stat-label">$label</div>
+                <div class="stat-value">$value</div>
+            </div>""")
+
+SUMMARY = Template("""
+        <h3>Resumo Executivo</h3>
+        <div class="stats">$boxes
+        </div>
+""")
+
+TABLE = Template("""
+        <h3>$title</h3>
+        <table>
+            <tr>$head</tr>$rows
+        </table>
+""")
+
+ROW = Template("""
+            <tr>$cells</tr>""")
+
+SAMPLES_OPEN = Template("""
+        <h3>Dados das Amostras</h3>
+        <table>
+            <tr><th>Amostra</th><th>X̄ (Média)</th><th>R (Amplitude)</th></tr>""")
+
+SAMPLES_CLOSE = Template("""
+        </table>
+""")
+
+FOOTER = Template("""
+        <footer style="text-align: center; margin-top: 40px; color: #999; font-size: 0.9em;">
+            <p>Relatório gerado automaticamente pelo sistema de análise CEP</p>
+        </footer>
+    </div>
+</body>
+</html>
+""")
+
+
+def _fmt(value, digits=4):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return html.escape(str(value))
+
+
+def _row(*cells, cls=None):
+    attr = f' class="{cls}"' if cls else ""
+    return ROW.substitute(cells="".join(f"<td{attr}>{_fmt(cell)}</td>" for cell in cells))
+
+
+def _table(title, head, rows):
+    return TABLE.substitute(
+        title=title,
+        head="".join(f"<th>{column}</th>" for column in head),
+        rows="".join(rows),
+    )
+
+
+def _interpret(index):
+    if index is None:
+        return "-"
+    if index >= 1.33:
+        return "✓ Capaz"
+    if index >= 1.0:
+        return "⚠ Marginal"
+    return "✗ Incapaz"
+
+
+# ===== SEÇÕES =====
+
+def render_summary(ctx):
+    boxes = [
+        ("Total de Amostras", ctx["total_samples"]),
+        ("Média (X̄)", _fmt(ctx["mean"], 2)),
+        ("Limite Superior (LSE)", _fmt(ctx["lse"], 2)),
+        ("Limite Inferior (LIE)", _fmt(ctx["lie"], 2)),
+    ]
+    return SUMMARY.substitute(boxes="".join(
+        STAT_BOX.substitute(label=label, value=value) for label, value in boxes
+    ))
+
+
+def render_limits(ctx):
+    rows = [
+        _row(f"{ctx['chart_type']} - Linha Central", ctx["center_line"]),
+        _row(f"{ctx['chart_type']} - LSC (Limite Superior de Controle)", ctx["lsc"]),
+        _row(f"{ctx['chart_type']} - LIC (Limite Inferior de Controle)", ctx["lic"]),
+        _row("Sigma (σ)", ctx["sigma"]),
+        _row("Pontos fora de controle", ctx["out_of_control"]),
+    ]
+    dispersion = ctx.get("dispersion")
+    if dispersion:
+        rows += [
+            _row(f"{dispersion['name']} - Linha Central", dispersion["center_line"]),
+            _row(f"{dispersion['name']} - LSC", dispersion["lsc"]),
+            _row(f"{dispersion['name']} - LIC", dispersion["lic"]),
+            _row(f"{dispersion['name']} - Pontos fora de controle", dispersion["out_of_control"]),
+        ]
+    return _table("Estatísticas de Controle", ["Parâmetro", "Valor"], rows)
+
+
+CAPABILITY_ROWS = [
+    ("cp", "Cp (Capacidade Potencial)"),
+    ("cpk", "Cpk (Capacidade Real)"),
+    ("cpu", "Cps (Cap. Superior)"),
+    ("cpl", "Cpi (Cap. Inferior)"),
+    ("pp", "Pp (Desempenho Potencial)"),
+    ("ppk", "Ppk (Desempenho Real)"),
+]
+
+
+def render_capability(ctx):
+    rows = [_row(label, ctx[key], _interpret(ctx[key])) for key, label in CAPABILITY_ROWS]
+    rows.append(_row("PPM fora da especificação", ctx["ppm_total"], "-"))
+    return _table("Capacidade do Processo", ["Índice", "Valor", "Interpretação"], rows)
+
+
+def render_rules(ctx):
+    rows = [
+        _row(rule["name"], rule["description"], rule["status"],
+             cls="violated" if rule["violated"] else None)
+        for rule in ctx["rules"]
+    ]
+    return _table("Regras do Western Electric", ["Regra", "Descrição", "Status"], rows)
+
+
+def render_probability(ctx):
+    rows = [
+        _row("Taxa de sucesso (Cpk / 1.33)", ctx["success_rate"]),
+        _row("Amostras", ctx["total_samples"]),
+        _row("Probabilidade exata", ctx["exact_probability"]),
+        _row("Probabilidade acumulada", ctx["cumulative_probability"]),
+        _row("Valor esperado", ctx["expected_value"]),
+        _row("Desvio padrão", ctx["standard_deviation"]),
+    ]
+    return _table("Análise de Probabilidade (Binomial)", ["Parâmetro", "Valor"], rows)
+
+
+SECTIONS = {
+    "summary": render_summary,
+    "limits": render_limits,
+    "capability": render_capability,
+    "rules": render_rules,
+    "probability": render_probability,
+}
+
+
+def render_section(name, ctx, key=None):
+    """
+    Renderiza a seção ou a reaproveita do cache
+
+    Args:
+        key: chave do contexto (canal, configuração e versão dos dados);
+            None renderiza sem cache
+    """
+    if key is None:
+        return SECTIONS[name](ctx)
+    fragment = section_cache.get((name, key))
+    if fragment is None:
+        fragment = SECTIONS[name](ctx)
+        section_cache.put((name, key), fragment)
+    return fragment
+
+
+def _sample_rows(samples):
+    rows = []
+    for sample in samples:
+        if sample["Dados"]:
+            summary = sample_summary(sample)
+            rows.append(_row(sample["Amostra"], summary["media"], summary["amplitude"]))
+    return "".join(rows)
+
+
+def iter_sample_blocks(data, block_size=SAMPLE_BLOCK_SIZE, key=None):
+    """
+    Tabela de amostras em blocos; um bloco com as mesmas amostras da vez
+    anterior vem do cache (sample_block_cache)
+
+    As amostras fechadas são os mesmos objetos em todos os snapshots (só a
+    última é copiada na ingestão), então a comparação é por identidade, sem
+    reler os dados. O cache guarda as amostras do bloco, o que impede a
+    reutilização dos ids.
+
+    Args:
+        key: canal dos dados; None renderiza sem cache
+    """
+    yield SAMPLES_OPEN.substitute()
+    cache_key = (key, block_size)
+    if key is not None:
+        sample_block_cache.truncate(cache_key, -(-len(data) // block_size))
+    for index, offset in enumerate(range(0, len(data), block_size)):
+        block = data[offset:offset + block_size]
+        fragment = sample_block_cache.get(cache_key, index, block) if key is not None else None
+        if fragment is None:
+            fragment = _sample_rows(block)
+            if key is not None:
+                sample_block_cache.put(cache_key, index, block, fragment)
+        yield fragment
+    yield SAMPLES_CLOSE.substitute()
+
+
+# ===== CONTEXTO =====
+
+def context_key(config, version):
+    """Chave do contexto do canal: configuração que afeta a análise + versão dos dados"""
+    return (config.name, config.chart_type, config.sample_size, tuple(config.spec_limits), tuple(version))
+
+
+def channel_context(config, version, data):
+    """
+    Contexto do canal, calculado só quando a versão dos dados (ou a
+    configuração) muda: (chave, contexto ou None)
+    """
+    key = context_key(config, version)
+    cached = context_cache.get(key)
+    if cached is None:
+        # Tupla: um contexto None (dados insuficientes) também fica em cache
+        cached = (build_channel_context(config, data),)
+        context_cache.put(key, cached)
+    return key, cached[0]
+
+
+def build_channel_context(config, data):
+    """
+    Calcula o contexto de cada seção para um canal (motores nativos)
+    Retorna None se não houver dados suficientes para o gráfico
+    """
+    chart = create_chart(config.chart_type, sample_size=config.sample_size)
+    feed_samples(chart, data)
+    analysis = chart.analysis()
+    if analysis is None:
+        return None
+
+    lse, lie = config.spec_limits
+    indices = capability_summary_from_stats(
+        summaries_to_stats(complete_summaries(data, config.sample_size)), config.sample_size, lse, lie
+    )
+    cpk = indices.get("cpk")
+    success_rate = min(1.0, max(0.0, cpk / 1.33)) if cpk else 0.5
+
+    dispersion = analysis.get("dispersion")
+    return {
+        "summary": {
+            "total_samples": len(data), "mean": analysis["center_line"], "lse": lse, "lie": lie,
+        },
+        "limits": {
+            "chart_type": analysis["chart_type"],
+            "center_line": analysis["center_line"],
+            "lsc": analysis["lsc"],
+            "lic": analysis["lic"],
+            "sigma": analysis["sigma"],
+            "out_of_control": analysis["out_of_control"],
+            "dispersion": {k: v for k, v in dispersion.items() if k != "values"} if dispersion else None,
+        },
+        "capability": {
+            **{key: indices.get(key) for key, _ in CAPABILITY_ROWS},
+            "ppm_total": indices.get("ppm_total"),
+        },
+        "rules": {"rules": list((analysis.get("western_rules") or {}).values())},
+        "probability": {
+            key: value for key, value in calculate_probability_success(success_rate, len(data)).items()
+            if key in ("success_rate", "total_samples", "exact_probability", "cumulative_probability",
+                       "expected_value", "standard_deviation")
+        },
+    }
+
+
+def stream_report(channel_sources, title="Relatório de Análise CEP", include_samples=True,
+                  block_size=SAMPLE_BLOCK_SIZE):
+    """
+    Gera o relatório em pedaços de texto
+
+    Args:
+        channel_sources: lista de (config, load) onde load() retorna
+            (versão, amostras) do canal, ex.: um snapshot; cada canal é
+            carregado só quando chega sua vez
+        include_samples: inclui a tabela de amostras (a maior seção)
+        block_size: amostras por bloco da tabela
+    """
+    yield HEADER.substitute(title=title, generated_at=datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
+    for config, load in channel_sources:
+        version, data = load()
+        yield CHANNEL.substitute(
+            name=html.escape(config.name), unit=html.escape(config.unit or "-"),
+            chart_type=config.chart_type, chart_url=f"/cep/chart/{config.name}?format=svg",
+        )
+        key, context = channel_context(config, version, data)
+        if context is None:
+            yield f"\n        <p>Dados insuficientes para análise ({len(data)} amostras)</p>\n"
+            continue
+        for name in SECTIONS:
+            yield render_section(name, context[name], key)
+        if include_samples:
+            yield from iter_sample_blocks(data, block_size, key=config.name)
+        # Libera o canal antes de carregar o próximo
+        del data, context
+    yield FOOTER.substitute()
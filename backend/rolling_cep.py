@@ -0,0 +1,155 @@
+"""
+Análise CEP em janela deslizante com atualização incremental
+
+A janela mantém somas acumuladas de X-barra, R e das leituras. Adicionar
+ou remover um subgrupo custa O(1), então os limites de controle e a
+capacidade são recalculados a cada passo sem reconstruir o XR_graph.
+Os subgrupos podem entrar pelas leituras (add) ou pelo resumo gravado na
+ingestão (add_summary), que basta para recompor as somas.
+"""
+import math
+from collections import deque
+
+from cep_constants import get_constants
+from ingestion import summarize
+
+
+class RollingXR:
+    """Janela deslizante de subgrupos para gráficos X-barra / R"""
+
+    def __init__(self, window, sample_size, lse=None, lie=None):
+        self.window = window
+        self.sample_size = sample_size
+        self.constants = get_constants(sample_size)
+        self.lse = lse
+        self.lie = lie
+        self.subgroups = deque()
+        self.sum_x_bar = 0.0
+        self.sum_r = 0.0
+        # Somas deslocadas por uma referência para reduzir cancelamento numérico
+        self.shift = None
+        self.sum_x = 0.0
+        self.sum_x2 = 0.0
+
+    def add(self, readings):
+        """Adiciona um subgrupo; remove o mais antigo se a janela estiver cheia"""
+        if len(readings) != self.sample_size:
+            raise ValueError(f"Subgrupo deve ter {self.sample_size} leituras")
+        self.add_summary(summarize(readings))
+
+    def add_summary(self, summary):
+        """
+        Adiciona um subgrupo pelo resumo gravado na ingestão (média,
+        amplitude e desvio padrão), sem as leituras
+        """
+        n = self.sample_size
+        x_bar = summary["media"]
+        r = summary["amplitude"]
+        std = summary["desvio_padrao"]
+        if self.shift is None:
+            self.shift = float(x_bar)
+
+        # Somas deslocadas recompostas do resumo: Σ(x - c) e Σ(x - c)²
+        offset = x_bar - self.shift
+        sum_x = n * offset
+        sum_x2 = (n - 1) * std * std + n * offset * offset
+
+        self.subgroups.append((x_bar, r, sum_x, sum_x2))
+        self.sum_x_bar += x_bar
+        self.sum_r += r
+        self.sum_x += sum_x
+        self.sum_x2 += sum_x2
+
+        if len(self.subgroups) > self.window:
+            self.remove()
+
+    def remove(self):
+        """Remove o subgrupo mais antigo da janela"""
+        x_bar, r, sum_x, sum_x2 = self.subgroups.popleft()
+        self.sum_x_bar -= x_bar
+        self.sum_r -= r
+        self.sum_x -= sum_x
+        self.sum_x2 -= sum_x2
+
+    @property
+    def full(self):
+        return len(self.subgroups) == self.window
+
+    def stats(self):
+        """Estatísticas da janela atual (limites de controle e capacidade)"""
+        m = len(self.subgroups)
+        if m == 0:
+            return None
+
+        x_double_mean = self.sum_x_bar / m
+        r_mean = self.sum_r / m
+        sigma = r_mean / self.constants["d2"]
+
+        total = m * self.sample_size
+        variance = (self.sum_x2 - self.sum_x ** 2 / total) / (total - 1)
+        sigma_overall = math.sqrt(max(variance, 0.0))
+
+        result = {
+            "x_double_mean": x_double_mean,
+            "r_mean": r_mean,
+            "sigma": sigma,
+            "sigma_overall": sigma_overall,
+            "lsc_x_bar": x_double_mean + self.constants["A2"] * r_mean,
+            "lic_x_bar": x_double_mean - self.constants["A2"] * r_mean,
+            "lsc_r": self.constants["D4"] * r_mean,
+            "lic_r": self.constants["D3"] * r_mean,
+            "cp": None,
+            "cpk": None,
+            "pp": None,
+            "ppk": None,
+        }
+
+        if self.lse is not None and self.lie is not None:
+            if sigma > 0:
+                result["cp"] = (self.lse - self.lie) / (6 * sigma)
+                result["cpk"] = min(self.lse - x_double_mean, x_double_mean - self.lie) / (3 * sigma)
+            if sigma_overall > 0:
+                result["pp"] = (self.lse - self.lie) / (6 * sigma_overall)
+                result["ppk"] = min(self.lse - x_double_mean, x_double_mean - self.lie) / (3 * sigma_overall)
+
+        return result
+
+
+def rolling_series(samples, window, sample_size, step=1, lse=None, lie=None):
+    """
+    Série temporal das estatísticas CEP em janela deslizante
+
+    Args:
+        samples: lista de subgrupos em ordem temporal: listas de leituras ou
+            resumos gravados na ingestão (ingestion.complete_summaries)
+        window: número de subgrupos por janela
+        step: emite um ponto a cada step subgrupos (ex.: 25 = limites a cada 25)
+
+    Returns:
+        Dicionário com listas paralelas (uma entrada por janela emitida)
+    """
+    roller = RollingXR(window, sample_size, lse=lse, lie=lie)
+    keys = (
+        "x_double_mean", "r_mean", "sigma", "sigma_overall",
+        "lsc_x_bar", "lic_x_bar", "lsc_r", "lic_r",
+        "cp", "cpk", "pp", "ppk",
+    )
+    series = {key: [] for key in keys}
+    series["end_sample"] = []
+
+    for index, sample in enumerate(samples):
+        if isinstance(sample, dict):
+            roller.add_summary(sample)
+        else:
+            roller.add(sample)
+        if not roller.full:
+            continue
+        # Primeira janela cheia sempre é emitida; depois, a cada step subgrupos
+        if (index + 1 - window) % step != 0:
+            continue
+        stats = roller.stats()
+        for key in keys:
+            series[key].append(stats[key])
+        series["end_sample"].append(index + 1)
+
+    return series
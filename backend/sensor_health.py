@@ -0,0 +1,209 @@
+"""
+Filtro de saúde do sensor na ingestão (pré-filtro de leituras com falha)
+
+Leituras com falha do DHT (NaN, valor travado, picos fisicamente
+impossíveis) entravam direto em "Dados" e distorciam os limites de
+controle; depois da limpeza, todo o histórico precisava ser recalculado.
+Aqui cada leitura passa por um filtro antes do montador de subgrupos, e
+as reprovadas vão para uma quarentena à parte, com o motivo:
+
+- nan: valor não finito
+- range: fora da faixa física do sensor (valid_min..valid_max)
+- spike: salto maior que max_step em relação à última leitura aceita que
+  não se confirma na leitura seguinte. Uma leitura suspeita fica retida
+  até a próxima: se a próxima está perto dela, é uma mudança de nível
+  real (as duas entram; o CEP precisa vê-la); se volta ao nível anterior,
+  era um pico e vai para a quarentena
+- stuck: mais de stuck_limit leituras idênticas seguidas; as excedentes
+  vão para a quarentena até o valor mudar
+
+Estado O(1) por canal (última leitura aceita, leitura retida e tamanho da
+sequência de valores iguais). O estado é por processo: com vários
+workers, cada um filtra a sequência de leituras que recebeu.
+"""
+import json
+import math
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from storage import file_lock
+
+REASONS = ("nan", "range", "spike", "stuck")
+
+
+class SensorFilter:
+    """
+    Filtro de um canal
+
+    Args:
+        valid_min, valid_max: faixa física do sensor (None = sem limite)
+        max_step: maior salto plausível entre leituras consecutivas
+        stuck_limit: leituras idênticas seguidas toleradas
+    """
+
+    def __init__(self, valid_min=None, valid_max=None, max_step=None, stuck_limit=None):
+        self.valid_min = valid_min
+        self.valid_max = valid_max
+        self.max_step = max_step
+        self.stuck_limit = stuck_limit
+        self.last = None
+        self.held = None
+        self.run_value = None
+        self.run_length = 0
+        self.stats = {"checked": 0, "accepted": 0, "level_shifts": 0, **{reason: 0 for reason in REASONS}}
+
+    def invalid(self, value):
+        """Motivo pelo qual o valor é inválido por si só (None se válido)"""
+        if not math.isfinite(value):
+            return "nan"
+        if (self.valid_min is not None and value < self.valid_min) or \
+                (self.valid_max is not None and value > self.valid_max):
+            return "range"
+        return None
+
+    def process(self, readings):
+        """
+        Filtra leituras (timestamp, valor) na ordem em que foram medidas
+        Returns: (aceitas [(timestamp, valor)], quarentena [(timestamp, valor, motivo)])
+        """
+        accepted, quarantined = [], []
+        for timestamp, value in readings:
+            self.stats["checked"] += 1
+            reason = self.invalid(value)
+            if reason is not None:
+                self._quarantine(quarantined, timestamp, value, reason)
+                continue
+            if self.held is not None:
+                held_timestamp, held_value = self.held
+                self.held = None
+                if abs(value - held_value) <= self.max_step:
+                    # A leitura seguinte confirma o novo nível
+                    self.stats["level_shifts"] += 1
+                    self._accept(accepted, quarantined, held_timestamp, held_value)
+                else:
+                    self._quarantine(quarantined, held_timestamp, held_value, "spike")
+            if self.max_step is not None and self.last is not None and abs(value - self.last) > self.max_step:
+                self.held = (timestamp, value)
+                continue
+            self._accept(accepted, quarantined, timestamp, value)
+        return accepted, quarantined
+
+    def flush(self):
+        """Aceita a leitura retida, sem a seguinte para confirmar (encerramento)"""
+        accepted, quarantined = [], []
+        if self.held is not None:
+            timestamp, value = self.held
+            self.held = None
+            self._accept(accepted, quarantined, timestamp, value)
+        return accepted, quarantined
+
+    def _accept(self, accepted, quarantined, timestamp, value):
+        if value == self.run_value:
+            self.run_length += 1
+        else:
+            self.run_value, self.run_length = value, 1
+        if self.stuck_limit is not None and self.run_length > self.stuck_limit:
+            self._quarantine(quarantined, timestamp, value, "stuck")
+            return
+        self.last = value
+        self.stats["accepted"] += 1
+        accepted.append((timestamp, value))
+
+    def _quarantine(self, quarantined, timestamp, value, reason):
+        self.stats[reason] += 1
+        quarantined.append((timestamp, value, reason))
+
+    def status(self):
+        return {
+            **self.stats,
+            "quarantined": sum(self.stats[reason] for reason in REASONS),
+            "holding": self.held is not None,
+            "stuck_run": self.run_length,
+        }
+
+
+def filter_for(config):
+    return SensorFilter(config.valid_min, config.valid_max, config.max_step, config.stuck_limit)
+
+
+def _limits(config):
+    return (config.valid_min, config.valid_max, config.max_step, config.stuck_limit)
+
+
+class SensorHealth:
+    """
+    Filtros por canal, recriados quando os parâmetros do canal mudam
+    (POST /config/reload)
+
+    Args:
+        get_config: nome do canal -> ChannelConfig
+    """
+
+    def __init__(self, get_config):
+        self.get_config = get_config
+        self._filters = {}
+        self._guard = threading.Lock()
+
+    def filter(self, name):
+        config = self.get_config(name)
+        with self._guard:
+            entry = self._filters.get(name)
+            if entry is None or entry[0] != _limits(config):
+                entry = self._filters[name] = (_limits(config), filter_for(config))
+            return entry[1]
+
+    def reset(self, name):
+        with self._guard:
+            self._filters.pop(name, None)
+
+    def items(self):
+        with self._guard:
+            return [(name, entry[1]) for name, entry in self._filters.items()]
+
+    def status(self):
+        return {name: sensor_filter.status() for name, sensor_filter in self.items()}
+
+
+class QuarantineStore:
+    """Leituras em quarentena por canal (quarantine_<canal>.jsonl, só acréscimos)"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, name):
+        return self.directory / f"quarantine_{name}.jsonl"
+
+    def append(self, name, quarantined):
+        """Grava leituras (timestamp ms ou None, valor, motivo)"""
+        if not quarantined:
+            return
+        now = datetime.now().isoformat(timespec="seconds")
+        lines = [
+            json.dumps({
+                "time": datetime.fromtimestamp(timestamp / 1000).isoformat(timespec="milliseconds")
+                if timestamp is not None else now,
+                # NaN não é JSON válido
+                "value": value if math.isfinite(value) else None,
+                "reason": reason,
+            })
+            for timestamp, value, reason in quarantined
+        ]
+        path = self.path(name)
+        with file_lock(path):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def recent(self, name, limit=100):
+        """Últimas leituras em quarentena do canal"""
+        try:
+            with open(self.path(name), encoding="utf-8") as f:
+                return [json.loads(line) for line in deque(f, maxlen=limit)]
+        except FileNotFoundError:
+            return []
+
+    def clear(self, name):
+        path = self.path(name)
+        with file_lock(path):
+            path.unlink(missing_ok=True)
@@ -1,25 +1,36 @@
 # Script para simular ESP32 enviando dados para a API
 # Execute: python simulate_esp32.py
+#
+# Modo teste de carga (N dispositivos virtuais concorrentes):
+#   python simulate_esp32.py --devices 2000 --rate 1 --duration 60 --combined-ratio 0.5
+#   python simulate_esp32.py --devices 500 --burst-every 10 --burst-size 20 --report carga.json
+#   python simulate_esp32.py --devices 200 --in-process   (sem servidor, via ASGI)
+#   python simulate_esp32.py --devices 500 --binary --batch 12   (protocolo binário em lote)
+#   python simulate_esp32.py --devices 2000 --mqtt --burst-every 5   (pub/sub com broker em processo)
 
-import requests
+import argparse
+import asyncio
+import json
 import random
 import time
-import json
+
+import requests
 
 API_URL = "http://localhost:8000/data"
+API_BASE = "http://localhost:8000"
 
 def send_temperature():
     # Gera temperatura aleatória entre 15°C e 35°C
     temperature = round(random.uniform(15.0, 35.0), 2)
-    
+
     data = {
         "temperature": temperature,
         "timestamp": int(time.time() * 1000)
     }
-    
+
     try:
         response = requests.post(API_URL, json=data)
-        
+
         if response.status_code == 201:
             result = response.json()
             print(f"✓ Temperatura enviada: {temperature}°C")
@@ -28,16 +39,279 @@ def send_temperature():
                 print(f"  🎯 Amostra {result['sample_number']} completa!")
         else:
             print(f"✗ Erro: {response.status_code}")
-            
+
     except Exception as e:
         print(f"✗ Erro ao enviar: {e}")
 
+# ===== TESTE DE CARGA =====
+
+def percentile(sorted_values, pct):
+    """Percentil (interpolação linear) de uma lista já ordenada"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class LoadStats:
+    """Acumula latências e erros por endpoint"""
+
+    def __init__(self):
+        self.latencies = {"/data": [], "/combined": [], "/ingest/binary": []}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, latency_ms):
+        self.latencies[endpoint].append(latency_ms)
+
+    def record_error(self, endpoint, reason):
+        key = f"{endpoint} {reason}"
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        all_latencies = sorted(v for values in self.latencies.values() for v in values)
+        successes = len(all_latencies)
+        errors = sum(self.errors.values())
+        total = successes + errors
+
+        def describe(values):
+            values = sorted(values)
+            return {
+                "requests": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1] if values else None,
+            }
+
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "successes": successes,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "throughput_rps": successes / elapsed if elapsed else 0.0,
+            "latency": describe(all_latencies),
+            "endpoints": {endpoint: describe(values) for endpoint, values in self.latencies.items()},
+            "error_breakdown": self.errors,
+        }
+
+def build_reading(endpoint):
+    reading = {
+        "temperature": round(random.gauss(23.0, 1.5), 2),
+        "timestamp": int(time.time() * 1000)
+    }
+    if endpoint == "/combined":
+        reading["humidity"] = round(random.gauss(55.0, 4.0), 2)
+    return reading
+
+async def send_reading(client, stats, combined_ratio):
+    endpoint = "/combined" if random.random() < combined_ratio else "/data"
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=build_reading(endpoint))
+        latency_ms = (time.perf_counter() - start) * 1000
+        if response.status_code == 201:
+            stats.record(endpoint, latency_ms)
+        else:
+            stats.record_error(endpoint, f"HTTP {response.status_code}")
+    except Exception as e:
+        stats.record_error(endpoint, type(e).__name__)
+
+async def send_binary_batch(client, stats, device_id, batch):
+    """Envia o lote de leituras (temperatura, umidade) em um quadro binário"""
+    from binary_protocol import encode_frame
+
+    timestamps = [reading["timestamp"] % 2**32 for reading in batch]
+    values = [[reading["temperature"], reading["humidity"]] for reading in batch]
+    frame = encode_frame(device_id, [0, 1], timestamps, values)
+    endpoint = "/ingest/binary"
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, content=frame,
+                                     headers={"Content-Type": "application/octet-stream"})
+        latency_ms = (time.perf_counter() - start) * 1000
+        if response.status_code == 201:
+            stats.record(endpoint, latency_ms)
+        else:
+            stats.record_error(endpoint, f"HTTP {response.status_code}")
+    except Exception as e:
+        stats.record_error(endpoint, type(e).__name__)
+
+async def binary_device(client, stats, device_id, args, deadline):
+    """ESP32 virtual no modo binário: acumula `batch` leituras por quadro"""
+    interval = 1.0 / args.rate
+    await asyncio.sleep(random.uniform(0, interval))
+    batch = []
+    while time.monotonic() < deadline:
+        batch.append(build_reading("/combined"))
+        if len(batch) >= args.batch:
+            await send_binary_batch(client, stats, device_id, batch)
+            batch = []
+        await asyncio.sleep(interval * random.uniform(1 - args.jitter, 1 + args.jitter))
+    if batch:
+        await send_binary_batch(client, stats, device_id, batch)
+
+async def virtual_device(client, stats, device_id, args, deadline):
+    """Um ESP32 virtual: envia leituras na taxa configurada, com rajadas opcionais"""
+    interval = 1.0 / args.rate
+    # Espalha o início dos dispositivos para não sincronizar todos
+    await asyncio.sleep(random.uniform(0, interval))
+    next_burst = time.monotonic() + args.burst_every if args.burst_every else None
+
+    while time.monotonic() < deadline:
+        if next_burst is not None and time.monotonic() >= next_burst:
+            # Rajada: leituras acumuladas enviadas em sequência (ex.: reconexão do Wi-Fi)
+            for _ in range(args.burst_size):
+                await send_reading(client, stats, args.combined_ratio)
+            next_burst += args.burst_every
+        else:
+            await send_reading(client, stats, args.combined_ratio)
+        await asyncio.sleep(interval * random.uniform(1 - args.jitter, 1 + args.jitter))
+
+async def run_load_test(args):
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_connections,
+    )
+    if args.in_process:
+        from main import app
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout)
+
+    stats = LoadStats()
+    deadline = time.monotonic() + args.duration
+    device = binary_device if args.binary else virtual_device
+    async with client:
+        await asyncio.gather(*(
+            device(client, stats, device_id, args, deadline)
+            for device_id in range(args.devices)
+        ))
+    stats.finished = time.perf_counter()
+    return stats.summary()
+
+async def run_mqtt_test(args):
+    """
+    Dispositivos publicam em tópicos próprios de um broker em processo; o
+    consumidor agrupa as mensagens e grava em lotes via ingest_readings
+    """
+    import main
+    from mqtt_gateway import InProcessBroker, IngestionConsumer, device_topic
+
+    broker = InProcessBroker(maxsize=args.queue_size)
+    consumer = IngestionConsumer(
+        broker, main.ingest_batch,
+        channel_names=main.channels.names,
+        binary_channels=lambda binary_id: getattr(main.channels.by_binary_id(binary_id), "name", None),
+        batch_size=args.batch_size, flush_interval=args.flush_interval,
+    )
+    consumer.start()
+    await asyncio.sleep(0)
+
+    stats = LoadStats()
+    stats.latencies = {"publish": []}
+    readings_sent = {"count": 0}
+
+    async def publish(device_id):
+        reading = build_reading("/combined")
+        start = time.perf_counter()
+        await broker.publish(device_topic(device_id), json.dumps(reading).encode())
+        stats.record("publish", (time.perf_counter() - start) * 1000)
+        readings_sent["count"] += 2
+
+    async def device(device_id, deadline):
+        interval = 1.0 / args.rate
+        await asyncio.sleep(random.uniform(0, interval))
+        next_burst = time.monotonic() + args.burst_every if args.burst_every else None
+        while time.monotonic() < deadline:
+            if next_burst is not None and time.monotonic() >= next_burst:
+                for _ in range(args.burst_size):
+                    await publish(device_id)
+                next_burst += args.burst_every
+            else:
+                await publish(device_id)
+            await asyncio.sleep(interval * random.uniform(1 - args.jitter, 1 + args.jitter))
+
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(*(device(device_id, deadline) for device_id in range(args.devices)))
+    stats.finished = time.perf_counter()
+    # Espera o consumidor esvaziar a fila e entrega o lote pendente
+    await broker.drain()
+    await consumer.stop()
+
+    summary = stats.summary()
+    summary["mqtt"] = {**consumer.stats, "readings_sent": readings_sent["count"],
+                       "lost": readings_sent["count"] - consumer.stats["readings"]}
+    return summary
+
+def print_summary(summary):
+    latency = summary["latency"]
+    fmt = lambda v: f"{v:.1f}" if v is not None else "-"
+    print("\n📊 Resultado do teste de carga")
+    print(f"   Requisições: {summary['requests']} ({summary['successes']} ok, {summary['errors']} erros)")
+    print(f"   Taxa de erro: {summary['error_rate'] * 100:.2f}%")
+    print(f"   Vazão: {summary['throughput_rps']:.1f} req/s em {summary['elapsed_s']:.1f}s")
+    print(f"   Latência p50/p95/p99: {fmt(latency['p50_ms'])} / {fmt(latency['p95_ms'])} / {fmt(latency['p99_ms'])} ms")
+    for endpoint, values in summary["endpoints"].items():
+        print(f"   {endpoint}: {values['requests']} req, p95 {fmt(values['p95_ms'])} ms")
+    for reason, count in summary["error_breakdown"].items():
+        print(f"   ✗ {reason}: {count}")
+    if "mqtt" in summary:
+        mqtt = summary["mqtt"]
+        print(f"   MQTT: {mqtt['messages']} mensagens, {mqtt['readings']}/{mqtt['readings_sent']} leituras "
+              f"em {mqtt['flushes']} lotes (perdidas: {mqtt['lost']})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulador ESP32 / gerador de carga")
+    parser.add_argument("--devices", type=int, default=0,
+                        help="Número de dispositivos virtuais (0 = modo simulador simples)")
+    parser.add_argument("--url", default=API_BASE, help="URL base da API")
+    parser.add_argument("--rate", type=float, default=0.2, help="Leituras por segundo por dispositivo")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duração do teste em segundos")
+    parser.add_argument("--combined-ratio", type=float, default=0.5,
+                        help="Fração das leituras enviadas para /combined (resto vai para /data)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variação relativa do intervalo entre leituras")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="Intervalo entre rajadas em segundos (0 = sem rajadas)")
+    parser.add_argument("--burst-size", type=int, default=10, help="Leituras por rajada")
+    parser.add_argument("--max-connections", type=int, default=200, help="Tamanho do pool de conexões keep-alive")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Timeout por requisição em segundos")
+    parser.add_argument("--in-process", action="store_true", help="Usa a API em processo (ASGI), sem servidor")
+    parser.add_argument("--report", help="Salva o resumo em JSON neste arquivo")
+    parser.add_argument("--binary", action="store_true",
+                        help="Envia lotes pelo protocolo binário (/ingest/binary)")
+    parser.add_argument("--batch", type=int, default=10, help="Leituras por quadro binário")
+    parser.add_argument("--mqtt", action="store_true",
+                        help="Publica via broker pub/sub em processo (consumidor em lotes)")
+    parser.add_argument("--queue-size", type=int, default=10_000, help="Fila do broker em processo")
+    parser.add_argument("--batch-size", type=int, default=500, help="Leituras por lote do consumidor MQTT")
+    parser.add_argument("--flush-interval", type=float, default=0.5, help="Intervalo máximo entre lotes MQTT (s)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    print("🌡️  Simulador ESP32 - Enviando temperaturas...")
-    print(f"   API: {API_URL}")
-    print("   Intervalo: 5 segundos")
-    print("   Ctrl+C para parar\n")
-    
-    while True:
-        send_temperature()
-        time.sleep(5)  # Envia a cada 5 segundos
+    args = parse_args()
+
+    if args.devices > 0:
+        print(f"🚀 Teste de carga: {args.devices} dispositivos, {args.rate} leituras/s cada, {args.duration}s")
+        print(f"   API: {'em processo' if args.in_process or args.mqtt else args.url}")
+        summary = asyncio.run(run_mqtt_test(args) if args.mqtt else run_load_test(args))
+        print_summary(summary)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+            print(f"\n✓ Resumo salvo em: {args.report}")
+    else:
+        print("🌡️  Simulador ESP32 - Enviando temperaturas...")
+        print(f"   API: {API_URL}")
+        print("   Intervalo: 5 segundos")
+        print("   Ctrl+C para parar\n")
+
+        while True:
+            send_temperature()
+            time.sleep(5)  # Envia a cada 5 segundos
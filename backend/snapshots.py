@@ -0,0 +1,98 @@
+"""
+Leituras isoladas por versão (snapshots) dos arquivos de amostras
+
+Cada leitura do histórico, exportação ou análise pegava o arquivo de
+dados e o convertia de novo, O(n) por consulta; uma análise que lia o
+arquivo mais de uma vez podia ver versões diferentes enquanto a
+ingestão continuava gravando.
+
+Aqui cada arquivo tem uma versão corrente em memória: a lista de
+amostras já convertida, associada à versão do arquivo (storage). Pegar
+um snapshot é O(1) (um stat e uma consulta ao dicionário); quem o pegou
+continua vendo o mesmo ponto no tempo, mesmo que a ingestão grave
+versões novas enquanto isso.
+
+Cópia na escrita: a ingestão nunca altera um snapshot. Ela recebe uma
+cópia rasa da lista (writable), com só a última amostra (a que pode
+crescer) copiada; as amostras fechadas são compartilhadas entre as
+versões. Depois de gravar, a nova lista é publicada como versão corrente
+sem ser relida do disco.
+
+Snapshots são somente leitura: quem precisar alterar amostras deve usar
+writable. Versões gravadas por outros workers são detectadas pela versão
+do arquivo (base e log de entradas, storage.logged_version) e carregadas
+na próxima leitura.
+"""
+import threading
+from collections import namedtuple
+
+from storage import logged_version, read_logged
+
+Snapshot = namedtuple("Snapshot", ["version", "samples"])
+
+
+class SnapshotStore:
+    """
+    Versão corrente (somente leitura) de cada arquivo de amostras
+
+    Args:
+        parse: converte o conteúdo do arquivo (bytes) na lista de amostras
+        replay: aplica à lista as entradas do log do arquivo (bytes, uma por linha)
+    """
+
+    def __init__(self, parse, replay=None):
+        self.parse = parse
+        self.replay = replay
+        self._snapshots = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "published": 0}
+
+    def _lock(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, path):
+        """Snapshot da versão atual do arquivo (carregado só quando a versão muda)"""
+        key = str(path)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version == logged_version(path):
+            self.stats["hits"] += 1
+            return snapshot
+        # Uma conversão por versão, mesmo com várias leituras simultâneas
+        with self._lock(key):
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.version == logged_version(path):
+                self.stats["hits"] += 1
+                return snapshot
+            version, raw, entries = read_logged(path)
+            samples = self.parse(raw) if raw else []
+            if entries and self.replay is not None:
+                self.replay(samples, entries)
+            snapshot = Snapshot(version, samples)
+            self._snapshots[key] = snapshot
+            self.stats["loads"] += 1
+            return snapshot
+
+    def writable(self, path):
+        """
+        Cópia da versão atual para a ingestão alterar (sob a trava do
+        arquivo): lista e última amostra copiadas, amostras fechadas compartilhadas
+        """
+        samples = list(self.get(path).samples)
+        if samples and isinstance(samples[-1], dict):
+            last = samples[-1]
+            samples[-1] = {**last, "Dados": list(last.get("Dados", []))}
+        return samples
+
+    def publish(self, path, samples):
+        """Registra a versão recém-gravada (sob a trava do arquivo), sem relê-la"""
+        self._snapshots[str(path)] = Snapshot(logged_version(path), samples)
+        self.stats["published"] += 1
+
+    def status(self):
+        return {
+            **self.stats,
+            "files": {key: {"version": snapshot.version, "samples": len(snapshot.samples)}
+                      for key, snapshot in list(self._snapshots.items())},
+        }
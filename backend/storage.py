@@ -0,0 +1,166 @@
+"""
+Armazenamento em arquivo compartilhado entre processos
+
+Permite rodar a API com vários workers (uvicorn --workers N) sobre os
+mesmos arquivos de dados:
+
+- file_lock: trava exclusiva entre processos em um arquivo .lock ao lado
+  do arquivo protegido (fcntl no Linux/macOS, msvcrt no Windows); toda
+  leitura-modificação-gravação acontece dentro dela
+- atomic_write: grava em um temporário e substitui com os.replace, então
+  leitores (sem trava) sempre veem uma versão completa do arquivo
+- file_version: identifica a versão gravada (inode, mtime, tamanho); cada
+  substituição gera uma versão nova, igual para todos os processos
+- read_versioned: lê o arquivo junto com a versão do que foi lido
+- append_log / read_logged: log de entradas (uma por linha) ao lado do
+  arquivo, para gravar só o que mudou em vez de substituir o arquivo
+  inteiro; replace_logged incorpora o log (compactação). A primeira linha
+  do log é a versão do arquivo base a que ele se aplica, então um log
+  antigo (base substituído) nunca é aplicado ao base novo
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Travas entre threads do mesmo processo (flock é por descritor, e o
+# msvcrt não bloqueia threads do mesmo processo de forma confiável)
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path):
+    """Trava exclusiva (entre threads e processos) associada ao arquivo"""
+    lock_path = str(Path(path)) + ".lock"
+    with _thread_lock(lock_path):
+        with open(lock_path, "a+b") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                # LK_LOCK tenta por ~10 s; repete até conseguir
+                while True:
+                    try:
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path, text):
+    """Substitui o conteúdo do arquivo de forma atômica"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent or ".", prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _version(stat):
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def file_version(path):
+    """Versão do arquivo (inode, mtime_ns, tamanho), obtida sem lê-lo"""
+    try:
+        return _version(os.stat(path))
+    except FileNotFoundError:
+        return (0, 0, 0)
+
+
+def read_versioned(path):
+    """
+    Conteúdo do arquivo e a versão exata do que foi lido: (versão, bytes)
+    A versão vem do descritor aberto, então uma substituição concorrente
+    (atomic_write) não mistura a versão nova com o conteúdo antigo
+    """
+    try:
+        with open(path, "rb") as f:
+            return _version(os.fstat(f.fileno())), f.read()
+    except FileNotFoundError:
+        return (0, 0, 0), b""
+
+
+def log_path(path):
+    return f"{path}.log"
+
+
+def logged_version(path):
+    """Versão do arquivo com o log: (versão do base, versão do log)"""
+    return (file_version(path), file_version(log_path(path)))
+
+
+def append_log(path, line):
+    """Acrescenta uma entrada (uma linha, sem quebras) ao log do arquivo, sob a trava do arquivo"""
+    header = json.dumps(list(file_version(path))).encode() + b"\n"
+    with open(log_path(path), "a+b") as f:
+        if f.tell():
+            f.seek(0)
+            if f.readline() != header:
+                # Compactação interrompida antes de apagar o log: já está no base
+                f.truncate(0)
+            else:
+                header = b""
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Gravação interrompida: fecha a linha incompleta
+                    header = b"\n"
+        # Uma única escrita: leitores sem trava veem no máximo uma linha incompleta no fim
+        f.write(header + line.encode("utf-8") + b"\n")
+
+
+def read_logged(path):
+    """
+    Base e log lidos juntos: ((versão do base, versão do log), bytes do base, entradas)
+
+    Entradas são as linhas completas do log (uma linha incompleta no fim é
+    uma gravação em andamento e fica para a próxima leitura); o log é
+    ignorado se foi escrito para outra versão do base
+    """
+    while True:
+        version, raw = read_versioned(path)
+        log_version, log_raw = read_versioned(log_path(path))
+        # Base substituído durante a leitura (compactação): lê de novo
+        if file_version(path) == version:
+            break
+    lines = log_raw.split(b"\n")[:-1]
+    entries = lines[1:] if lines and json.loads(lines[0]) == list(version) else []
+    return (version, log_version), raw, entries
+
+
+def replace_logged(path, text):
+    """Substitui o arquivo (atomic_write) e descarta o log, já incorporado em text"""
+    atomic_write(path, text)
+    try:
+        os.unlink(log_path(path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,155 @@
+"""
+Gerador vetorizado de dados sintéticos com cenários de desvio do processo
+
+Gera matrizes de subgrupos (m x n) com NumPy, sem laços em Python, e
+aplica cenários que simulam causas especiais: deslocamento da média,
+tendência, ciclos, mudança de variância, estratificação, mistura e pontos
+isolados. As magnitudes dos cenários são dadas em múltiplos do desvio
+padrão de X-barra (std_dev / sqrt(n)), de modo que cada preset dispare
+a regra do Western Electric correspondente no gráfico X-barra.
+
+Exemplo:
+    subgroups = generate_subgroups(
+        1_000_000, mean_temp=23.0, std_dev=1.5, seed=42,
+        scenarios=[{"type": "shift", "start": 500, "length": 20, "magnitude": 2.0}],
+    )
+    write_samples(subgroups, "temperature_data.json")
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+SCENARIO_TYPES = (
+    "shift", "trend", "cycle", "variance", "stratification",
+    "alternating", "mixture", "outlier",
+)
+
+# Cenário que dispara cada regra do Western Electric (magnitudes em sigma de X-barra)
+RULE_PRESETS = {
+    1: {"type": "outlier", "length": 1, "magnitude": 5.0},
+    2: {"type": "shift", "length": 15, "magnitude": 2.0},
+    3: {"type": "trend", "length": 10, "magnitude": 3.0},
+    4: {"type": "alternating", "length": 20, "magnitude": 2.0},
+    5: {"type": "shift", "length": 6, "magnitude": 3.0},
+    6: {"type": "shift", "length": 8, "magnitude": 2.0},
+    7: {"type": "stratification", "length": 20, "magnitude": 0.1},
+    8: {"type": "mixture", "length": 16, "magnitude": 3.0},
+}
+
+
+def rule_scenario(rule, start, length=None):
+    """Cenário que dispara a regra `rule` a partir do subgrupo `start`"""
+    scenario = dict(RULE_PRESETS[rule])
+    scenario["start"] = start
+    if length is not None:
+        scenario["length"] = length
+    return scenario
+
+
+def _apply_scenario(values, scenario, sigma_x_bar, rng):
+    """Aplica um cenário (in-place) na matriz de subgrupos"""
+    kind = scenario["type"]
+    m = values.shape[0]
+    start = int(scenario.get("start", 0))
+    stop = min(m, start + int(scenario.get("length", m - start)))
+    if start >= stop:
+        return
+    block = values[start:stop]
+    steps = np.arange(stop - start)
+    magnitude = float(scenario.get("magnitude", 1.0))
+
+    if kind == "shift":
+        # Deslocamento da média
+        block += magnitude * sigma_x_bar
+    elif kind == "trend":
+        # Tendência linear: magnitude = incremento por subgrupo
+        block += (steps * magnitude * sigma_x_bar)[:, None]
+    elif kind == "cycle":
+        # Ciclo senoidal: magnitude = amplitude, period = subgrupos por ciclo
+        period = float(scenario.get("period", 8))
+        block += (magnitude * sigma_x_bar * np.sin(2 * np.pi * steps / period))[:, None]
+    elif kind == "variance":
+        # Mudança de variância: magnitude = fator multiplicativo do desvio
+        centers = block.mean(axis=1, keepdims=True)
+        block[:] = centers + (block - centers) * magnitude
+    elif kind == "stratification":
+        # Pontos "colados" na linha central: média dos subgrupos comprimida
+        centers = block.mean(axis=1, keepdims=True)
+        target = values.mean()
+        block += (target + (centers - target) * magnitude) - centers
+    elif kind == "alternating":
+        # Sobe e desce alternadamente
+        signs = np.where(steps % 2 == 0, -1.0, 1.0)
+        block += (signs * magnitude * sigma_x_bar)[:, None]
+    elif kind == "mixture":
+        # Mistura de duas populações: pontos longe da linha central, dos dois lados
+        signs = rng.choice([-1.0, 1.0], size=stop - start)
+        block += (signs * magnitude * sigma_x_bar)[:, None]
+    elif kind == "outlier":
+        block += magnitude * sigma_x_bar
+    else:
+        raise ValueError(f"Cenário desconhecido: {kind} (use um de {', '.join(SCENARIO_TYPES)})")
+
+
+def generate_subgroups(num_samples, readings_per_sample=5, mean_temp=23.0, std_dev=5.0,
+                       scenarios=None, seed=None, decimals=2):
+    """
+    Gera a matriz de subgrupos (num_samples x readings_per_sample)
+
+    Args:
+        num_samples: número de subgrupos
+        readings_per_sample: leituras por subgrupo
+        mean_temp: média do processo
+        std_dev: desvio padrão das leituras individuais
+        scenarios: lista de cenários ({"type", "start", "length", "magnitude", ...})
+        seed: semente do gerador (reprodutibilidade)
+        decimals: casas decimais (None = sem arredondamento)
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(mean_temp, std_dev, size=(num_samples, readings_per_sample))
+    sigma_x_bar = std_dev / np.sqrt(readings_per_sample)
+
+    for scenario in scenarios or []:
+        _apply_scenario(values, scenario, sigma_x_bar, rng)
+
+    if decimals is not None:
+        np.round(values, decimals, out=values)
+    return values
+
+
+def to_samples(subgroups, start_number=1):
+    """Converte a matriz para o formato do backend ({"Amostra", "Dados"})"""
+    return [
+        {"Amostra": str(start_number + i), "Dados": row}
+        for i, row in enumerate(np.asarray(subgroups).tolist())
+    ]
+
+
+def write_samples(subgroups, target, chunk_size=100_000, start_number=1):
+    """
+    Grava os subgrupos no destino
+
+    Args:
+        target: caminho de arquivo JSON, ou função chamada com cada bloco de
+            amostras (lista de {"Amostra", "Dados"}) para outros armazenamentos
+        chunk_size: subgrupos por bloco (limita a memória com milhões de subgrupos)
+    """
+    subgroups = np.asarray(subgroups)
+    m = subgroups.shape[0]
+
+    if callable(target):
+        for offset in range(0, m, chunk_size):
+            target(to_samples(subgroups[offset:offset + chunk_size], start_number + offset))
+        return
+
+    path = Path(target)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for offset in range(0, m, chunk_size):
+            chunk = to_samples(subgroups[offset:offset + chunk_size], start_number + offset)
+            text = json.dumps(chunk, ensure_ascii=False)[1:-1]
+            if offset and text:
+                f.write(",")
+            f.write(text)
+        f.write("]")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Script para testar o pipeline de alertas (alerting.py)
+
+- cada preset de regra do synthetic_data gera alerta da regra esperada
+- uma violação que persiste gera um único alerta (debounce)
+- um sink que falha é retentado; um sink lento não atrasa os demais
+- a ingestão pela API não espera a entrega dos alertas
+
+Uso:
+    python test_alerting.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from alerting import AlertPipeline, FeedSink  # noqa: E402
+from channel_config import ChannelConfig  # noqa: E402
+from synthetic_data import generate_subgroups, rule_scenario, to_samples  # noqa: E402
+
+CONFIG = ChannelConfig(name="temperature", data_file="unused.json", lse=28.0, lie=18.0)
+
+
+class FlakySink:
+    """Falha nas primeiras `failures` entregas"""
+    name = "flaky"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.received = []
+
+    def send(self, alert):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("destino indisponível")
+        self.received.append(alert)
+
+
+class SlowSink:
+    name = "slow"
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def send(self, alert):
+        time.sleep(self.delay)
+
+
+def run_pipeline(samples, sinks, **kwargs):
+    pipeline = AlertPipeline(lambda name: CONFIG, lambda name: [], sinks, **kwargs)
+    for worker in pipeline.workers:
+        worker.backoff = 0.01
+    pipeline.start()
+    for sample in samples:
+        pipeline.submit("temperature", [sample])
+    pipeline.stop()
+    return pipeline
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def test_rule_presets():
+    ok = True
+    for rule in range(1, 9):
+        subgroups = generate_subgroups(
+            80, mean_temp=23.0, std_dev=1.0, seed=42 + rule,
+            scenarios=[rule_scenario(rule, 60)], decimals=None,
+        )
+        feed = FeedSink()
+        run_pipeline(to_samples(subgroups), [feed], window=60)
+        rules = {alert["rule"] for alert in feed.recent(limit=500) if alert["chart"] == "X-bar"}
+        ok &= check(f"rule_{rule}" in rules, f"Preset da regra {rule} gera alerta (regras: {sorted(rules)})")
+    return ok
+
+
+def test_debounce():
+    # Deslocamento longo: a regra 2 fica violada por muitos subgrupos seguidos
+    subgroups = generate_subgroups(
+        120, mean_temp=23.0, std_dev=1.0, seed=7,
+        scenarios=[rule_scenario(2, 60, length=60)], decimals=None,
+    )
+    feed = FeedSink()
+    run_pipeline(to_samples(subgroups), [feed], window=60, cooldown=3600)
+    rule_2 = [alert for alert in feed.recent(limit=500) if alert["rule"] == "rule_2"]
+    return check(len(rule_2) == 1, f"Violação persistente da regra 2 gera um único alerta ({len(rule_2)})")
+
+
+def test_retries_and_fan_out():
+    subgroups = generate_subgroups(40, mean_temp=23.0, std_dev=1.0, seed=3,
+                                   scenarios=[rule_scenario(1, 30)], decimals=None)
+    flaky, feed = FlakySink(failures=2), FeedSink()
+    start = time.perf_counter()
+    pipeline = run_pipeline(to_samples(subgroups), [flaky, feed, SlowSink(0.2)])
+    elapsed = time.perf_counter() - start
+    ok = check(len(flaky.received) == len(feed.recent(limit=500)) > 0,
+               f"Sink instável recebe todos os alertas após novas tentativas "
+               f"({pipeline.status()['sinks']['flaky']['retries']} tentativas extras)")
+    ok &= check(elapsed < 5, f"Sink lento não bloqueia o pipeline ({elapsed:.2f} s)")
+    return ok
+
+
+def test_stop_with_full_queue():
+    """Fila do avaliador cheia: o encerramento respeita o timeout"""
+    release = threading.Event()
+
+    def blocked_samples(name):
+        release.wait()
+        return []
+
+    pipeline = AlertPipeline(lambda name: CONFIG, blocked_samples, [], maxsize=2)
+    pipeline.start()
+    sample = to_samples(generate_subgroups(1, seed=1, decimals=None))
+    for _ in range(4):
+        pipeline.submit("temperature", sample)
+    time.sleep(0.05)
+    start = time.perf_counter()
+    pipeline.stop(timeout=0.3)
+    elapsed = time.perf_counter() - start
+    release.set()
+    return check(elapsed < 2, f"Encerramento com a fila cheia não trava ({elapsed:.2f} s)")
+
+
+def test_api_latency():
+    """POST /data com um webhook lento: a resposta não espera a entrega"""
+    with tempfile.TemporaryDirectory(prefix="cep_alerts_") as tmp:
+        os.chdir(tmp)
+        os.environ["CEP_WARMUP"] = "0"
+        from fastapi.testclient import TestClient
+        import main
+
+        main.alerts.workers[0].sink.send = lambda alert: time.sleep(1.0)
+        with TestClient(main.app) as client:
+            client.delete("/history")
+            subgroups = generate_subgroups(40, mean_temp=23.0, std_dev=1.0, seed=5,
+                                           scenarios=[rule_scenario(1, 30)], decimals=None)
+            latencies = []
+            for value in subgroups.ravel().tolist():
+                start = time.perf_counter()
+                assert client.post("/data", json={"temperature": value}).status_code == 201
+                latencies.append(time.perf_counter() - start)
+            status = client.get("/alerts/status").json()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        ok = check(status["alerts"] > 0, f"Ingestão pela API gerou {status['alerts']} alerta(s)")
+        ok &= check(p99 < 500, f"Latência do POST /data com sink de 1 s: p99 = {p99:.1f} ms")
+        return ok
+
+
+def main():
+    print("Testando o pipeline de alertas...")
+    print("=" * 70)
+    ok = test_rule_presets()
+    ok &= test_debounce()
+    ok &= test_retries_and_fan_out()
+    ok &= test_stop_with_full_queue()
+    ok &= test_api_latency()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no pipeline de alertas")
+        sys.exit(1)
+    print("✓ Pipeline de alertas funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
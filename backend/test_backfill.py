@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Script para testar o reprocessamento do histórico (backfill.py)
+
+- resultados iguais aos da ingestão/análise direta com a nova configuração
+  (resumos reagrupados, capacidade por janela, limites e regras)
+- blocos em processos separados dão o mesmo resultado que na thread do job
+- job interrompido retomado sem refazer os blocos concluídos
+- histórico alterado depois do início: o job falha em vez de misturar versões
+- ingestão continua durante o backfill; progresso e resultado pela API
+
+Uso:
+    python test_backfill.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from backfill import BackfillJob, BackfillRunner, _pool_context  # noqa: E402
+from capability import capability_for_channels, summaries_to_stats  # noqa: E402
+from channel_config import ChannelConfig  # noqa: E402
+from control_charts import create_chart, feed_samples  # noqa: E402
+from ingestion import append_readings, complete_summaries  # noqa: E402
+
+# Histórico gravado com subgrupos de 5; a configuração passou a 4
+CONFIG = ChannelConfig(name="temperature", data_file="temperature_data.json",
+                       sample_size=4, lse=27.0, lie=19.0, chart_type="X-S")
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def history(n=20_003, seed=5):
+    rng = np.random.default_rng(seed)
+    return rng.normal(23.0, 0.9, n).round(2).tolist()
+
+
+def runner_for(directory, readings, workers=0, rate=0):
+    return BackfillRunner(directory, lambda name: CONFIG, lambda name: readings, workers=workers, rate=rate)
+
+
+def wait_job(runner, timeout=120):
+    deadline = time.monotonic() + timeout
+    while runner.active and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return runner.status(runner.job.id)
+
+
+def reference(readings, window, step):
+    """Mesma análise feita direto: ingestão com o novo tamanho e análise do canal"""
+    data = []
+    append_readings(data, readings, CONFIG.sample_size)
+    summaries = complete_summaries(data, CONFIG.sample_size)
+    chart = feed_samples(create_chart(CONFIG.chart_type, sample_size=CONFIG.sample_size), data).analysis()
+    stats = summaries_to_stats(summaries)
+    rolling = capability_for_channels(
+        {"temperature": (stats, CONFIG.sample_size, CONFIG.lse, CONFIG.lie)}, window=window, step=step
+    )["temperature"]
+    return summaries, chart, rolling
+
+
+def load_result(job):
+    return json.loads(job.result_path("temperature").read_text(encoding="utf-8"))
+
+
+def test_results(directory):
+    readings = history()
+    runner = runner_for(directory, readings)
+    job = runner.start(["temperature"], window=30, step=7, chunk_size=400)
+    status = wait_job(runner)
+    result = load_result(job)
+    summaries, chart, rolling = reference(readings, 30, 7)
+
+    ok = check(status["status"] == "completed" and status["progress"] == 100.0,
+               f"Job concluído: {status['chunks_done']}/{status['chunks']} blocos")
+    ok &= check([s["media"] for s in result["summaries"]] == [s["media"] for s in summaries]
+                and result["subgroups"] == len(summaries) == 5000,
+                f"{result['subgroups']} resumos reagrupados em subgrupos de {CONFIG.sample_size}")
+    ok &= check(result["chart"]["lsc"] == chart["lsc"] and result["chart"]["western_rules"] == chart["western_rules"],
+                f"Limites e regras do gráfico {result['chart_type']} iguais aos da análise direta")
+    ok &= check(all(np.allclose(result["capability"]["rolling"][key], rolling[key]) for key in ("cp", "cpk", "pp", "ppk"))
+                and len(result["capability"]["rolling"]["cp"]) == len(rolling["cp"]),
+                f"Capacidade em {len(rolling['cp'])} janelas igual à de /cep/capability")
+    ok &= check(job.result_path("temperature", "png").read_bytes()[:4] == b"\x89PNG", "Imagem do gráfico gravada")
+
+    processes = runner_for(directory, readings, workers=2)
+    parallel = processes.start(["temperature"], window=30, step=7, chunk_size=400)
+    wait_job(processes)
+    other = load_result(parallel)
+    ok &= check(other["summaries"] == result["summaries"]
+                and other["capability"]["rolling"] == result["capability"]["rolling"],
+                "Blocos em 2 processos: mesmo resultado")
+    ok &= check(_pool_context().get_start_method() != "fork",
+                f"Processos de cálculo criados com {_pool_context().get_start_method()} (sem fork da API)")
+    return ok
+
+
+def test_resume(directory):
+    readings = history()
+    # Limitado a 20000 subgrupos/s: ~0.5 s para o job inteiro
+    runner = runner_for(directory, readings, rate=20_000)
+    job = runner.start(["temperature"], window=30, step=7, chunk_size=400)
+    time.sleep(0.15)
+    runner.stop(job.id, status="interrupted")
+    interrupted = runner.status(job.id)
+    ok = check(interrupted["status"] == "interrupted" and 0 < interrupted["chunks_done"] < interrupted["chunks"],
+               f"Job interrompido em {interrupted['progress']}%")
+
+    # Processo interrompido no meio da gravação de um bloco
+    with open(job.chunks_path, "a", encoding="utf-8") as f:
+        f.write('{"channel": "temperature", "phase"')
+    done_before = interrupted["chunks_done"]
+
+    resumed = runner_for(directory, readings)
+    resumed.resume(job.id)
+    status = wait_job(resumed)
+    lines = job.chunks_path.read_text(encoding="utf-8").splitlines()
+    keys = [(r["channel"], r["phase"], r["chunk"]) for r in map(json.loads, lines)]
+    ok &= check(status["status"] == "completed" and len(keys) == len(set(keys)) == status["chunks"],
+                f"Retomado a partir de {done_before} blocos, sem refazer nenhum ({len(keys)} gravados)")
+    summaries, chart, _ = reference(readings, 30, 7)
+    result = load_result(job)
+    ok &= check([s["media"] for s in result["summaries"]] == [s["media"] for s in summaries]
+                and result["chart"]["lsc"] == chart["lsc"], "Resultado do job retomado igual ao da análise direta")
+
+    # Histórico limpo antes de retomar outro job
+    runner = runner_for(directory, readings, rate=20_000)
+    job = runner.start(["temperature"], chunk_size=400)
+    time.sleep(0.05)
+    runner.stop(job.id)
+    cleared = runner_for(directory, readings[:100])
+    cleared.resume(job.id)
+    status = wait_job(cleared)
+    ok &= check(status["status"] == "failed" and "mudou" in status["error"],
+                f"Histórico alterado: job falha ({status['error']})")
+    ok &= check(BackfillJob.load(directory, "../../etc/passwd") is None, "Identificador de job inválido recusado")
+    return ok
+
+
+def test_api():
+    with tempfile.TemporaryDirectory(prefix="cep_backfill_") as tmp:
+        os.chdir(tmp)
+        os.environ["CEP_WARMUP"] = "0"
+        os.environ["ALERTS_ENABLED"] = "0"
+        os.environ["ADMIN_TOKEN"] = "segredo"
+        os.environ["BACKFILL_WORKERS"] = "1"
+        import logging
+        from fastapi.testclient import TestClient
+        import main
+        logging.getLogger("main").setLevel(logging.WARNING)
+
+        admin = {"X-Admin-Token": "segredo"}
+        with TestClient(main.app) as client:
+            client.delete("/history/all")
+            values = history(40_000)
+            for i in range(0, len(values), 1000):
+                main.ingest_readings("temperature", values[i:i + 1000])
+
+            def ingest_rate(seconds):
+                # Canal vazio a cada medição: o custo da gravação cresce com o arquivo
+                main.clear_channel("humidity")
+                count, deadline = 0, time.perf_counter() + seconds
+                while time.perf_counter() < deadline:
+                    main.ingest_readings("humidity", [55.0 + count % 5])
+                    count += 1
+                return count / seconds
+
+            baseline = ingest_rate(1.0)
+            ok = check(client.post("/admin/backfill/start").status_code == 403,
+                       "Backfill recusa requisições sem o token")
+            response = client.post("/admin/backfill/start", params={"channel": "temperature", "chunk_size": 250},
+                                   headers=admin)
+            job_id = response.json()["id"]
+            ok &= check(response.status_code == 200 and response.json()["active"], f"Job {job_id} iniciado")
+            ok &= check(client.post("/admin/backfill/start", headers=admin).status_code == 409,
+                        "Segundo job simultâneo recusado (409)")
+
+            rates = []
+            progress = []
+            poller = threading.Thread(target=lambda: rates.append(ingest_rate(1.0)))
+            poller.start()
+            while True:
+                status = client.get(f"/admin/backfill/jobs/{job_id}", headers=admin).json()
+                progress.append(status["progress"])
+                if not status["active"]:
+                    break
+                time.sleep(0.05)
+            poller.join()
+            ok &= check(status["status"] == "completed" and progress == sorted(progress) and len(set(progress)) > 2,
+                        f"Progresso acompanhado em {len(progress)} consultas até {status['progress']}%")
+            ok &= check(rates[0] > 0.6 * baseline,
+                        f"Ingestão durante o backfill: {rates[0]:.0f} lotes/s (sozinha: {baseline:.0f} lotes/s)")
+
+            result = client.get(f"/admin/backfill/jobs/{job_id}/result/temperature", headers=admin).json()
+            ok &= check(result["subgroups"] == 8000 and "summaries" not in result
+                        and result["capability"]["overall"]["subgroups"] == 8000,
+                        f"Resultado: {result['subgroups']} subgrupos, Cpk {result['capability']['overall']['cpk']:.3f}")
+            chart = client.get(f"/admin/backfill/jobs/{job_id}/chart/temperature", headers=admin)
+            ok &= check(chart.status_code == 200 and chart.headers["content-type"] == "image/png", "Gráfico em PNG")
+            jobs = client.get("/admin/backfill/jobs", headers=admin).json()["jobs"]
+            ok &= check([job["id"] for job in jobs] == [job_id], "Job listado")
+            ok &= check(client.get("/admin/backfill/jobs/20000101-000000-abcdef", headers=admin).status_code == 404
+                        and client.post(f"/admin/backfill/jobs/{job_id}/resume", headers=admin).status_code == 409,
+                        "Job inexistente (404) e job concluído não é retomado (409)")
+        return ok
+
+
+def main():
+    print("Testando o reprocessamento do histórico...")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory(prefix="cep_backfill_jobs_") as tmp:
+        ok = test_results(tmp)
+        ok &= test_resume(tmp)
+    ok &= test_api()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no reprocessamento do histórico")
+        sys.exit(1)
+    print("✓ Reprocessamento do histórico funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
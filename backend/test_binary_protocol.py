@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Script para testar o protocolo binário de ingestão (binary_protocol.py)
+
+- quadros codificados e decodificados sem perda (centésimos, ausentes)
+- quadros malformados ou truncados levantam ValueError, em qualquer ponto
+  do corpo
+- timestamps de 32 bits completados e leituras agrupadas por canal
+
+Uso:
+    python test_binary_protocol.py
+"""
+
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from binary_protocol import (  # noqa: E402
+    HEADER, MAGIC, MAX_CHANNELS, VERSION, decode_frames, encode_frame, timed_readings_by_channel,
+)
+
+NOW = 1_700_000_000_000
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def body():
+    """Dois quadros: temperatura e umidade (com uma leitura ausente) e só temperatura"""
+    first = encode_frame(7, [1, 2], [NOW % 2**32, (NOW + 1000) % 2**32], [[23.45, 55.1], [23.5, np.nan]])
+    second = encode_frame(8, [1], [(NOW + 2000) % 2**32], [[-4.07]])
+    return first, second
+
+
+def rejects(payload):
+    try:
+        decode_frames(payload)
+    except ValueError:
+        return True
+    return False
+
+
+def test_round_trip():
+    print("\n📋 Quadros válidos")
+    first, second = body()
+    frames = decode_frames(first + second)
+    ok = check(decode_frames(b"") == [], "Corpo vazio: nenhum quadro")
+    ok &= check([(frame.device_id, frame.channel_ids) for frame in frames] == [(7, [1, 2]), (8, [1])],
+                "Dois quadros seguidos no mesmo corpo")
+    values = frames[0].values
+    ok &= check(values[0].tolist() == [23.45, 55.1] and values[1, 0] == 23.5 and np.isnan(values[1, 1])
+                and frames[1].values[0, 0] == -4.07, "Valores em centésimos; -32768 vira NaN")
+    ok &= check(len(first) == HEADER.size + 2 + 2 * 8, f"Registro com dois canais em 8 bytes ({len(first)} no quadro)")
+
+    readings = timed_readings_by_channel(frames, NOW + 5000)
+    ok &= check(readings == {1: ([NOW, NOW + 1000, NOW + 2000], [23.45, 23.5, -4.07]), 2: ([NOW], [55.1])},
+                "Leituras por canal com os timestamps completos, sem as ausentes")
+    return ok
+
+
+def test_malformed():
+    print("\n📋 Quadros malformados")
+    first, second = body()
+    payload = first + second
+    header = bytearray(first)
+
+    ok = check(rejects(payload[:HEADER.size - 1]), "Cabeçalho incompleto")
+    bad = bytearray(header)
+    bad[:2] = b"XX"
+    ok &= check(rejects(bytes(bad)), "Assinatura inválida")
+    bad = bytearray(header)
+    bad[2] = VERSION + 1
+    ok &= check(rejects(bytes(bad)), "Versão não suportada")
+    for n_channels in (0, MAX_CHANNELS + 1):
+        frame = HEADER.pack(MAGIC, VERSION, n_channels, 1, 0)
+        ok &= check(rejects(frame), f"{n_channels} canais")
+    frame = HEADER.pack(MAGIC, VERSION, 1, 1, 3) + bytes([1]) + struct.pack("<Ih", NOW % 2**32, 2345)
+    ok &= check(rejects(frame), "Menos registros do que n_records")
+    ok &= check(rejects(payload + b"\x00"), "Bytes sobrando após o último quadro")
+
+    # Corpo cortado em qualquer ponto que não seja o fim de um quadro
+    cuts = [cut for cut in range(1, len(payload)) if cut != len(first)]
+    ok &= check(all(rejects(payload[:cut]) for cut in cuts), f"Corpo truncado em {len(cuts)} pontos diferentes")
+    ok &= check(len(decode_frames(payload[:len(first)])) == 1, "Corte no fim de um quadro: quadro completo")
+    return ok
+
+
+def main():
+    print("Testando o protocolo binário...")
+    print("=" * 70)
+    ok = test_round_trip()
+    ok &= test_malformed()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no protocolo binário")
+        sys.exit(1)
+    print("✓ Protocolo binário funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Script para testar o cache de renderização (chart_rendering.py)
+
+- RenderCache: faltas e acertos contados, descarte do item menos usado
+- render_chart: o gráfico só é montado e renderizado na primeira
+  visualização de cada impressão digital e formato
+
+Uso:
+    python test_chart_rendering.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import chart_rendering  # noqa: E402
+from chart_rendering import RenderCache, chart_fingerprint, render_chart  # noqa: E402
+from control_charts import create_chart, feed_samples  # noqa: E402
+from ingestion import append_readings  # noqa: E402
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def test_render_cache():
+    print("\n📋 RenderCache")
+    cache = RenderCache(maxsize=2)
+    ok = check(cache.get("a") is None and (cache.hits, cache.misses) == (0, 1), "Chave ausente: falta")
+    cache.put("a", b"A")
+    cache.put("b", b"B")
+    ok &= check(cache.get("a") == b"A" and (cache.hits, cache.misses) == (1, 1), "Chave presente: acerto")
+
+    # "a" acabou de ser usada: a menos usada é "b"
+    cache.put("c", b"C")
+    ok &= check(cache.get("b") is None and cache.get("a") == b"A" and cache.get("c") == b"C",
+                "Acima de maxsize, descarta a menos usada")
+    ok &= check((cache.hits, cache.misses) == (3, 2), f"Acertos {cache.hits}, faltas {cache.misses}")
+
+    cache.put("a", b"A2")
+    ok &= check(cache.get("a") == b"A2", "Nova renderização substitui a anterior")
+    return ok
+
+
+def test_render_chart():
+    print("\n📋 render_chart")
+    chart_rendering.chart_cache = RenderCache()
+    data = []
+    append_readings(data, np.random.default_rng(0).normal(23.0, 0.5, 100).round(2).tolist(), 5)
+    builds = []
+
+    def build_analysis():
+        builds.append(1)
+        chart = create_chart("X-R", sample_size=5)
+        feed_samples(chart, data)
+        return chart.analysis()
+
+    fingerprint = chart_fingerprint("temperature", (1, 2, 3), "X-R")
+    first = render_chart(fingerprint, build_analysis, "Temperatura", "svg")
+    second = render_chart(fingerprint, build_analysis, "Temperatura", "svg")
+    ok = check(first == second and first.lstrip().startswith(b"<") and len(builds) == 1,
+               "Segunda visualização vem do cache, sem montar o gráfico")
+    png = render_chart(fingerprint, build_analysis, "Temperatura", "png")
+    ok &= check(png.startswith(b"\x89PNG") and len(builds) == 2, "Outro formato: falta")
+    render_chart(chart_fingerprint("temperature", (1, 2, 4), "X-R"), build_analysis, "Temperatura", "svg")
+    ok &= check(len(builds) == 3, "Nova versão dos dados: falta")
+    cache = chart_rendering.chart_cache
+    ok &= check((cache.hits, cache.misses) == (1, 3), f"Acertos {cache.hits}, faltas {cache.misses}")
+    try:
+        render_chart(fingerprint, build_analysis, "Temperatura", "gif")
+        ok &= check(False, "Formato desconhecido recusado")
+    except ValueError:
+        ok &= check(len(builds) == 3, "Formato desconhecido recusado")
+    return ok
+
+
+def main():
+    print("Testando o cache de renderização...")
+    print("=" * 70)
+    ok = test_render_cache()
+    ok &= test_render_chart()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no cache de renderização")
+        sys.exit(1)
+    print("✓ Cache de renderização funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
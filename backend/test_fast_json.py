@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Script para testar o caminho rápido de serialização (fast_json.py)
+
+- HistoryEncoder gera os mesmos bytes que json.dumps do HistoryResponse
+  (JSON compacto), com e sem limit, com orjson e com o fallback
+- os fragmentos em cache acompanham o histórico: leitura nova na amostra
+  em aberto, amostras novas e histórico substituído
+
+Uso:
+    python test_fast_json.py
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import fast_json  # noqa: E402
+from fast_json import HistoryEncoder, canonical_sample  # noqa: E402
+from ingestion import append_readings  # noqa: E402
+
+SAMPLE_SIZE = 5
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def expected_body(data, limit=None):
+    """Corpo do HistoryResponse serializado com json.dumps"""
+    samples = [canonical_sample(sample) for sample in data]
+    return json.dumps({
+        "samples": samples[-limit:] if limit else samples,
+        "total_samples": len(data),
+        "total_readings": sum(len(sample["Dados"]) for sample in data),
+        "current_sample": samples[-1] if samples else None,
+    }, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def readings(n, seed):
+    return np.random.default_rng(seed).normal(23.0, 0.8, n).round(2).tolist()
+
+
+def next_snapshot(data, values):
+    """Como na ingestão: amostras fechadas compartilhadas, só a última copiada"""
+    snapshot = list(data)
+    if snapshot:
+        snapshot[-1] = dict(snapshot[-1], Dados=list(snapshot[-1]["Dados"]))
+    append_readings(snapshot, values, SAMPLE_SIZE, now="2024-01-01T00:00:00")
+    return snapshot
+
+
+def same_bytes(encoder, data, label):
+    ok = True
+    for limit in (None, 1, 10, len(data) + 5):
+        ok &= encoder.encode(data, limit) == expected_body(data, limit)
+    return check(ok, f"{label}: {len(data)} amostras, bytes iguais ao json.dumps (com e sem limit)")
+
+
+def test_history_encoder():
+    print(f"\n📋 HistoryEncoder ({'orjson' if fast_json.orjson is not None else 'json'})")
+    encoder = HistoryEncoder()
+    ok = same_bytes(encoder, [], "Histórico vazio")
+
+    data = next_snapshot([], readings(1003, seed=0))
+    ok &= same_bytes(encoder, data, "Amostra em aberto")
+    data = next_snapshot(data, [23.41])
+    ok &= same_bytes(encoder, data, "Leitura nova na amostra em aberto")
+    data = next_snapshot(data, readings(52, seed=1))
+    ok &= same_bytes(encoder, data, "Amostras novas")
+
+    # Mesmo tamanho, outras amostras (ex.: histórico apagado e regravado)
+    replaced = next_snapshot([], readings(len(data) * SAMPLE_SIZE, seed=2))
+    ok &= same_bytes(encoder, replaced, "Histórico substituído")
+    ok &= same_bytes(encoder, replaced[:10], "Histórico encurtado")
+
+    # Amostras como vêm do arquivo: número inteiro e leituras sem casas decimais
+    raw = [{"Amostra": 1, "Dados": [23, 24, 22, 23, 25]}, {"Amostra": "2", "Dados": [22.5]}]
+    ok &= same_bytes(HistoryEncoder(), raw, "Formato do arquivo normalizado")
+    return ok
+
+
+def test_dumps():
+    print("\n📋 dumps/loads")
+    value = {"Amostra": "1", "Dados": [23.45, 0.1 + 0.2, -0.0, 1e-7], "Resumo": {"unidade": "°C"}}
+    encoded = fast_json.dumps(value)
+    ok = check(isinstance(encoded, bytes) and fast_json.loads(encoded) == value
+               and fast_json.loads(encoded.decode("utf-8")) == value,
+               "Ida e volta sem perda (bytes e str, texto não ASCII)")
+    return ok
+
+
+def main():
+    print("Testando a serialização JSON rápida...")
+    print("=" * 70)
+    ok = test_history_encoder()
+    ok &= test_dumps()
+    if fast_json.orjson is not None:
+        # Fallback (json da biblioteca padrão), como sem orjson instalado
+        orjson, fast_json.orjson = fast_json.orjson, None
+        try:
+            ok &= test_history_encoder()
+            ok &= test_dumps()
+        finally:
+            fast_json.orjson = orjson
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas na serialização JSON rápida")
+        sys.exit(1)
+    print("✓ Serialização JSON rápida funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Script para testar o GET condicional (http_cache.py)
+
+- If-None-Match com a ETag atual (ou *) responde 304; ETag antiga, 200
+- If-Modified-Since não anterior ao Last-Modified responde 304
+- If-None-Match tem precedência sobre If-Modified-Since
+- na API, a ETag de /history muda a cada gravação do canal
+
+Uso:
+    python test_http_cache.py
+"""
+
+import os
+import sys
+import tempfile
+from email.utils import formatdate
+from pathlib import Path
+
+from starlette.requests import Request
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from http_cache import cache_headers, is_not_modified, make_etag  # noqa: E402
+
+MODIFIED_NS = 1_700_000_000_123_456_789
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def request(**headers):
+    return Request({
+        "type": "http",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_helpers():
+    print("\n📋 Validação da cópia do cliente")
+    etag = make_etag("/history", "", ((1, 2, 3), (0, 0, 0)))
+    headers = cache_headers(etag, MODIFIED_NS)
+    last_modified = headers["Last-Modified"]
+    ok = check(etag == make_etag("/history", "", ((1, 2, 3), (0, 0, 0)))
+               and etag != make_etag("/history", "", ((1, 2, 4), (0, 0, 0))),
+               "ETag estável por versão e diferente para outra versão")
+    ok &= check(headers["Cache-Control"] == "no-cache"
+                and last_modified == formatdate(MODIFIED_NS / 1e9, usegmt=True),
+                f"Cabeçalhos: ETag, no-cache e Last-Modified ({last_modified})")
+
+    ok &= check(is_not_modified(request(if_none_match=etag), etag, MODIFIED_NS),
+                "If-None-Match com a ETag atual: 304")
+    ok &= check(is_not_modified(request(if_none_match=f'"outra", W/{etag}'), etag)
+                and is_not_modified(request(if_none_match="*"), etag), "Lista de ETags, ETag fraca e *: 304")
+    ok &= check(not is_not_modified(request(if_none_match='"outra"'), etag, MODIFIED_NS), "ETag antiga: 200")
+    ok &= check(not is_not_modified(request(), etag, MODIFIED_NS), "Sem cabeçalhos condicionais: 200")
+
+    ok &= check(is_not_modified(request(if_modified_since=last_modified), etag, MODIFIED_NS)
+                and is_not_modified(request(if_modified_since=formatdate(MODIFIED_NS / 1e9 + 60, usegmt=True)),
+                                    etag, MODIFIED_NS),
+                "If-Modified-Since igual ou posterior ao Last-Modified: 304")
+    ok &= check(not is_not_modified(request(if_modified_since=formatdate(MODIFIED_NS / 1e9 - 1, usegmt=True)),
+                                    etag, MODIFIED_NS), "If-Modified-Since anterior: 200")
+    ok &= check(not is_not_modified(request(if_modified_since="ontem"), etag, MODIFIED_NS)
+                and not is_not_modified(request(if_modified_since=last_modified), etag),
+                "Data inválida ou sem Last-Modified: 200")
+    both = request(if_none_match='"outra"', if_modified_since=last_modified)
+    ok &= check(not is_not_modified(both, etag, MODIFIED_NS), "If-None-Match tem precedência sobre If-Modified-Since")
+    return ok
+
+
+def test_api():
+    print("\n📋 GET /history")
+    with tempfile.TemporaryDirectory(prefix="cep_http_cache_") as tmp:
+        os.chdir(tmp)
+        os.environ["CEP_WARMUP"] = "0"
+        os.environ["ALERTS_ENABLED"] = "0"
+        from fastapi.testclient import TestClient
+        import main
+
+        client = TestClient(main.app)
+        main.clear_channel("temperature")
+        main.ingest_readings("temperature", [23.1, 23.4, 23.2])
+
+        response = client.get("/history")
+        etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+        ok = check(response.status_code == 200 and len(response.json()["samples"]) == 1,
+                   f"Primeira leitura: 200 com ETag {etag}")
+        cached = client.get("/history", headers={"If-None-Match": etag})
+        ok &= check(cached.status_code == 304 and not cached.content and cached.headers["etag"] == etag,
+                    "If-None-Match com a ETag atual: 304 sem corpo")
+        ok &= check(client.get("/history", headers={"If-Modified-Since": last_modified}).status_code == 304,
+                    "If-Modified-Since com o Last-Modified: 304")
+        ok &= check(client.get("/history", params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200,
+                    "Outros parâmetros, outra ETag: 200")
+
+        main.ingest_readings("temperature", [23.3])
+        response = client.get("/history", headers={"If-None-Match": etag})
+        ok &= check(response.status_code == 200 and response.headers["etag"] != etag
+                    and response.json()["total_readings"] == 4, "Após uma gravação, a ETag antiga recebe 200")
+        return ok
+
+
+def main():
+    print("Testando o GET condicional...")
+    print("=" * 70)
+    ok = test_helpers()
+    ok &= test_api()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no GET condicional")
+        sys.exit(1)
+    print("✓ GET condicional funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Script para testar o consumidor do gateway MQTT (mqtt_gateway.py)
+
+- lote recusado pelo sink é entregue de novo, sem perder nem duplicar
+  leituras e na ordem de chegada
+- falhas seguidas aumentam a espera entre as tentativas
+- com o sink fora do ar, os pendentes ficam limitados a max_pending
+
+Uso:
+    python test_mqtt_gateway.py
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from mqtt_gateway import InProcessBroker, IngestionConsumer, device_topic  # noqa: E402
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    return condition
+
+
+class FlakySink:
+    """Sink que recusa as `failures` primeiras entregas"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.times = []
+        self.delivered = []
+
+    def __call__(self, batch):
+        self.calls += 1
+        self.times.append(time.monotonic())
+        if self.calls <= self.failures:
+            raise OSError("API indisponível")
+        self.delivered.extend(batch)
+
+
+def consume(sink, messages, settle=0.0, **kwargs):
+    """Publica as mensagens, espera `settle` segundos e encerra o consumidor"""
+    async def run():
+        broker = InProcessBroker()
+        consumer = IngestionConsumer(
+            broker, sink,
+            channel_names=lambda: {"temperature"},
+            binary_channels=lambda binary_id: None,
+            **kwargs,
+        )
+        consumer.start()
+        await asyncio.sleep(0)
+        for message in messages:
+            await broker.publish(device_topic(1), message)
+        await broker.drain()
+        await asyncio.sleep(settle)
+        await consumer.stop()
+        return consumer
+    return asyncio.run(run())
+
+
+def messages(n):
+    return [json.dumps({"temperature": float(i), "timestamp": 1_700_000_000_000 + i}).encode()
+            for i in range(n)]
+
+
+def delivered_values(sink):
+    return [reading["temperature"] for _, reading in sink.delivered]
+
+
+def test_retry():
+    print("\n📋 Sink falha uma vez")
+    sink = FlakySink(failures=1)
+    consumer = consume(sink, messages(20), settle=0.2, batch_size=5, retry_interval=0.05)
+    ok = check(delivered_values(sink) == [float(i) for i in range(20)],
+               f"20 leituras entregues uma vez, em ordem ({sink.calls} entregas)")
+    ok &= check(consumer.stats["sink_errors"] == 1 and consumer.stats["dropped"] == 0,
+                f"Estatísticas: {consumer.stats}")
+    ok &= check(consumer._backoff == consumer.retry_interval, "Espera volta ao valor inicial após a entrega")
+    return ok
+
+
+def test_backoff():
+    print("\n📋 Falhas seguidas")
+    sink = FlakySink(failures=3)
+    consumer = consume(sink, messages(5), settle=0.5, batch_size=5, retry_interval=0.05)
+    ok = check(delivered_values(sink) == [float(i) for i in range(5)],
+               f"Lote entregue após {consumer.stats['sink_errors']} falhas")
+    waits = [round(b - a, 2) for a, b in zip(sink.times, sink.times[1:])]
+    ok &= check(sink.calls == 4 and waits[0] >= 0.05 and waits[1] >= 0.1 and waits[2] >= 0.2,
+                f"{sink.calls} tentativas, espera crescente entre elas: {waits} s")
+    return ok
+
+
+def test_bounded_pending():
+    print("\n📋 Sink fora do ar")
+    sink = FlakySink(failures=10**9)
+    consumer = consume(sink, messages(50), batch_size=5, max_pending=20, retry_interval=10.0)
+    ok = check(consumer._pending_count <= 20, f"Pendentes limitados: {consumer._pending_count} leituras")
+    ok &= check(consumer.stats["dropped"] == 50 - consumer._pending_count,
+                f"Descartadas contadas: {consumer.stats['dropped']}")
+    values = [reading["temperature"] for _, reading in consumer._pending]
+    ok &= check(values == [float(i) for i in range(50 - len(values), 50)], "Mantém as leituras mais recentes")
+    return ok
+
+
+def main():
+    print("Testando o consumidor do gateway MQTT...")
+    print("=" * 70)
+    ok = test_retry()
+    ok &= test_backoff()
+    ok &= test_bounded_pending()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no consumidor do gateway MQTT")
+        sys.exit(1)
+    print("✓ Consumidor do gateway MQTT funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Script para testar o monitoramento multivariado (multivariate.py)
+
+- T² e correlação incrementais iguais ao cálculo direto com NumPy
+- deriva conjunta (quebra da correlação) detectada pelo T² sem que
+  nenhum canal isolado saia de ±3σ
+- leituras pareadas gravadas por POST /combined, /ingest/binary e pelo
+  gateway MQTT
+
+Uso:
+    python test_multivariate.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from multivariate import MultivariateMonitor, PairedStore  # noqa: E402
+
+CHANNELS = ("humidity", "temperature")
+
+
+def correlated_readings(n, seed, correlation=-0.8):
+    """Umidade e temperatura com correlação negativa (como no ambiente)"""
+    rng = np.random.default_rng(seed)
+    cov = [[1.0, correlation], [correlation, 1.0]]
+    z = rng.multivariate_normal([0, 0], cov, size=n)
+    return np.column_stack([55.0 + 5.0 * z[:, 0], 23.0 + 1.5 * z[:, 1]])
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def test_incremental(tmp):
+    store = PairedStore(tmp)
+    readings = correlated_readings(600, seed=1)
+    monitor = MultivariateMonitor(CHANNELS, baseline=100)
+    # Gravação e leitura em lotes de tamanhos variados
+    for chunk in np.array_split(readings, [7, 100, 101, 350, 599]):
+        store.append([dict(zip(CHANNELS, row)) for row in chunk.tolist()])
+        monitor.refresh(store)
+
+    base = readings[:100]
+    inv_cov = np.linalg.inv(np.cov(base, rowvar=False))
+    centered = readings - base.mean(axis=0)
+    t2 = np.einsum("ij,jk,ik->i", centered, inv_cov, centered)
+    ok = check(np.allclose(monitor.t2.values, t2), "T² incremental igual ao cálculo direto")
+
+    analysis = monitor.analysis(window=50, last=600)
+    rolling = np.array(analysis["rolling_correlation"]["pairs"]["humidity~temperature"], dtype=float)
+    direct = [np.corrcoef(readings[i - 49:i + 1].T)[0, 1] for i in range(49, 600)]
+    ok &= check(np.allclose(rolling, direct, atol=1e-4), "Correlação deslizante igual ao np.corrcoef")
+
+    store.clear("temperature")
+    store.append([dict(zip(CHANNELS, row)) for row in readings[:10].tolist()])
+    monitor.refresh(store)
+    ok &= check(monitor.values.size == 10, "Monitor recomeça quando o histórico pareado é limpo")
+    return ok
+
+
+def test_joint_drift(tmp):
+    store = PairedStore(tmp)
+    readings = correlated_readings(400, seed=2)
+    # Após a base, os dois canais sobem juntos 1,5σ: cada um continua dentro
+    # de ±3σ, mas o par contraria a correlação negativa
+    readings[300:] += [1.5 * 5.0, 1.5 * 1.5]
+    store.append([dict(zip(CHANNELS, row)) for row in readings.tolist()])
+    monitor = MultivariateMonitor(CHANNELS, baseline=200)
+    monitor.refresh(store)
+    analysis = monitor.analysis(window=50, last=400)
+
+    t2 = analysis["t2"]
+    drift_points = [i for i in t2["joint_only_points"] if i >= 300]
+    false_alarms = [i for i in t2["out_of_control_points"] if 200 <= i < 300]
+    ok = check(len(drift_points) >= 50,
+               f"Deriva conjunta detectada só pelo T² em {len(drift_points)} de 100 pontos")
+    ok &= check(len(false_alarms) <= 2, f"Alarmes falsos antes da deriva: {len(false_alarms)}")
+    return ok
+
+
+def mqtt_ingest(main, messages):
+    """Mensagens publicadas no broker em processo e entregues por main.ingest_batch"""
+    import asyncio
+    from mqtt_gateway import InProcessBroker, IngestionConsumer, device_topic
+
+    async def run():
+        broker = InProcessBroker()
+        consumer = IngestionConsumer(
+            broker, main.ingest_batch,
+            channel_names=main.channels.names,
+            binary_channels=lambda binary_id: getattr(main.channels.by_binary_id(binary_id), "name", None),
+        )
+        consumer.start()
+        await asyncio.sleep(0)
+        for message in messages:
+            await broker.publish(device_topic(1), message)
+        await broker.drain()
+        await consumer.stop()
+    asyncio.run(run())
+
+
+def test_api(tmp):
+    os.chdir(tmp)
+    os.environ["CEP_WARMUP"] = "0"
+    from fastapi.testclient import TestClient
+    from binary_protocol import encode_frame
+    import main
+
+    readings = correlated_readings(200, seed=3)
+    with TestClient(main.app) as client:
+        client.delete("/history/all")
+        for humidity, temperature in readings[:100].tolist():
+            client.post("/combined", json={"temperature": temperature, "humidity": humidity})
+        rest = readings[100:150]
+        frame = encode_frame(1, [0, 1], list(range(len(rest))), rest[:, ::-1])
+        client.post("/ingest/binary", content=frame)
+        # Gateway MQTT: um quadro binário e objetos JSON com os dois canais
+        mqtt = readings[150:]
+        mqtt_ingest(main, [encode_frame(2, [0, 1], list(range(25)), mqtt[:25, ::-1])] + [
+            json.dumps({"temperature": temperature, "humidity": humidity}).encode()
+            for humidity, temperature in mqtt[25:].tolist()
+        ])
+        response = client.get("/cep/multivariate", params={"channels": "temperature,humidity", "baseline": 100})
+        analysis = response.json()["groups"]["humidity+temperature"]
+        ok = check(analysis["observations"] == 200,
+                   f"Leituras pareadas de /combined, /ingest/binary e MQTT: {analysis['observations']}")
+        ok &= check(analysis["status"] in ("em_controle", "fora_de_controle"), f"Status: {analysis['status']}")
+        for baseline in range(10, 40):
+            client.get("/cep/multivariate", params={"baseline": baseline})
+        ok &= check(len(main.paired_monitors) == main.PAIRED_MONITORS_MAX,
+                    f"Monitores em memória limitados a {main.PAIRED_MONITORS_MAX} com 30 bases diferentes")
+        client.delete("/history/all")
+        analysis = client.get("/cep/multivariate").json()["groups"]
+        ok &= check(analysis == {}, "DELETE /history/all remove as leituras pareadas")
+    return ok
+
+
+def main():
+    print("Testando o monitoramento multivariado...")
+    print("=" * 70)
+    ok = True
+    for test in (test_incremental, test_joint_drift, test_api):
+        with tempfile.TemporaryDirectory(prefix="cep_multivariate_") as tmp:
+            ok &= test(tmp)
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no monitoramento multivariado")
+        sys.exit(1)
+    print("✓ Monitoramento multivariado funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Script para testar a API com vários workers (uvicorn --workers N)
+
+Sobe a API em um diretório temporário, envia leituras concorrentes para
+/data, /combined e /ingest/binary e confere que nenhuma leitura se perdeu
+entre os workers. Também mede a vazão de leitura com 1 e com N workers.
+
+Uso:
+    python test_multiworker.py
+    python test_multiworker.py --workers 8 --readings 4000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from binary_protocol import encode_frame  # noqa: E402
+from ingestion import replay_log  # noqa: E402
+from storage import read_logged  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(workdir, workers):
+    config = {
+        "temperature": {"data_file": str(workdir / "temperature_data.json"), "sample_size": 5,
+                        "lse": 28.0, "lie": 18.0, "binary_id": 0},
+        "humidity": {"data_file": str(workdir / "humidity_data.json"), "sample_size": 5,
+                     "lse": 70.0, "lie": 40.0, "binary_id": 1},
+    }
+    config_path = workdir / "channels.json"
+    config_path.write_text(json.dumps(config))
+    port = free_port()
+    env = dict(os.environ, CHANNELS_CONFIG=str(config_path), CEP_WARMUP="0", PYTHONPATH=str(BACKEND_DIR))
+    log = open(workdir / "api.log", "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url, config
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"API não iniciou:\n{(workdir / 'api.log').read_text()[-2000:]}")
+
+
+async def send_readings(url, total, concurrency):
+    """Envia `total` requisições de ingestão; retorna leituras esperadas por canal"""
+    expected = {"temperature": 0, "humidity": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        async def send(i):
+            async with semaphore:
+                if i % 3 == 0:
+                    response = await client.post("/data", json={"temperature": 23.0})
+                    counts = {"temperature": 1}
+                elif i % 3 == 1:
+                    response = await client.post("/combined", json={"temperature": 23.0, "humidity": 55.0})
+                    counts = {"temperature": 1, "humidity": 1}
+                else:
+                    frame = encode_frame(i, [0, 1], [1, 2, 3], [[23.0, 55.0]] * 3)
+                    response = await client.post("/ingest/binary", content=frame)
+                    counts = {"temperature": 3, "humidity": 3}
+                assert response.status_code == 201, response.text
+                for name, count in counts.items():
+                    expected[name] += count
+
+        await asyncio.gather(*(send(i) for i in range(total)))
+    return expected
+
+
+async def read_throughput(url, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=httpx.Limits(max_connections=concurrency), timeout=60) as client:
+        async def get():
+            async with semaphore:
+                response = await client.get("/history?limit=10")
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(get() for _ in range(total)))
+        return total / (time.perf_counter() - start)
+
+
+def stored_samples(path):
+    """Amostras gravadas: arquivo de dados com o log de ingestão aplicado"""
+    _, raw, entries = read_logged(path)
+    data = json.loads(raw) if raw else []
+    replay_log(data, entries)
+    return data
+
+
+def stored_readings(config):
+    return {
+        name: sum(len(sample["Dados"]) for sample in stored_samples(values["data_file"]))
+        for name, values in config.items()
+    }
+
+
+def run(workers, readings, concurrency):
+    with tempfile.TemporaryDirectory(prefix="cep_workers_") as tmp:
+        process, url, config = start_api(Path(tmp), workers)
+        try:
+            start = time.perf_counter()
+            expected = asyncio.run(send_readings(url, readings, concurrency))
+            ingest_rps = readings / (time.perf_counter() - start)
+            stored = stored_readings(config)
+            read_rps = asyncio.run(read_throughput(url, readings, concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+    return expected, stored, ingest_rps, read_rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste multi-worker da API CEP")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--readings", type=int, default=1500, help="Requisições de ingestão")
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"Testando a API com 1 e {args.workers} workers...")
+    print("=" * 70)
+
+    failures = 0
+    results = {}
+    for workers in sorted({1, args.workers}):
+        expected, stored, ingest_rps, read_rps = run(workers, args.readings, args.concurrency)
+        results[workers] = read_rps
+        lost = {name: expected[name] - stored[name] for name in expected}
+        ok = all(value == 0 for value in lost.values())
+        failures += not ok
+        print(f"{'✓' if ok else '✗'} {workers} worker(s): enviadas {expected}, gravadas {stored}")
+        print(f"  → ingestão {ingest_rps:.0f} req/s, leitura {read_rps:.0f} req/s")
+
+    if args.workers > 1:
+        print(f"\nEscala da leitura: {results[args.workers] / results[1]:.2f}x com {args.workers} workers")
+
+    print("\n" + "=" * 70)
+    if failures:
+        print("✗ Leituras perdidas entre workers!")
+        sys.exit(1)
+    print("✓ Nenhuma leitura perdida entre workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Script para testar o perfilamento sob demanda (profiling.py)
+
+- a amostragem encontra a função que ocupa a CPU, em formato collapsed
+- etapas marcadas com stage() aparecem no trace da requisição
+- sem janela aberta, trace_request/stage custam poucos microssegundos
+- rotas /admin/profiling e POST /config/reload exigem o X-Admin-Token
+
+Uso:
+    python test_profiling.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from profiling import Profiler, stage  # noqa: E402
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(i * i for i in range(200))
+    return total
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def test_sampling():
+    profiler = Profiler()
+    profiler.start(0.5, interval=0.002)
+    worker = threading.Thread(target=busy_loop, args=(0.4,), name="analise")
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+    lines = profiler.collapsed().splitlines()
+    busy = sum(int(line.rsplit(" ", 1)[1]) for line in lines
+               if line.startswith("analise;") and "busy_loop (test_profiling.py" in line)
+    ok = check(all(line.rsplit(" ", 1)[1].isdigit() for line in lines),
+               f"Saída collapsed: {len(lines)} pilhas distintas em {profiler.samples} amostras")
+    # A thread ocupa a CPU em ~80% da janela
+    ok &= check(busy > 0.5 * profiler.samples,
+                f"Função que ocupa a CPU aparece em {busy} amostras")
+    ok &= check(not profiler.active, "Janela encerrada")
+    return ok
+
+
+def test_traces():
+    profiler = Profiler()
+    profiler.start(5)
+    with profiler.trace_request("analise"):
+        with stage("load"):
+            time.sleep(0.02)
+        with stage("capability"):
+            time.sleep(0.01)
+    try:
+        with profiler.trace_request("analise"), stage("load"):
+            raise ValueError("falha")
+    except ValueError:
+        pass
+    profiler.stop()
+
+    breakdown = profiler.breakdown()
+    first, failed = breakdown["traces"]
+    ok = check([item["stage"] for item in first["stages"]] == ["load", "capability"]
+               and first["stages"][0]["duration_ms"] >= 20 and first["total_ms"] >= 30,
+               f"Etapas do trace: {[(i['stage'], i['duration_ms']) for i in first['stages']]}")
+    ok &= check(failed["status"] == "erro: ValueError" and breakdown["stages"]["load"]["count"] == 2,
+                "Trace guardado mesmo quando a requisição falha")
+    return ok
+
+
+def test_disabled_overhead():
+    profiler = Profiler()
+    n = 100_000
+    start = time.perf_counter()
+    for _ in range(n):
+        with profiler.trace_request("analise"):
+            with stage("load"):
+                pass
+    per_call = (time.perf_counter() - start) / n * 1e6
+    return check(per_call < 10 and not profiler.traces,
+                 f"Sem janela aberta: {per_call:.2f} µs por requisição instrumentada")
+
+
+def test_api():
+    with tempfile.TemporaryDirectory(prefix="cep_profiling_") as tmp:
+        os.chdir(tmp)
+        os.environ["CEP_WARMUP"] = "0"
+        os.environ["ADMIN_TOKEN"] = "segredo"
+        from fastapi.testclient import TestClient
+        import main
+
+        admin = {"X-Admin-Token": "segredo"}
+        with TestClient(main.app) as client:
+            client.delete("/history/all")
+            for i in range(30):
+                client.post("/combined", json={"temperature": 23.0 + i % 3, "humidity": 55.0 + i % 4})
+
+            ok = check(client.post("/admin/profiling/start").status_code == 403
+                       and client.post("/admin/profiling/start", headers={"X-Admin-Token": "x"}).status_code == 403,
+                       "Rotas de perfilamento recusam requisições sem o token")
+            ok &= check(client.post("/config/reload").status_code == 403
+                        and client.post("/config/reload", headers=admin).status_code == 200,
+                        "Recarga da configuração dos canais exige o token")
+            response = client.post("/admin/profiling/start", params={"seconds": 2, "interval_ms": 2}, headers=admin)
+            ok &= check(response.status_code == 200 and response.json()["active"], "Janela de perfilamento aberta")
+            ok &= check(client.post("/admin/profiling/start", headers=admin).status_code == 409,
+                        "Segunda janela simultânea recusada (409)")
+
+            status = client.post("/cep/analyze/combined").status_code
+            client.post("/admin/profiling/stop", headers=admin)
+
+            traces = client.get("/admin/profiling/traces", headers=admin).json()
+            trace = traces["traces"][-1]
+            ok &= check(trace["request"] == "POST /cep/analyze/combined" and trace["stages"][0]["stage"] == "load",
+                        f"Trace da análise combinada (HTTP {status}): "
+                        f"{[item['stage'] for item in trace['stages']]}, status {trace['status']}")
+            profile = client.get("/admin/profiling/profile", headers=admin)
+            ok &= check(profile.status_code == 200 and profile.headers["content-type"].startswith("text/plain")
+                        and bool(profile.text.strip()), f"Perfil collapsed com {len(profile.text.splitlines())} pilhas")
+            stacks = client.get("/admin/profiling/profile", params={"format": "json"}, headers=admin).json()
+            ok &= check(stacks["samples"] > 0 and bool(stacks["stacks"]), f"Perfil em JSON: {stacks['samples']} amostras")
+
+        main.ADMIN_TOKEN = ""
+        ok &= check(TestClient(main.app).get("/admin/profiling/status", headers=admin).status_code == 404,
+                    "Sem ADMIN_TOKEN as rotas de administração ficam desativadas")
+        return ok
+
+
+def main():
+    print("Testando o perfilamento sob demanda...")
+    print("=" * 70)
+    ok = test_sampling()
+    ok &= test_traces()
+    ok &= test_disabled_overhead()
+    ok &= test_api()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no perfilamento")
+        sys.exit(1)
+    print("✓ Perfilamento funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Script para testar o relatório incremental (report_engine.py)
+
+- seções e contexto de um canal sem gravação nova vêm do cache
+- histórico com mais blocos do que o cache de seções comporta: nenhum
+  bloco inalterado é renderizado de novo
+- nova leitura: só o bloco da última amostra é renderizado de novo
+- o relatório em pedaços (com cache) é igual a uma renderização completa
+
+Uso:
+    python test_report_engine.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import report_engine  # noqa: E402
+from channel_config import ChannelConfig  # noqa: E402
+from chart_rendering import RenderCache  # noqa: E402
+from ingestion import append_readings  # noqa: E402
+
+CONFIG = ChannelConfig(name="temperature", data_file="temperature_data.json", lse=26.0, lie=20.0, unit="°C")
+# Blocos pequenos: mais blocos do que as entradas do cache de seções
+BLOCK_SIZE = 5
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def history(n_readings, seed=0):
+    data = []
+    values = np.random.default_rng(seed).normal(23.0, 0.5, n_readings).round(2).tolist()
+    append_readings(data, values, CONFIG.sample_size, now="2024-01-01T00:00:00")
+    return data
+
+
+def next_snapshot(data, value):
+    """Como na ingestão: amostras fechadas compartilhadas, só a última copiada"""
+    last = data[-1]
+    snapshot = data[:-1] + [dict(last, Dados=list(last["Dados"]))]
+    append_readings(snapshot, [value], CONFIG.sample_size, now="2024-01-01T00:00:00")
+    return snapshot
+
+
+def report(version, data, block_size=report_engine.SAMPLE_BLOCK_SIZE):
+    """Relatório sem o cabeçalho (horário de geração)"""
+    chunks = list(report_engine.stream_report([(CONFIG, lambda: (version, data))], block_size=block_size))
+    return "".join(chunks[1:])
+
+
+def full_render(data):
+    """Renderização completa, sem nenhum cache"""
+    context = report_engine.build_channel_context(CONFIG, data)
+    sections = "".join(report_engine.render_section(name, context[name]) for name in report_engine.SECTIONS)
+    samples = "".join(report_engine.iter_sample_blocks(data, len(data)))
+    return sections + samples
+
+
+def reset_caches():
+    report_engine.section_cache = RenderCache(maxsize=512)
+    report_engine.context_cache = RenderCache(maxsize=64)
+    report_engine.sample_block_cache = report_engine.SampleBlockCache()
+
+
+def test_cached_sections():
+    print("\n📋 Canal sem gravação nova")
+    reset_caches()
+    data = history(5 * 3000 + 2)
+    n_blocks = -(-len(data) // BLOCK_SIZE)
+    first = report((1, 1), data, BLOCK_SIZE)
+    blocks = report_engine.sample_block_cache
+    ok = check(n_blocks > report_engine.section_cache.maxsize and blocks.misses == n_blocks,
+               f"Primeiro relatório: {n_blocks} blocos renderizados")
+
+    sections, contexts = report_engine.section_cache.hits, report_engine.context_cache.hits
+    second = report((1, 1), data, BLOCK_SIZE)
+    ok &= check(report_engine.context_cache.hits == contexts + 1
+                and report_engine.section_cache.hits == sections + len(report_engine.SECTIONS),
+                "Contexto e seções vêm do cache")
+    ok &= check(blocks.hits == n_blocks and blocks.misses == n_blocks,
+                f"Todos os {n_blocks} blocos vêm do cache")
+    ok &= check(first == second, "Mesmo relatório")
+
+    print("\n📋 Nova leitura")
+    snapshot = next_snapshot(data, 23.7)
+    updated = report((1, 2), snapshot, BLOCK_SIZE)
+    ok &= check(blocks.misses == n_blocks + 1 and blocks.hits == 2 * n_blocks - 1,
+                "Só o bloco da última amostra é renderizado de novo")
+    ok &= check(full_render(snapshot) in updated, "Relatório com a nova leitura")
+    return ok
+
+
+def test_stream_matches_full_render():
+    print("\n📋 Relatório em pedaços x renderização completa")
+    reset_caches()
+    data = history(5 * 2000 + 3, seed=1)
+    ok = True
+    for version, snapshot in [((2, 1), data), ((2, 1), data), ((2, 2), next_snapshot(data, 22.9))]:
+        streamed = report(version, snapshot)
+        expected = full_render(snapshot)
+        ok &= check(expected in streamed, f"{len(snapshot)} amostras, versão {version}: igual à renderização completa")
+    ok &= check(report_engine.sample_block_cache.hits > 0, f"Blocos do cache: {report_engine.sample_block_cache.hits}")
+    return ok
+
+
+def main():
+    print("Testando o relatório incremental...")
+    print("=" * 70)
+    ok = test_cached_sections()
+    ok &= test_stream_matches_full_render()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no relatório incremental")
+        sys.exit(1)
+    print("✓ Relatório incremental funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
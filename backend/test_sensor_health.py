@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Script para testar o filtro de saúde do sensor (sensor_health.py)
+
+- NaN, leituras fora da faixa física, picos isolados e sensor travado vão
+  para a quarentena; uma mudança de nível real passa
+- limites de controle com o filtro iguais aos dos dados sem falhas
+- POST /data: quarentena e contadores em /sensors/health e /sensors/quarantine
+
+Uso:
+    python test_sensor_health.py
+"""
+
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from control_charts import create_chart  # noqa: E402
+from sensor_health import SensorFilter  # noqa: E402
+
+LIMITS = {"valid_min": -40.0, "valid_max": 80.0, "max_step": 5.0, "stuck_limit": 20}
+
+
+def faulty_stream(n=2000, seed=11):
+    """Leituras de temperatura com falhas injetadas; retorna (leituras, índices com falha)"""
+    rng = np.random.default_rng(seed)
+    clean = rng.normal(23.0, 0.8, n).round(1)
+    # Mudança de nível real (ex.: ar-condicionado desligado): precisa chegar ao CEP
+    clean[1500:] += 6.0
+    readings = clean.tolist()
+    faults = {}
+    for i in (100, 400, 900):
+        readings[i] = math.nan
+        faults[i] = "nan"
+    for i in (200, 700):
+        readings[i] = -999.0  # código de erro do driver
+        faults[i] = "range"
+    for i in (300, 600, 1200):
+        readings[i] = readings[i] + 25.0
+        faults[i] = "spike"
+    # Sensor travado por 50 leituras: as 30 além do limite vão para a quarentena
+    for i in range(1000, 1050):
+        readings[i] = 21.7
+        if i >= 1000 + LIMITS["stuck_limit"]:
+            faults[i] = "stuck"
+    return clean, readings, faults
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def run_filter(readings, batch=7):
+    sensor = SensorFilter(**LIMITS)
+    accepted, quarantined = [], []
+    for start in range(0, len(readings), batch):
+        chunk = [(i, value) for i, value in enumerate(readings[start:start + batch], start)]
+        a, q = sensor.process(chunk)
+        accepted += a
+        quarantined += q
+    a, q = sensor.flush()
+    return sensor, accepted + a, quarantined + q
+
+
+def test_detection():
+    clean, readings, faults = faulty_stream()
+    sensor, accepted, quarantined = run_filter(readings)
+    found = {i: reason for i, _, reason in quarantined}
+    ok = check(found == faults, f"Falhas detectadas: {sensor.status()}")
+    ok &= check(len(accepted) + len(quarantined) == len(readings), "Nenhuma leitura perdida ou duplicada")
+    ok &= check(sensor.stats["level_shifts"] == 1 and all(i in dict(accepted) for i in range(1500, 2000)),
+                "Mudança de nível real aceita (não confundida com pico)")
+    ok &= check([i for i, _ in accepted] == sorted(i for i, _ in accepted), "Leituras aceitas na ordem original")
+    return ok
+
+
+def test_control_limits():
+    clean, readings, faults = faulty_stream()
+    _, accepted, _ = run_filter(readings)
+    # Só a fase estável (antes da mudança de nível) para comparar os limites;
+    # as primeiras stuck_limit leituras travadas são indistinguíveis de leituras boas
+    stable = [value for i, value in accepted if i < 1500]
+    reference = [value for i, value in enumerate(readings[:1500]) if i not in faults]
+    raw = [value for value in readings[:1500] if math.isfinite(value)]
+
+    def limits(values):
+        analysis = create_chart("X-R", 5).update_many(values).analysis()
+        return tuple(round(analysis[key], 3) for key in ("lic", "center_line", "lsc"))
+
+    filtered_limits, clean_limits, raw_limits = limits(stable), limits(reference), limits(raw)
+    ok = check(filtered_limits == clean_limits,
+               f"Limites X-barra com o filtro iguais aos dos dados sem falhas: {filtered_limits}")
+    ok &= check(raw_limits != clean_limits, f"Sem o filtro os limites ficam distorcidos: {raw_limits}")
+    return ok
+
+
+def test_throughput():
+    rng = np.random.default_rng(3)
+    readings = list(enumerate(rng.normal(23.0, 0.8, 200_000).round(1).tolist()))
+    sensor = SensorFilter(**LIMITS)
+    start = time.perf_counter()
+    for i in range(0, len(readings), 50):
+        sensor.process(readings[i:i + 50])
+    rate = len(readings) / (time.perf_counter() - start)
+    return check(rate > 100_000, f"Vazão do filtro: {rate:,.0f} leituras/s")
+
+
+def test_api():
+    with tempfile.TemporaryDirectory(prefix="cep_sensor_health_") as tmp:
+        os.chdir(tmp)
+        os.environ["CEP_WARMUP"] = "0"
+        from fastapi.testclient import TestClient
+        import main
+
+        readings = [23.1, 23.4, 23.2, 150.0, 23.0, 48.0, 23.3, 22.9, 23.1, 23.2]
+        with TestClient(main.app) as client:
+            client.delete("/history")
+            for value in readings[:2]:
+                assert client.post("/data", json={"temperature": value}).status_code == 201
+            # NaN não passa pelo JSON; chega por outros caminhos (ex.: MQTT)
+            main.ingest_readings("temperature", [math.nan])
+            for value in readings[2:]:
+                assert client.post("/data", json={"temperature": value}).status_code == 201
+            stored = [v for sample in client.get("/history").json()["samples"] for v in sample["Dados"]]
+            ok = check(stored == [23.1, 23.4, 23.2, 23.0, 23.3, 22.9, 23.1, 23.2],
+                       f"Histórico só com leituras válidas: {stored}")
+            health = client.get("/sensors/health").json()["channels"]["temperature"]
+            ok &= check((health["nan"], health["range"], health["spike"], health["quarantined"]) == (1, 1, 1, 3),
+                        f"Contadores em /sensors/health: {health}")
+            quarantine = client.get("/sensors/quarantine", params={"channel": "temperature"}).json()["readings"]
+            ok &= check([(item["value"], item["reason"]) for item in quarantine]
+                        == [(None, "nan"), (150.0, "range"), (48.0, "spike")],
+                        "Leituras com falha guardadas na quarentena com o motivo")
+            client.delete("/history")
+            ok &= check(client.get("/sensors/quarantine").json()["readings"] == [],
+                        "DELETE /history limpa também a quarentena")
+        return ok
+
+
+def main():
+    print("Testando o filtro de saúde do sensor...")
+    print("=" * 70)
+    ok = test_detection()
+    ok &= test_control_limits()
+    ok &= test_throughput()
+    ok &= test_api()
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas no filtro de saúde do sensor")
+        sys.exit(1)
+    print("✓ Filtro de saúde do sensor funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
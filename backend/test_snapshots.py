@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Script para testar as leituras isoladas por versão (snapshots.py)
+
+- um snapshot não muda enquanto a ingestão grava versões novas
+- amostras fechadas compartilhadas entre versões (cópia na escrita)
+- gravação de outro processo detectada pela versão do arquivo
+- snapshot em O(1) e ingestão sem perda de vazão durante análises longas
+- ingestão grava só as amostras alteradas no log do canal, que é
+  compactado no arquivo de dados quando cresce
+
+Uso:
+    python test_snapshots.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def test_copy_on_write(main):
+    path = main.channel_path("temperature")
+    main.clear_channel("temperature")
+    main.ingest_readings("temperature", [20.0 + i / 10 for i in range(23)])
+    before = main.load_data(path)
+    frozen = json.dumps(before)
+
+    main.ingest_readings("temperature", [30.0, 31.0, 32.0])
+    after = main.load_data(path)
+    ok = check(json.dumps(before) == frozen, "Snapshot antigo intacto após novas gravações")
+    ok &= check(sum(len(s["Dados"]) for s in after) == 26, "Snapshot novo com as leituras gravadas")
+    ok &= check(all(a is b for a, b in zip(before[:4], after[:4])),
+                "Amostras fechadas compartilhadas entre as versões")
+    ok &= check(main.load_data(path) is after, "Snapshot reaproveitado enquanto a versão não muda")
+
+    # Gravação de outro processo: só o arquivo muda
+    time.sleep(0.01)
+    main.atomic_write(path, json.dumps([{"Amostra": "1", "Dados": [1.0]}]))
+    ok &= check(main.load_data(path) == [{"Amostra": "1", "Dados": [1.0]}],
+                "Versão gravada por outro processo carregada na leitura seguinte")
+    return ok
+
+
+def test_concurrency(main):
+    path = main.channel_path("temperature")
+    main.clear_channel("temperature")
+    for _ in range(40):
+        main.ingest_readings("temperature", [23.0 + (i % 7) / 10 for i in range(500)])
+
+    start = time.perf_counter()
+    main.load_data(path)
+    get_time = time.perf_counter() - start
+    ok = check(get_time < 0.001, f"Snapshot de {len(main.load_data(path))} amostras em {get_time * 1e6:.0f} µs")
+
+    def ingest_rate(seconds):
+        count, deadline = 0, time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            main.ingest_readings("temperature", [23.5 + count % 3 / 10])
+            count += 1
+        return count / seconds
+
+    baseline = ingest_rate(1.0)
+
+    stop = threading.Event()
+    consistent = []
+
+    def long_analysis():
+        # Percorre o snapshot devagar, como uma análise longa
+        while not stop.is_set():
+            snapshot = main.load_data(path)
+            frozen = (len(snapshot), list(snapshot[-1]["Dados"]))
+            total = 0
+            for sample in snapshot:
+                total += len(sample["Dados"])
+                time.sleep(0)
+            consistent.append(frozen == (len(snapshot), list(snapshot[-1]["Dados"])))
+
+    analyses = [threading.Thread(target=long_analysis) for _ in range(2)]
+    for thread in analyses:
+        thread.start()
+    during = ingest_rate(1.0)
+    stop.set()
+    for thread in analyses:
+        thread.join()
+
+    ok &= check(consistent and all(consistent),
+                f"{len(consistent)} análises concorrentes viram sempre o mesmo ponto no tempo")
+    # Numa única CPU as análises dividem o processador com a ingestão;
+    # o que não pode acontecer é a ingestão ficar parada esperando por elas
+    ok &= check(during > 0.2 * baseline,
+                f"Ingestão durante as análises: {during:.0f} lotes/s (sozinha: {baseline:.0f} lotes/s)")
+    return ok
+
+
+def test_ingestion_log(main):
+    from ingestion import replay_log
+    from snapshots import SnapshotStore
+    from storage import log_path
+
+    path = main.channel_path("temperature")
+    main.clear_channel("temperature")
+    for _ in range(20):
+        main.ingest_readings("temperature", [23.0 + (i % 7) / 10 for i in range(500)])
+    with main.file_lock(path):
+        main.save_data(main.load_data(path), path)
+    base = path.read_bytes()
+
+    main.ingest_readings("temperature", [23.1])
+    entry = os.path.getsize(log_path(path))
+    for value in (23.2, 23.3, 23.4):
+        main.ingest_readings("temperature", [value])
+    ok = check(path.read_bytes() == base and entry < 1000,
+               f"Leitura gravada no log ({entry} bytes) sem reescrever o arquivo ({len(base)} bytes)")
+
+    # Outro worker: arquivo + log, mesmo com uma gravação interrompida no fim
+    with open(log_path(path), "ab") as f:
+        f.write(b'{"at": 2000, "samp')
+    other = SnapshotStore(main.parse_samples, replay_log)
+    ok &= check(other.get(path).samples == main.load_data(path),
+                "Outro processo vê as mesmas amostras (arquivo + log)")
+    main.ingest_readings("temperature", [23.5])
+    readings = [value for sample in other.get(path).samples for value in sample["Dados"]]
+    ok &= check(readings[-5:] == [23.1, 23.2, 23.3, 23.4, 23.5],
+                "Linha incompleta de uma gravação interrompida ignorada")
+
+    # Compactação: o log passa do tamanho do arquivo
+    main.clear_channel("temperature")
+    minimum, main.INGEST_LOG_MIN_BYTES = main.INGEST_LOG_MIN_BYTES, 0
+    try:
+        compactions = 0
+        for i in range(500):
+            main.ingest_readings("temperature", [23.0 + i % 5 / 10])
+            compactions += not os.path.exists(log_path(path))
+    finally:
+        main.INGEST_LOG_MIN_BYTES = minimum
+    stored = json.loads(path.read_bytes())
+    readings = sum(len(sample["Dados"]) for sample in main.load_data(path))
+    ok &= check(compactions > 0 and readings == 500
+                and stored[:-1] == main.load_data(path)[:len(stored) - 1],
+                f"Log compactado no arquivo de dados ({compactions} compactações em 500 lotes)")
+    return ok
+
+
+def main():
+    print("Testando os snapshots das amostras...")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory(prefix="cep_snapshots_") as tmp:
+        os.chdir(tmp)
+        os.environ["CEP_WARMUP"] = "0"
+        os.environ["ALERTS_ENABLED"] = "0"
+        import logging
+        import main as api
+        logging.getLogger("main").setLevel(logging.WARNING)
+
+        ok = test_copy_on_write(api)
+        ok &= test_concurrency(api)
+        ok &= test_ingestion_log(api)
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Falhas nos snapshots das amostras")
+        sys.exit(1)
+    print("✓ Snapshots das amostras funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
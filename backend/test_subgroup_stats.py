@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script para testar os resumos de subgrupo gravados na ingestão
+
+Confere que gráficos, capacidade e janela deslizante calculados pelos
+resumos ("Resumo") dão o mesmo resultado que o cálculo pelas leituras.
+
+Uso:
+    python test_subgroup_stats.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from capability import capability_summary, capability_summary_from_stats, summaries_to_stats  # noqa: E402
+from control_charts import CHART_TYPES, create_chart, feed_samples  # noqa: E402
+from ingestion import append_readings, complete_summaries  # noqa: E402
+from rolling_cep import rolling_series  # noqa: E402
+
+
+def check(condition, message):
+    print(f"{'✓' if condition else '✗'} {message}")
+    return condition
+
+
+def same(a, b):
+    if isinstance(a, dict):
+        return all(same(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float):
+        return abs(a - b) <= 1e-9 * max(1.0, abs(a))
+    return a == b
+
+
+def main():
+    print("Testando os resumos de subgrupo...")
+    print("=" * 70)
+
+    readings = np.random.default_rng(7).normal(23.0, 1.5, 1003).round(2).tolist()
+    data = []
+    # Lotes de tamanhos variados, como chegam pelos endpoints
+    for chunk in np.array_split(readings, 37):
+        append_readings(data, chunk.tolist(), 5)
+    complete = [sample for sample in data if len(sample["Dados"]) == 5]
+
+    ok = check(all("Resumo" in sample for sample in complete) and "Resumo" not in data[-1],
+               f"{len(complete)} amostras fechadas com resumo; a amostra em aberto sem")
+    ok &= check(all(sample["Resumo"]["inicio"] and sample["Resumo"]["fim"] for sample in complete),
+                "Resumos com horários de abertura e fechamento")
+
+    for chart_type in CHART_TYPES:
+        from_readings = create_chart(chart_type, 5).update_many(readings).analysis()
+        from_summaries = feed_samples(create_chart(chart_type, 5), data).analysis()
+        ok &= check(same(from_readings, from_summaries), f"Gráfico {chart_type} igual pelos resumos")
+
+    subgroups = np.array([sample["Dados"] for sample in complete])
+    stats = summaries_to_stats(complete_summaries(data, 5))
+    ok &= check(same(capability_summary(subgroups, 28.0, 18.0, n_boot=200, seed=1),
+                     capability_summary_from_stats(stats, 5, 28.0, 18.0, n_boot=200, seed=1)),
+                "Capacidade (com bootstrap) igual pelos resumos")
+
+    series_readings = rolling_series(subgroups.tolist(), 50, 5, step=10, lse=28.0, lie=18.0)
+    series_summaries = rolling_series(complete_summaries(data, 5), 50, 5, step=10, lse=28.0, lie=18.0)
+    ok &= check(same(series_readings, series_summaries), "Janela deslizante igual pelos resumos")
+
+    print("\n" + "=" * 70)
+    if not ok:
+        print("✗ Resumos divergem do cálculo pelas leituras")
+        sys.exit(1)
+    print("✓ Resumos de subgrupo funcionando corretamente!")
+
+
+if __name__ == "__main__":
+    main()
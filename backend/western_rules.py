@@ -0,0 +1,177 @@
+"""
+Regras do Western Electric Handbook para gráficos de controle
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def evaluate_western_electric_rules(values, center_line, lsc, lic):
+    """
+    Avalia as regras do Western Electric sobre uma sequência de pontos
+    O sigma é derivado dos limites de controle: (LSC - LC) / 3
+    """
+    rules = {}
+    values = list(values)
+    sigma = (lsc - center_line) / 3
+    
+    # Regra 1: Um ponto fora de 3-sigma
+    rule_1_violated = any(v > lsc or v < lic for v in values)
+    rules['rule_1'] = {
+        'name': 'Um ponto fora de 3-sigma (±3σ)',
+        'violated': rule_1_violated,
+        'description': 'Qualquer ponto fora dos limites de controle',
+        'status': 'VIOLADA' if rule_1_violated else 'OK'
+    }
+    
+    # Regra 2: Nove pontos consecutivos no mesmo lado da linha central
+    rule_2_violated = False
+    for i in range(len(values) - 8):
+        above = all(v > center_line for v in values[i:i+9])
+        below = all(v < center_line for v in values[i:i+9])
+        if above or below:
+            rule_2_violated = True
+            break
+    
+    rules['rule_2'] = {
+        'name': '9 pontos consecutivos no mesmo lado',
+        'violated': rule_2_violated,
+        'description': 'Nove pontos consecutivos acima ou abaixo da linha central',
+        'status': 'VIOLADA' if rule_2_violated else 'OK'
+    }
+    
+    # Regra 3: Seis pontos consecutivos em ordem crescente ou decrescente
+    rule_3_violated = False
+    for i in range(len(values) - 5):
+        increasing = all(values[i+j] < values[i+j+1] for j in range(5))
+        decreasing = all(values[i+j] > values[i+j+1] for j in range(5))
+        if increasing or decreasing:
+            rule_3_violated = True
+            break
+    
+    rules['rule_3'] = {
+        'name': '6 pontos em ordem crescente/decrescente',
+        'violated': rule_3_violated,
+        'description': 'Seis pontos consecutivos em tendência crescente ou decrescente',
+        'status': 'VIOLADA' if rule_3_violated else 'OK'
+    }
+    
+    # Regra 4: Quatorze pontos alternando para cima e para baixo
+    rule_4_violated = False
+    if len(values) >= 14:
+        for i in range(len(values) - 13):
+            alternating = True
+            for j in range(13):
+                if j % 2 == 0:
+                    if values[i+j] >= values[i+j+1]:
+                        alternating = False
+                        break
+                else:
+                    if values[i+j] <= values[i+j+1]:
+                        alternating = False
+                        break
+            if alternating:
+                rule_4_violated = True
+                break
+    
+    rules['rule_4'] = {
+        'name': '14 pontos alternando acima/abaixo',
+        'violated': rule_4_violated,
+        'description': 'Quatorze pontos consecutivos alternando para cima e para baixo',
+        'status': 'VIOLADA' if rule_4_violated else 'OK'
+    }
+    
+    # Regra 5: Dois de três pontos fora de 2-sigma
+    rule_5_violated = False
+    limit_2sigma = center_line + 2 * sigma
+    limit_2sigma_lower = center_line - 2 * sigma
+    
+    for i in range(len(values) - 2):
+        outside_2sigma = sum(1 for v in values[i:i+3] if v > limit_2sigma or v < limit_2sigma_lower)
+        if outside_2sigma >= 2:
+            rule_5_violated = True
+            break
+    
+    rules['rule_5'] = {
+        'name': '2 de 3 pontos fora de 2-sigma',
+        'violated': rule_5_violated,
+        'description': 'Dois de três pontos consecutivos fora de ±2σ',
+        'status': 'VIOLADA' if rule_5_violated else 'OK'
+    }
+    
+    # Regra 6: Quatro de cinco pontos fora de 1-sigma
+    rule_6_violated = False
+    limit_1sigma = center_line + sigma
+    limit_1sigma_lower = center_line - sigma
+    
+    for i in range(len(values) - 4):
+        outside_1sigma = sum(1 for v in values[i:i+5] if v > limit_1sigma or v < limit_1sigma_lower)
+        if outside_1sigma >= 4:
+            rule_6_violated = True
+            break
+    
+    rules['rule_6'] = {
+        'name': '4 de 5 pontos fora de 1-sigma',
+        'violated': rule_6_violated,
+        'description': 'Quatro de cinco pontos consecutivos fora de ±1σ',
+        'status': 'VIOLADA' if rule_6_violated else 'OK'
+    }
+    
+    # Regra 7: Quinze pontos consecutivos dentro de 1-sigma
+    rule_7_violated = False
+    for i in range(len(values) - 14):
+        inside_1sigma = all(limit_1sigma_lower <= v <= limit_1sigma for v in values[i:i+15])
+        if inside_1sigma:
+            rule_7_violated = True
+            break
+    
+    rules['rule_7'] = {
+        'name': '15 pontos consecutivos dentro de 1-sigma',
+        'violated': rule_7_violated,
+        'description': 'Quinze pontos consecutivos dentro de ±1σ (falta de variação)',
+        'status': 'VIOLADA' if rule_7_violated else 'OK'
+    }
+    
+    # Regra 8: Oito pontos consecutivos fora de 1-sigma
+    rule_8_violated = False
+    for i in range(len(values) - 7):
+        outside_1sigma = all(v > limit_1sigma or v < limit_1sigma_lower for v in values[i:i+8])
+        if outside_1sigma:
+            rule_8_violated = True
+            break
+    
+    rules['rule_8'] = {
+        'name': '8 pontos consecutivos fora de 1-sigma',
+        'violated': rule_8_violated,
+        'description': 'Oito pontos consecutivos fora de ±1σ (muita variação)',
+        'status': 'VIOLADA' if rule_8_violated else 'OK'
+    }
+    
+    return rules
+
+
+def analyze_western_electric_rules(xr_chart_obj, chart_type="X"):
+    """
+    Analisa as regras do Western Electric Handbook
+    Retorna status de cada regra (violada ou dentro da norma)
+    """
+    
+    try:
+        df = xr_chart_obj.df
+        
+        if chart_type == "X" or chart_type == "X-bar":
+            values = df['X_bar'].values
+            center_line = xr_chart_obj.x_double_mean
+            lsc = xr_chart_obj.lsc_x_bar_graph
+            lic = xr_chart_obj.lic_x_bar_graph
+        else:  # R chart
+            values = df['R'].values
+            center_line = xr_chart_obj.r_mean
+            lsc = xr_chart_obj.lsc_r_bar_graph
+            lic = xr_chart_obj.lic_r_bar_graph
+        
+        return evaluate_western_electric_rules(values, center_line, lsc, lic)
+        
+    except Exception as e:
+        logger.error(f"Erro ao analisar regras Western Electric: {e}")
+        return None
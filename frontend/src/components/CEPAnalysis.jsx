@@ -50,6 +50,21 @@ function CEPAnalysis() {
     }
   };
 
+  // Baixar gráfico servido pela API (origem diferente: via blob)
+  const downloadChart = async (chartUrl, filename) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}${chartUrl}`);
+      const blob = await response.blob();
+      const link = document.createElement('a');
+      link.href = URL.createObjectURL(blob);
+      link.download = filename;
+      link.click();
+      URL.revokeObjectURL(link.href);
+    } catch (err) {
+      console.error('Erro ao baixar gráfico:', err);
+    }
+  };
+
   const canAnalyze = status?.combined_analysis_available || false;
 
   return (
@@ -161,24 +176,19 @@ function CEPAnalysis() {
             {/* Gráficos de Controle - Lado a Lado */}
             <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
               {/* Gráfico Temperatura */}
-              {analysis.temperature?.chart_base64 && (
+              {analysis.temperature?.chart_url && (
                 <div className="bg-white/10 backdrop-blur-md rounded-2xl p-6 border border-white/20">
                   <div className="flex justify-between items-center mb-4">
                     <h2 className="text-2xl font-bold text-white">🌡️ Controle X-R - Temperatura</h2>
                     <button
-                      onClick={() => {
-                        const link = document.createElement('a');
-                        link.href = `data:image/png;base64,${analysis.temperature.chart_base64}`;
-                        link.download = 'grafico_temperatura.png';
-                        link.click();
-                      }}
+                      onClick={() => downloadChart(analysis.temperature.chart_url, 'grafico_temperatura.png')}
                       className="px-4 py-2 bg-blue-500 hover:bg-blue-600 rounded-lg text-white text-sm transition-colors"
                     >
                       📥 Baixar
                     </button>
                   </div>
                   <img
-                    src={`data:image/png;base64,${analysis.temperature.chart_base64}`}
+                    src={`${API_BASE_URL}${analysis.temperature.chart_url}`}
                     alt="Gráfico de Controle CEP - Temperatura"
                     className="w-full rounded-lg"
                   />
@@ -186,24 +196,19 @@ function CEPAnalysis() {
               )}
 
               {/* Gráfico Umidade */}
-              {analysis.humidity?.chart_base64 && (
+              {analysis.humidity?.chart_url && (
                 <div className="bg-white/10 backdrop-blur-md rounded-2xl p-6 border border-white/20">
                   <div className="flex justify-between items-center mb-4">
                     <h2 className="text-2xl font-bold text-white">💧 Controle X-R - Umidade</h2>
                     <button
-                      onClick={() => {
-                        const link = document.createElement('a');
-                        link.href = `data:image/png;base64,${analysis.humidity.chart_base64}`;
-                        link.download = 'grafico_umidade.png';
-                        link.click();
-                      }}
+                      onClick={() => downloadChart(analysis.humidity.chart_url, 'grafico_umidade.png')}
                       className="px-4 py-2 bg-purple-500 hover:bg-purple-600 rounded-lg text-white text-sm transition-colors"
                     >
                       📥 Baixar
                     </button>
                   </div>
                   <img
-                    src={`data:image/png;base64,${analysis.humidity.chart_base64}`}
+                    src={`${API_BASE_URL}${analysis.humidity.chart_url}`}
                     alt="Gráfico de Controle CEP - Umidade"
                     className="w-full rounded-lg"
                   />